@@ -0,0 +1,423 @@
+"""Almacenamiento local persistente (SQLite en modo WAL) de los envíos del formulario."""
+import bisect
+import json
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from calculo_roi import ROI_AHORRO_ISO, ROI_COSTO_LEGAL, ROI_IMPACTO_REPUTACIONAL, ROI_NETO, calcular_roi_lote
+from incidentes import COL_INCIDENTES, IncidentesCompactos, como_compactos
+
+# Ruta por defecto de la base de datos; se puede cambiar con la variable de entorno ROI_DB_PATH.
+RUTA_POR_DEFECTO = os.environ.get("ROI_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "roi_envios.db"))
+# Máximo de envíos que el hilo escritor agrupa en una misma transacción.
+TAMANO_LOTE_ESCRITURA = 256
+
+# Columnas indexadas: clave en form_data -> columna en la tabla.
+COLUMNAS_INDEXADAS = {
+    "País Sede": "pais_sede",
+    "Tamaño Empresa": "tamano_empresa",
+    "Servicio Principal IT": "servicio_principal",
+    "Nivel ISO 27001": "nivel_iso27001",
+}
+# Dimensiones del portafolio con agregados mantenidos de forma incremental ("total" agrupa todo).
+DIMENSIONES_AGREGADAS = ["total", "pais_sede", "tamano_empresa", "servicio_principal"]
+# Bordes (COP) de las cubetas del histograma de ROI neto; la cubeta i cubre [borde i-1, borde i).
+BORDES_HISTOGRAMA_ROI = [-1e9, -5e8, -1e8, -5e7, -1e7, 0, 1e7, 5e7, 1e8, 5e8, 1e9]
+_CLAVE_POR_COLUMNA = {columna: clave for clave, columna in COLUMNAS_INDEXADAS.items()}
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS envios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    creado_en TEXT NOT NULL,
+    nombre_empresa TEXT,
+    id_empresa TEXT,
+    pais_sede TEXT,
+    tamano_empresa TEXT,
+    servicio_principal TEXT,
+    nivel_iso27001 TEXT,
+    roi_neto REAL,
+    horas_incidentes REAL,
+    datos_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS incidentes_envio (
+    envio_id INTEGER NOT NULL REFERENCES envios(id) ON DELETE CASCADE,
+    posicion INTEGER NOT NULL,
+    incidente TEXT,
+    duracion_h REAL,
+    PRIMARY KEY (envio_id, posicion)
+);
+CREATE INDEX IF NOT EXISTS idx_envios_pais_sede ON envios(pais_sede);
+CREATE INDEX IF NOT EXISTS idx_envios_tamano_empresa ON envios(tamano_empresa);
+CREATE INDEX IF NOT EXISTS idx_envios_servicio_principal ON envios(servicio_principal);
+CREATE INDEX IF NOT EXISTS idx_envios_nivel_iso27001 ON envios(nivel_iso27001);
+CREATE TABLE IF NOT EXISTS agregados (
+    dimension TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    num_envios INTEGER NOT NULL,
+    num_roi_negativo INTEGER NOT NULL,
+    suma_roi_neto REAL NOT NULL,
+    min_roi_neto REAL,
+    max_roi_neto REAL,
+    suma_ahorro_iso REAL NOT NULL,
+    suma_costo_legal REAL NOT NULL,
+    suma_impacto_reputacional REAL NOT NULL,
+    num_incidentes INTEGER NOT NULL,
+    suma_horas_incidentes REAL NOT NULL,
+    PRIMARY KEY (dimension, valor)
+);
+CREATE TABLE IF NOT EXISTS agregados_histograma_roi (
+    dimension TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    cubeta INTEGER NOT NULL,
+    conteo INTEGER NOT NULL,
+    PRIMARY KEY (dimension, valor, cubeta)
+);
+"""
+
+_UPSERT_AGREGADOS = """
+INSERT INTO agregados (dimension, valor, num_envios, num_roi_negativo, suma_roi_neto, min_roi_neto, max_roi_neto,
+                       suma_ahorro_iso, suma_costo_legal, suma_impacto_reputacional, num_incidentes, suma_horas_incidentes)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (dimension, valor) DO UPDATE SET
+    num_envios = num_envios + excluded.num_envios,
+    num_roi_negativo = num_roi_negativo + excluded.num_roi_negativo,
+    suma_roi_neto = suma_roi_neto + excluded.suma_roi_neto,
+    min_roi_neto = MIN(min_roi_neto, excluded.min_roi_neto),
+    max_roi_neto = MAX(max_roi_neto, excluded.max_roi_neto),
+    suma_ahorro_iso = suma_ahorro_iso + excluded.suma_ahorro_iso,
+    suma_costo_legal = suma_costo_legal + excluded.suma_costo_legal,
+    suma_impacto_reputacional = suma_impacto_reputacional + excluded.suma_impacto_reputacional,
+    num_incidentes = num_incidentes + excluded.num_incidentes,
+    suma_horas_incidentes = suma_horas_incidentes + excluded.suma_horas_incidentes
+"""
+
+_UPSERT_HISTOGRAMA = """
+INSERT INTO agregados_histograma_roi (dimension, valor, cubeta, conteo) VALUES (?, ?, ?, ?)
+ON CONFLICT (dimension, valor, cubeta) DO UPDATE SET conteo = conteo + excluded.conteo
+"""
+
+
+def _conectar(ruta):
+    conexion = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+    conexion.row_factory = sqlite3.Row
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.execute("PRAGMA foreign_keys=ON")
+    return conexion
+
+
+class AlmacenEnvios:
+    """Guarda y recupera envíos del formulario.
+
+    Las escrituras se encolan y un único hilo escritor las confirma por lotes (una transacción
+    por lote), así que `guardar_envio` no bloquea el hilo del script de Streamlit. Cada hilo
+    lector usa su propia conexión; en modo WAL las lecturas no esperan a las escrituras.
+    """
+
+    def __init__(self, ruta=RUTA_POR_DEFECTO, tamano_lote=TAMANO_LOTE_ESCRITURA):
+        self.ruta = str(ruta)
+        self.tamano_lote = tamano_lote
+        self._lectores = threading.local()
+        self._cola = queue.Queue()
+        self._conexion_escritura = _conectar(self.ruta)
+        self._conexion_escritura.executescript(_ESQUEMA)
+        self._migrar()
+        self._escritor = threading.Thread(target=self._bucle_escritura, name="almacen-envios-escritor", daemon=True)
+        self._escritor.start()
+
+    # --- ESCRITURA ---
+    def guardar_envio(self, form_data):
+        """Encola un envío y devuelve un Future que se resuelve con su ID."""
+        futuro = Future()
+        self._cola.put((form_data, futuro))
+        return futuro
+
+    def esperar_escrituras(self):
+        # Bloquea hasta que todos los envíos encolados estén confirmados.
+        self._cola.join()
+
+    def cerrar(self):
+        self._cola.put(None)
+        self._escritor.join()
+        self._conexion_escritura.close()
+
+    def _bucle_escritura(self):
+        while True:
+            elemento = self._cola.get()
+            if elemento is None:
+                self._cola.task_done()
+                return
+            lote = [elemento]
+            # Se agrupan los envíos que ya estén en la cola para confirmarlos en una sola transacción.
+            while len(lote) < self.tamano_lote:
+                try:
+                    elemento = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if elemento is None:
+                    self._cola.put(None)
+                    self._cola.task_done()
+                    break
+                lote.append(elemento)
+            self._escribir_lote(lote)
+
+    def _escribir_lote(self, lote):
+        try:
+            with self._conexion_escritura:
+                ids = self._insertar_envios([form_data for form_data, _ in lote])
+        except Exception:
+            # Un envío inválido no debe descartar el resto del lote: se reintenta uno por uno.
+            for form_data, futuro in lote:
+                try:
+                    with self._conexion_escritura:
+                        futuro.set_result(self._insertar_envios([form_data])[0])
+                except Exception as e:
+                    futuro.set_exception(e)
+        else:
+            for (_, futuro), envio_id in zip(lote, ids):
+                futuro.set_result(envio_id)
+        finally:
+            for _ in lote:
+                self._cola.task_done()
+
+    def _insertar_envios(self, lista_form_data):
+        # El ROI del lote se calcula en una sola pasada vectorizada y los agregados del portafolio
+        # se actualizan en la misma transacción que los envíos, sin volver a leer el historial.
+        import pandas as pd  # Diferido: se importa en el hilo escritor, no en el arranque de app.py
+
+        roi = calcular_roi_lote(pd.DataFrame(
+            [{clave: valor for clave, valor in form_data.items() if clave != COL_INCIDENTES} for form_data in lista_form_data]
+        ))
+        acumulados, histograma = {}, {}
+        ids = []
+        for form_data, roi_envio in zip(lista_form_data, roi.to_dict(orient="records")):
+            incidentes = como_compactos(form_data.get(COL_INCIDENTES))
+            horas_incidentes = incidentes.horas_totales()
+            ids.append(self._insertar(form_data, incidentes, roi_envio[ROI_NETO], horas_incidentes))
+            _acumular(acumulados, histograma, form_data, roi_envio, len(incidentes), horas_incidentes)
+        self._volcar_agregados(acumulados, histograma)
+        return ids
+
+    def _insertar(self, form_data, incidentes, roi_neto, horas_incidentes):
+        datos = {clave: valor for clave, valor in form_data.items() if clave != COL_INCIDENTES}
+        cursor = self._conexion_escritura.execute(
+            "INSERT INTO envios (creado_en, nombre_empresa, id_empresa, pais_sede, tamano_empresa, "
+            "servicio_principal, nivel_iso27001, roi_neto, horas_incidentes, datos_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                form_data.get("Nombre Empresa"), form_data.get("ID Empresa"),
+                *(form_data.get(clave) for clave in COLUMNAS_INDEXADAS),
+                roi_neto, horas_incidentes,
+                json.dumps(datos, ensure_ascii=False),
+            ),
+        )
+        envio_id = cursor.lastrowid
+        self._conexion_escritura.executemany(
+            "INSERT INTO incidentes_envio (envio_id, posicion, incidente, duracion_h) VALUES (?, ?, ?, ?)",
+            [
+                (envio_id, posicion, tipo, duracion)
+                for posicion, (tipo, duracion) in enumerate(zip(incidentes.tipos().tolist(), incidentes.duraciones.tolist()))
+            ],
+        )
+        return envio_id
+
+    def _volcar_agregados(self, acumulados, histograma):
+        self._conexion_escritura.executemany(_UPSERT_AGREGADOS, [(*clave, *valores) for clave, valores in acumulados.items()])
+        self._conexion_escritura.executemany(_UPSERT_HISTOGRAMA, [(*clave, conteo) for clave, conteo in histograma.items()])
+
+    def _migrar(self):
+        # Bases creadas antes de los agregados: se agregan las columnas nuevas y se reconstruyen una sola vez.
+        columnas = {fila["name"] for fila in self._conexion_escritura.execute("PRAGMA table_info(envios)")}
+        with self._conexion_escritura:
+            for columna in ("roi_neto", "horas_incidentes"):
+                if columna not in columnas:
+                    self._conexion_escritura.execute(f"ALTER TABLE envios ADD COLUMN {columna} REAL")
+        hay_envios = self._conexion_escritura.execute("SELECT 1 FROM envios LIMIT 1").fetchone()
+        hay_agregados = self._conexion_escritura.execute("SELECT 1 FROM agregados LIMIT 1").fetchone()
+        if hay_envios and not hay_agregados:
+            self.reconstruir_agregados()
+
+    def reconstruir_agregados(self, tamano_bloque=10000):
+        """Recalcula desde cero el ROI guardado y los agregados de todos los envíos (mantenimiento)."""
+        import pandas as pd
+
+        with self._conexion_escritura:
+            self._conexion_escritura.execute("DELETE FROM agregados")
+            self._conexion_escritura.execute("DELETE FROM agregados_histograma_roi")
+            ultimo_id = 0
+            while True:
+                filas = self._conexion_escritura.execute(
+                    "SELECT e.id, e.datos_json, COUNT(i.posicion) AS num_incidentes, COALESCE(SUM(i.duracion_h), 0) AS horas "
+                    "FROM envios e LEFT JOIN incidentes_envio i ON i.envio_id = e.id "
+                    "WHERE e.id > ? GROUP BY e.id ORDER BY e.id LIMIT ?",
+                    (ultimo_id, tamano_bloque),
+                ).fetchall()
+                if not filas:
+                    break
+                lista_form_data = [json.loads(fila["datos_json"]) for fila in filas]
+                roi = calcular_roi_lote(pd.DataFrame(lista_form_data))
+                acumulados, histograma = {}, {}
+                for fila, form_data, roi_envio in zip(filas, lista_form_data, roi.to_dict(orient="records")):
+                    _acumular(acumulados, histograma, form_data, roi_envio, fila["num_incidentes"], fila["horas"])
+                self._conexion_escritura.executemany(
+                    "UPDATE envios SET roi_neto = ?, horas_incidentes = ? WHERE id = ?",
+                    [(roi_envio, fila["horas"], fila["id"]) for fila, roi_envio in zip(filas, roi[ROI_NETO].tolist())],
+                )
+                self._volcar_agregados(acumulados, histograma)
+                ultimo_id = filas[-1]["id"]
+
+    # --- LECTURA ---
+    def _lector(self):
+        conexion = getattr(self._lectores, "conexion", None)
+        if conexion is None:
+            conexion = self._lectores.conexion = _conectar(self.ruta)
+        return conexion
+
+    def cargar_envio(self, envio_id):
+        """Devuelve el form_data de un envío (con sus incidentes) o None si no existe."""
+        conexion = self._lector()
+        fila = conexion.execute("SELECT datos_json FROM envios WHERE id = ?", (envio_id,)).fetchone()
+        if fila is None:
+            return None
+        form_data = json.loads(fila["datos_json"])
+        filas_incidentes = conexion.execute(
+            "SELECT incidente, duracion_h FROM incidentes_envio WHERE envio_id = ? ORDER BY posicion", (envio_id,)
+        ).fetchall()
+        form_data[COL_INCIDENTES] = IncidentesCompactos.desde_columnas(
+            [fila["incidente"] for fila in filas_incidentes], [fila["duracion_h"] for fila in filas_incidentes]
+        )
+        return form_data
+
+    def buscar_envios(self, pais_sede=None, tamano_empresa=None, servicio_principal=None, nivel_iso27001=None, limite=100):
+        """Lista los envíos más recientes que cumplen los filtros dados (todos sobre columnas indexadas)."""
+        condiciones, parametros = _filtros(pais_sede, tamano_empresa, servicio_principal, nivel_iso27001)
+        consulta = "SELECT id, creado_en, nombre_empresa, id_empresa, pais_sede, tamano_empresa, servicio_principal, nivel_iso27001 FROM envios"
+        if condiciones:
+            consulta += " WHERE " + " AND ".join(condiciones)
+        consulta += " ORDER BY id DESC LIMIT ?"
+        return [dict(fila) for fila in self._lector().execute(consulta, (*parametros, limite))]
+
+    def contar_envios(self, pais_sede=None, tamano_empresa=None, servicio_principal=None, nivel_iso27001=None):
+        return self.contar_envios_hasta_ultimo(pais_sede, tamano_empresa, servicio_principal, nivel_iso27001)[0]
+
+    def contar_envios_hasta_ultimo(self, pais_sede=None, tamano_empresa=None, servicio_principal=None, nivel_iso27001=None):
+        """(número de envíos que cumplen los filtros, ID del último de ellos o 0), leídos en una sola consulta.
+
+        Con `iterar_envios(hasta_id=...)` el recorrido cubre exactamente esos envíos aunque se
+        guarden otros mientras tanto.
+        """
+        condiciones, parametros = _filtros(pais_sede, tamano_empresa, servicio_principal, nivel_iso27001)
+        consulta = "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM envios" + (" WHERE " + " AND ".join(condiciones) if condiciones else "")
+        return tuple(self._lector().execute(consulta, parametros).fetchone())
+
+    def iterar_envios(self, pais_sede=None, tamano_empresa=None, servicio_principal=None, nivel_iso27001=None,
+                      tamano_bloque=500, hasta_id=None):
+        """Recorre los envíos que cumplen los filtros en bloques de (ID, form_data con sus incidentes).
+
+        Cada bloque se lee con dos consultas (envíos e incidentes por rango de ID), sin cargar
+        todo el portafolio en memoria. Con `hasta_id` se omiten los envíos de ID mayor.
+        """
+        condiciones, parametros = _filtros(pais_sede, tamano_empresa, servicio_principal, nivel_iso27001)
+        if hasta_id is not None:
+            condiciones, parametros = ["id <= ?", *condiciones], [hasta_id, *parametros]
+        conexion = self._lector()
+        ultimo_id = 0
+        while True:
+            filas = conexion.execute(
+                "SELECT id, datos_json FROM envios WHERE " + " AND ".join(["id > ?", *condiciones]) + " ORDER BY id LIMIT ?",
+                (ultimo_id, *parametros, tamano_bloque),
+            ).fetchall()
+            if not filas:
+                return
+            incidentes = {fila["id"]: ([], []) for fila in filas}
+            for fila in conexion.execute(
+                "SELECT envio_id, incidente, duracion_h FROM incidentes_envio WHERE envio_id BETWEEN ? AND ? "
+                "ORDER BY envio_id, posicion",
+                (filas[0]["id"], filas[-1]["id"]),
+            ):
+                if fila["envio_id"] in incidentes:  # El rango puede incluir envíos excluidos por los filtros
+                    tipos, duraciones = incidentes[fila["envio_id"]]
+                    tipos.append(fila["incidente"])
+                    duraciones.append(fila["duracion_h"])
+            bloque = []
+            for fila in filas:
+                form_data = json.loads(fila["datos_json"])
+                form_data[COL_INCIDENTES] = IncidentesCompactos.desde_columnas(*incidentes[fila["id"]])
+                bloque.append((fila["id"], form_data))
+            yield bloque
+            ultimo_id = filas[-1]["id"]
+
+    def leer_rasgos_pares(self, desde_id=0, limite=50000):
+        """Rasgos de los envíos con ID mayor a `desde_id`, en orden de ID, para indice_pares.py:
+        (id, servicio, tamaño, país, nivel ISO, empleados, ROI neto, horas de incidentes, presupuesto %)."""
+        return self._lector().execute(
+            "SELECT id, servicio_principal, tamano_empresa, pais_sede, nivel_iso27001, "
+            "json_extract(datos_json, '$.\"Número Empleados\"'), roi_neto, horas_incidentes, "
+            "json_extract(datos_json, '$.\"Presupuesto Ciberseguridad (%)\"') "
+            "FROM envios WHERE id > ? ORDER BY id LIMIT ?",
+            (desde_id, limite),
+        ).fetchall()
+
+    def leer_agregados(self, dimension="total"):
+        """Agregados mantenidos de una dimensión, uno por valor (lectura directa, sin recorrer envíos)."""
+        return [dict(fila) for fila in self._lector().execute(
+            "SELECT * FROM agregados WHERE dimension = ? ORDER BY num_envios DESC", (dimension,)
+        )]
+
+    def leer_histograma_roi(self, dimension="total", valor="Todas"):
+        """Conteo de envíos por cubeta de BORDES_HISTOGRAMA_ROI para un valor de una dimensión."""
+        conteos = [0] * (len(BORDES_HISTOGRAMA_ROI) + 1)
+        for fila in self._lector().execute(
+            "SELECT cubeta, conteo FROM agregados_histograma_roi WHERE dimension = ? AND valor = ?", (dimension, valor)
+        ):
+            conteos[fila["cubeta"]] = fila["conteo"]
+        return conteos
+
+
+def _filtros(pais_sede, tamano_empresa, servicio_principal, nivel_iso27001):
+    # Condiciones SQL (sobre columnas indexadas) y parámetros de los filtros que no son None.
+    filtros = {
+        "pais_sede": pais_sede, "tamano_empresa": tamano_empresa,
+        "servicio_principal": servicio_principal, "nivel_iso27001": nivel_iso27001,
+    }
+    condiciones = [f"{columna} = ?" for columna, valor in filtros.items() if valor is not None]
+    return condiciones, [valor for valor in filtros.values() if valor is not None]
+
+
+def _acumular(acumulados, histograma, form_data, roi_envio, num_incidentes, horas_incidentes):
+    # Suma la contribución de un envío a cada dimensión agregada (se vuelca luego con UPSERT).
+    roi_neto = roi_envio[ROI_NETO]
+    cubeta = bisect.bisect_right(BORDES_HISTOGRAMA_ROI, roi_neto)
+    for dimension in DIMENSIONES_AGREGADAS:
+        valor = "Todas" if dimension == "total" else str(form_data.get(_CLAVE_POR_COLUMNA[dimension]) or "Sin dato")
+        actual = acumulados.get((dimension, valor))
+        if actual is None:
+            actual = acumulados[(dimension, valor)] = [0, 0, 0.0, roi_neto, roi_neto, 0.0, 0.0, 0.0, 0, 0.0]
+        actual[0] += 1
+        actual[1] += int(roi_neto < 0)
+        actual[2] += roi_neto
+        actual[3] = min(actual[3], roi_neto)
+        actual[4] = max(actual[4], roi_neto)
+        actual[5] += roi_envio[ROI_AHORRO_ISO]
+        actual[6] += roi_envio[ROI_COSTO_LEGAL]
+        actual[7] += roi_envio[ROI_IMPACTO_REPUTACIONAL]
+        actual[8] += num_incidentes
+        actual[9] += horas_incidentes
+        histograma[(dimension, valor, cubeta)] = histograma.get((dimension, valor, cubeta), 0) + 1
+
+
+_almacen_por_defecto = None
+_candado_almacen = threading.Lock()
+
+
+def almacen_por_defecto():
+    # Instancia compartida por todas las sesiones del servidor (el módulo sobrevive a los reruns).
+    global _almacen_por_defecto
+    with _candado_almacen:
+        if _almacen_por_defecto is None:
+            _almacen_por_defecto = AlmacenEnvios()
+        return _almacen_por_defecto
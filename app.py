@@ -1,17 +1,16 @@
 import streamlit as st
 
-# --- CALLBACK Y CONFIGURACIÓN INICIAL DE SESSION STATE ---
-# Inicializar la variable de sesión para el número de incidentes si no existe.
-if 'num_incidentes_a_detallar_control' not in st.session_state:
-    st.session_state.num_incidentes_a_detallar_control = 0
-
-# Callback para manejar el cambio en el número de incidentes a detallar.
-# Cuando el st.number_input (fuera del form) con la key 'num_incidentes_a_detallar_control'
-# cambia, su valor en st.session_state se actualiza automáticamente.
-# Este callback simplemente asegura que Streamlit re-ejecute el script para
-# que los campos de incidentes dentro del formulario se actualicen.
-def actualizar_campos_de_incidentes_callback():
-    pass # No se necesita lógica adicional aquí si la key del widget coincide con la de session_state.
+from almacen import almacen_por_defecto
+from arranque import precargar_en_segundo_plano
+from incidentes import TIPOS_INCIDENTE, IncidentesCompactos, leer_registro_incidentes
+from indice_pares import NIVELES_ISO27001, TAMANOS_EMPRESA
+from metricas import iniciar_exportacion, medir_etapa, mostrar_panel_tiempos
+
+# Importa en segundo plano (una vez por proceso) los módulos pesados que pages/roi.py usa al
+# dibujar, para que la primera visita a esa página no pague ese costo.
+precargar_en_segundo_plano()
+# Exportación opcional de los tiempos por etapa (ver metricas.py).
+iniciar_exportacion()
 
 st.set_page_config(layout="wide")
 
@@ -21,20 +20,8 @@ st.info(
     "Pasa el cursor sobre los íconos (?) para obtener ayuda sobre cada campo."
 )
 
-# --- CONTROL PARA EL NÚMERO DE INCIDENTES (FUERA DEL FORMULARIO) ---
-st.sidebar.subheader("Configuración de Detalles de Incidentes") # Movido a la sidebar para mejor separación
-st.sidebar.number_input(
-    "¿Cuántos incidentes específicos deseas detallar?",
-    min_value=0, max_value=20, step=1,
-    key='num_incidentes_a_detallar_control', # Esta key actualiza st.session_state
-    on_change=actualizar_campos_de_incidentes_callback, # Callback permitido fuera del form
-    help="Define el número de incidentes para los cuales ingresarás detalles en la sección 'Ciberseguridad' del formulario principal."
-)
-st.sidebar.caption(f"Actualmente configurado para detallar: {st.session_state.num_incidentes_a_detallar_control} incidente(s).")
-
-
 # --- INICIO DEL FORMULARIO ---
-with st.form("caracterizacion_empresa_form"):
+with medir_etapa("formulario_render"), st.form("caracterizacion_empresa_form"):
 
     st.header("🏢 Datos de la Empresa")
     st.subheader("Información General")
@@ -52,7 +39,7 @@ with st.form("caracterizacion_empresa_form"):
     st.subheader("Tamaño y Empleo")
     col1_tam, col2_tam, col3_tam = st.columns(3)
     with col1_tam:
-        tamano_empresa_options = ['Micro (<10 empleados)', 'Pequeña (10-50 empleados)', 'Mediana (51-200 empleados)', 'Grande (>200 empleados)']
+        tamano_empresa_options = TAMANOS_EMPRESA  # Ordinales: el índice de pares (indice_pares.py) depende de este orden
         tamano_empresa = st.selectbox("Tamaño de la Empresa", options=tamano_empresa_options, index=1, help="Clasificación por número de empleados.")
     with col2_tam:
         numero_empleados = st.number_input("Número de Empleados", min_value=0, step=1, help="Total de empleados.")
@@ -72,29 +59,43 @@ with st.form("caracterizacion_empresa_form"):
 
     st.divider()
     st.header("🔒 Ciberseguridad")
-    tipo_incidente_options = ["Malware Virus", "Gusanos", "Troyanos", "Ransomware", "Spyware", "Adware", "Phishing Correos electrónicos fraudulentos", "Smishing", "Vishing", "Spear Phishing", "Whaling", "Pretexting", "Ataque DoS/DDoS", "Interrupción de servicios", "Violación de Datos", "Pérdida o robo de datos", "Ataque a Aplicación Web", "Cross-Site Scripting (XSS)", "Vulnerabilidades de autenticación", "Amenaza Interna", "Errores humanos", "Ataque a Cadena de Suministro", "Ataque de Fuerza Bruta", "Configuración Errónea", "Software sin actualizar", "Robo/Pérdida de Dispositivo", "Ataque de Día Cero", "Suplantación de Identidad", "Otro"]
+    tipo_incidente_options = TIPOS_INCIDENTE
     
     col1_ciber, col2_ciber = st.columns(2)
     with col1_ciber:
-        nivel_iso27001_options = ["No implementado", "En proceso de implementación", "Implementado, no certificado", "Certificado"]
+        nivel_iso27001_options = NIVELES_ISO27001
         nivel_iso27001 = st.selectbox("Nivel de Implementación ISO 27001", options=nivel_iso27001_options, index=0, help="Estado respecto a ISO 27001.")
         incidentes_ciber_12meses = st.number_input("Incidentes de Ciberseguridad (Últimos 12 Meses)", min_value=0, step=1, help="Incidentes de seguridad en el último año.")
         tiempo_respuesta_incidente = st.number_input("Tiempo Promedio Respuesta a Incidentes (Horas)", min_value=0.0, step=0.5, format="%.1f", help="Tiempo promedio (horas) de respuesta.")
         
-        with st.expander("🛠️ Detalles de Incidentes de Ciberseguridad (Configurar cantidad en la barra lateral)"):
+        with st.expander("🛠️ Detalles de Incidentes de Ciberseguridad"):
             st.markdown("Agrega uno o varios incidentes específicos que haya sufrido la empresa, junto con su duración.")
-            
-            # Leer el número de incidentes desde st.session_state (actualizado por el widget externo)
-            num_a_detallar_en_form = st.session_state.get('num_incidentes_a_detallar_control', 0)
-            
-            if num_a_detallar_en_form == 0:
-                st.write("Configure el número de incidentes a detallar en la barra lateral izquierda.")
-
-            for i in range(int(num_a_detallar_en_form)):
-                st.markdown(f"**Incidente #{i+1}**")
-                col_inc1, col_inc2 = st.columns(2)
-                col_inc1.selectbox(f"Tipo de Incidente #{i+1}", options=tipo_incidente_options, key=f"tipo_incidente_{i}")
-                col_inc2.number_input(f"Duración del Incidente #{i+1} (Horas)", min_value=0.0, step=0.5, format="%.1f", key=f"duracion_incidente_{i}")
+            st.caption("Usa ➕ al final de la tabla para agregar filas y selecciona filas para eliminarlas. No hay límite de incidentes.")
+
+            # Importación diferida: los campos anteriores se envían al navegador sin esperar a pandas,
+            # que para este punto suele estar ya cargado por precargar_en_segundo_plano().
+            import pandas as pd
+
+            # Un único editor de tabla: agregar o editar filas ocurre en el navegador y no re-ejecuta
+            # el script; los valores llegan al servidor solo al enviar el formulario.
+            incidentes_editados = st.data_editor(
+                pd.DataFrame({"Incidente": pd.Series(dtype="object"), "Duración (h)": pd.Series(dtype="float64")}),
+                key="editor_incidentes",
+                num_rows="dynamic",
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Incidente": st.column_config.SelectboxColumn("Tipo de Incidente", options=tipo_incidente_options, required=True),
+                    "Duración (h)": st.column_config.NumberColumn("Duración (Horas)", min_value=0.0, step=0.5, format="%.1f", default=0.0),
+                },
+            )
+            # Para miles de incidentes: importar un registro en lugar de escribirlos en la tabla.
+            archivo_incidentes = st.file_uploader(
+                "Importar incidentes desde un registro (CSV o JSON Lines)",
+                type=["csv", "tsv", "txt", "log", "jsonl", "ndjson"],
+                help="Columnas 'Incidente' (o 'Tipo') y 'Duración (h)' (o 'Horas'). Los tipos no reconocidos se registran como 'Otro'. "
+                     "Se suman a los incidentes de la tabla.",
+            )
 
     with col2_ciber:
         tipo_incidente_mas_comun = st.selectbox("Tipo de Incidente Más Común", options=tipo_incidente_options, help="Incidente de ciberseguridad más frecuente.")
@@ -154,38 +155,48 @@ with st.form("caracterizacion_empresa_form"):
 
 # --- PROCESAMIENTO DESPUÉS DEL ENVÍO ---
 if submitted:
+    incidentes_importados = IncidentesCompactos()
+    if archivo_incidentes is not None:
+        try:
+            incidentes_importados = leer_registro_incidentes(archivo_incidentes, archivo_incidentes.name)
+        except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+            st.error(f"No se pudo importar el registro de incidentes '{archivo_incidentes.name}': {e}")
+            st.stop()
+
     st.success("¡Formulario enviado con éxito!")
     st.balloons()
 
-    incidentes_finales_recopilados = []
-    num_incidentes_enviados = st.session_state.get('num_incidentes_a_detallar_control', 0)
-    for i in range(int(num_incidentes_enviados)):
-        tipo = st.session_state.get(f"tipo_incidente_{i}", None)
-        duracion = st.session_state.get(f"duracion_incidente_{i}", 0.0)
-        if tipo is not None:
-            incidentes_finales_recopilados.append({"Incidente": tipo, "Duración (h)": duracion})
-
-    data = {
-        "Nombre Empresa": nombre_empresa, "ID Empresa": id_empresa, "País Sede": pais_sede,
-        "Ciudad Sede": ciudad_sede, "Años Operación": anos_operacion, "Sitio Web": sitio_web,
-        "Tamaño Empresa": tamano_empresa, "Número Empleados": numero_empleados,
-        "Porcentaje Remoto (%)": porcentaje_remoto, "Servicio Principal IT": servicio_principal,
-        "Clientes Principales": clientes_principales, "Exporta Servicios": exporta_servicios,
-        "Nivel ISO 27001": nivel_iso27001, "Incidentes Ciber (12m)": incidentes_ciber_12meses,
-        "Tipo Incidente Común": tipo_incidente_mas_comun,
-        "Tiempo Respuesta Incidentes (h)": tiempo_respuesta_incidente,
-        "Detalles Incidentes": incidentes_finales_recopilados,
-        "Facturación Anual (COP)": facturacion_anual_cop,
-        "Presupuesto Ciberseguridad (%)": presupuesto_ciberseguridad,
-        "ROI Estimado ISO 27001 (%)": roi_iso27001_estimado, "Cumple Ley 1581": cumple_ley1581,
-        "Sanciones Regulatorias (COP, 3a)": sanciones_regulatorias,
-        "Proveedor Cloud": proveedor_cloud, "Metodología Desarrollo": metodologia_desarrollo,
-        "Tecnologías Clave": tecnologias_clave, "Participa MinTIC": participa_mintic,
-        "Competidores Directos": competidores_directos,
-        "Riesgo Reputacional (1-5)": riesgo_reputacional,
-        "Oportunidad Crecimiento (1-5)": oportunidad_crecimiento,
-    }
+    with medir_etapa("armado_envio"):
+        # Forma compacta (códigos de tipo + duraciones float32); las filas sin tipo se descartan.
+        incidentes_finales_recopilados = IncidentesCompactos.desde_columnas(
+            incidentes_editados["Incidente"], incidentes_editados["Duración (h)"]
+        ).concatenar(incidentes_importados)
+
+        data = {
+            "Nombre Empresa": nombre_empresa, "ID Empresa": id_empresa, "País Sede": pais_sede,
+            "Ciudad Sede": ciudad_sede, "Años Operación": anos_operacion, "Sitio Web": sitio_web,
+            "Tamaño Empresa": tamano_empresa, "Número Empleados": numero_empleados,
+            "Porcentaje Remoto (%)": porcentaje_remoto, "Servicio Principal IT": servicio_principal,
+            "Clientes Principales": clientes_principales, "Exporta Servicios": exporta_servicios,
+            "Nivel ISO 27001": nivel_iso27001, "Incidentes Ciber (12m)": incidentes_ciber_12meses,
+            "Tipo Incidente Común": tipo_incidente_mas_comun,
+            "Tiempo Respuesta Incidentes (h)": tiempo_respuesta_incidente,
+            "Detalles Incidentes": incidentes_finales_recopilados,
+            "Facturación Anual (COP)": facturacion_anual_cop,
+            "Presupuesto Ciberseguridad (%)": presupuesto_ciberseguridad,
+            "ROI Estimado ISO 27001 (%)": roi_iso27001_estimado, "Cumple Ley 1581": cumple_ley1581,
+            "Sanciones Regulatorias (COP, 3a)": sanciones_regulatorias,
+            "Proveedor Cloud": proveedor_cloud, "Metodología Desarrollo": metodologia_desarrollo,
+            "Tecnologías Clave": tecnologias_clave, "Participa MinTIC": participa_mintic,
+            "Competidores Directos": competidores_directos,
+            "Riesgo Reputacional (1-5)": riesgo_reputacional,
+            "Oportunidad Crecimiento (1-5)": oportunidad_crecimiento,
+        }
 
     st.session_state["form_data"] = data
+    # Guardado persistente no bloqueante: el hilo escritor del almacén confirma el envío en segundo plano.
+    st.session_state["envio_futuro"] = almacen_por_defecto().guardar_envio(data)
     # st.json(st.session_state["form_data"]) # Descomentar para depuración
-    st.switch_page("pages/roi.py")
\ No newline at end of file
+    st.switch_page("pages/roi.py")
+
+mostrar_panel_tiempos()
\ No newline at end of file
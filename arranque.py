@@ -0,0 +1,129 @@
+"""Arranque rápido: precarga en segundo plano de módulos pesados y reporte de tiempos de arranque.
+
+Las páginas importan pandas y plotly.express solo cuando dibujan un gráfico o una tabla. Para que
+esa primera importación no la pague el primer usuario tras un reinicio del contenedor, app.py
+llama a `precargar_en_segundo_plano()`, que las importa en un hilo aparte.
+
+Reporte de regresiones (cada medición en un intérprete nuevo, salida JSON):
+    python arranque.py --json
+    python arranque.py --limite-ms 3000   # código de salida 1 si el primer render supera el límite
+"""
+import argparse
+import importlib
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Módulos pesados que las páginas importan de forma diferida, en orden de precarga.
+MODULOS_PESADOS = ["numpy", "pandas", "plotly.express", "plotly.graph_objects"]
+RAIZ = Path(__file__).resolve().parent
+
+_tiempos_precarga_ms = {}
+_candado_precarga = threading.Lock()
+_hilo_precarga = None
+
+
+def _precargar():
+    for modulo in MODULOS_PESADOS:
+        inicio = time.perf_counter()
+        try:
+            importlib.import_module(modulo)
+        except ImportError as e:
+            logger.warning("No se pudo precargar %s: %s", modulo, e)
+            continue
+        _tiempos_precarga_ms[modulo] = (time.perf_counter() - inicio) * 1000
+    logger.info("Precarga de módulos completada: %s", {m: f"{ms:.0f} ms" for m, ms in _tiempos_precarga_ms.items()})
+
+
+def precargar_en_segundo_plano():
+    """Inicia (una sola vez por proceso) la importación de MODULOS_PESADOS en un hilo daemon."""
+    global _hilo_precarga
+    with _candado_precarga:
+        if _hilo_precarga is None:
+            _hilo_precarga = threading.Thread(target=_precargar, name="precarga-modulos", daemon=True)
+            _hilo_precarga.start()
+    return _hilo_precarga
+
+
+def tiempos_precarga_ms():
+    # Tiempos medidos por el hilo de precarga (vacío mientras no termine cada módulo).
+    return dict(_tiempos_precarga_ms)
+
+
+# --- REPORTE DE TIEMPOS DE ARRANQUE ---
+# Envío de ejemplo para medir el primer render de pages/roi.py (que requiere form_data).
+_FORM_DATA_EJEMPLO = {
+    "Nombre Empresa": "Empresa de Ejemplo", "País Sede": "Colombia", "Nivel ISO 27001": "No implementado",
+    "Incidentes Ciber (12m)": 2, "Facturación Anual (COP)": 1500000000, "Presupuesto Ciberseguridad (%)": 3.0,
+    "ROI Estimado ISO 27001 (%)": 80.0, "Cumple Ley 1581": "Parcialmente", "Sanciones Regulatorias (COP, 3a)": 20000000,
+    "Riesgo Reputacional (1-5)": 3,
+    "Detalles Incidentes": [{"Incidente": "Ransomware", "Duración (h)": 12.0}, {"Incidente": "Phishing Correos electrónicos fraudulentos", "Duración (h)": 2.5}],
+}
+_SCRIPT_IMPORTACION = "import time; t = time.perf_counter(); import {modulo}; print((time.perf_counter() - t) * 1000)"
+_SCRIPT_PRIMER_RENDER = """
+import time
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({ruta!r}, default_timeout=120)
+for clave, valor in {estado!r}.items():
+    at.session_state[clave] = valor
+at.run()
+assert not at.exception, at.exception
+print((time.perf_counter() - t) * 1000)
+"""
+
+
+def _medir_en_proceso_nuevo(codigo):
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True
+    )
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def medir_arranque():
+    """Mide en intérpretes nuevos la importación de cada módulo y el primer render de cada página."""
+    importaciones = {
+        modulo: _medir_en_proceso_nuevo(_SCRIPT_IMPORTACION.format(modulo=modulo))
+        for modulo in ["streamlit"] + MODULOS_PESADOS
+    }
+    return {
+        "python": sys.version.split()[0],
+        "importacion_ms": importaciones,
+        "primer_render_app_ms": _medir_en_proceso_nuevo(_SCRIPT_PRIMER_RENDER.format(ruta=str(RAIZ / "app.py"), estado={})),
+        "primer_render_roi_ms": _medir_en_proceso_nuevo(_SCRIPT_PRIMER_RENDER.format(
+            ruta=str(RAIZ / "pages" / "roi.py"), estado={"form_data": _FORM_DATA_EJEMPLO}
+        )),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reporte de tiempos de arranque de la aplicación.")
+    parser.add_argument("--json", action="store_true", help="Imprime el reporte como JSON.")
+    parser.add_argument("--limite-ms", type=float, default=None,
+                        help="Falla (código 1) si el primer render de app.py supera este tiempo.")
+    args = parser.parse_args(argv)
+
+    reporte = medir_arranque()
+    if args.json:
+        print(json.dumps(reporte, indent=2))
+    else:
+        for modulo, ms in reporte["importacion_ms"].items():
+            print(f"import {modulo:<22} {ms:8.0f} ms")
+        print(f"primer render app.py        {reporte['primer_render_app_ms']:8.0f} ms")
+        print(f"primer render pages/roi.py  {reporte['primer_render_roi_ms']:8.0f} ms")
+
+    if args.limite_ms is not None and reporte["primer_render_app_ms"] > args.limite_ms:
+        print(f"El primer render ({reporte['primer_render_app_ms']:.0f} ms) supera el límite de {args.limite_ms:.0f} ms",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
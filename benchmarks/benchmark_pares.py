@@ -0,0 +1,183 @@
+"""Benchmark del índice de pares (indice_pares.py): construcción, inserción incremental y latencia de búsqueda.
+
+Con portafolios sintéticos de hasta 1M empresas mide el tiempo de construcción, el costo de indexar
+envíos nuevos uno por uno y los percentiles de latencia de `comparar` (el llamado que hace
+pages/roi.py). También verifica, contra un recorrido completo con numpy, que los pares
+devueltos sean realmente los más cercanos.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.benchmark_pares --tamanos 10000 1000000
+    python -m benchmarks.benchmark_pares --tamanos 1000000 --limite-p99-ms 50   # código 1 si se supera
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.benchmark_roi import SEMILLA_POR_DEFECTO, _commit_git
+from indice_pares import K_PARES, NIVELES_ISO27001, PESOS, TAMANOS_EMPRESA, IndicePares, _log_empleados, _ordinal
+
+TAMANOS_POR_DEFECTO = [10000, 100000, 1000000]
+CONSULTAS_POR_DEFECTO = 1000
+INSERCIONES_INCREMENTALES = 1000
+# Consultas que se comparan con un recorrido completo (cada una recorre todo el portafolio).
+CONSULTAS_VERIFICADAS = 20
+TAMANO_BLOQUE = 50000
+
+_SERVICIOS = ["Desarrollo de Software", "Ciberseguridad", "Cloud", "Big Data", "Fintech", "Outsourcing", "Consultoría IT",
+              "Servicios en la Nube", "Soporte Técnico", "Gestión de Infraestructura", "Desarrollo de Aplicaciones",
+              "Análisis de Datos", "Inteligencia Artificial", "Diseño y Desarrollo", "Marketing Digital", "Formación IT",
+              "Servicios de Telecomunicaciones", "Internet de las Cosas", "Blockchain", "Otro"]
+_PAISES = ["Colombia", "México", "Perú", "Chile", "Argentina", "Ecuador", "España", "Otro"]
+# Rango de empleados (mínimo, máximo) de cada tamaño, en el orden de TAMANOS_EMPRESA.
+_EMPLEADOS_POR_TAMANO = [(1, 9), (10, 50), (51, 200), (201, 5000)]
+
+
+def generar_rasgos(n, semilla=SEMILLA_POR_DEFECTO, primer_id=1):
+    """Columnas en el orden de IndicePares.agregar; los sectores y países con frecuencias desiguales."""
+    rng = np.random.default_rng(semilla)
+    tamanos = rng.choice(len(TAMANOS_EMPRESA), n, p=[0.35, 0.35, 0.2, 0.1])
+    minimos = np.array([minimo for minimo, _ in _EMPLEADOS_POR_TAMANO])[tamanos]
+    maximos = np.array([maximo for _, maximo in _EMPLEADOS_POR_TAMANO])[tamanos]
+    empleados = np.round(np.exp(rng.uniform(np.log(minimos), np.log(maximos + 1)))).astype(np.int64)
+    pesos_servicio = 1.0 / np.arange(1, len(_SERVICIOS) + 1)
+    return (
+        np.arange(primer_id, primer_id + n),
+        rng.choice(_SERVICIOS, n, p=pesos_servicio / pesos_servicio.sum()).tolist(),
+        np.array(TAMANOS_EMPRESA, dtype=object)[tamanos].tolist(),
+        rng.choice(_PAISES, n, p=[0.5, 0.15, 0.1, 0.08, 0.07, 0.05, 0.03, 0.02]).tolist(),
+        rng.choice(NIVELES_ISO27001, n).tolist(),
+        empleados.tolist(),
+        rng.normal(0, 5e8, n).tolist(),
+        np.round(rng.exponential(20, n), 1).tolist(),
+        np.round(rng.uniform(0, 15, n), 1).tolist(),
+    )
+
+
+def _construir(rasgos):
+    indice = IndicePares()
+    for inicio in range(0, len(rasgos[0]), TAMANO_BLOQUE):
+        indice.agregar(*(columna[inicio:inicio + TAMANO_BLOQUE] for columna in rasgos))
+    return indice
+
+
+def _consultas(n, semilla):
+    # Empresas nuevas (no indexadas) como form_data mínimos.
+    rasgos = generar_rasgos(n, semilla + 1)
+    return [
+        {"Servicio Principal IT": servicio, "Tamaño Empresa": tamano, "País Sede": pais, "Nivel ISO 27001": nivel,
+         "Número Empleados": empleados, "Presupuesto Ciberseguridad (%)": presupuesto}
+        for servicio, tamano, pais, nivel, empleados, presupuesto
+        in zip(rasgos[1], rasgos[2], rasgos[3], rasgos[4], rasgos[5], rasgos[8])
+    ], rasgos[6], rasgos[7]
+
+
+def _k_esima_distancia_exacta(rasgos_np, form_data, k):
+    # Recorrido completo: distancias a todas las empresas del mismo sector.
+    servicios, tamanos, paises, niveles, claves = rasgos_np
+    mismo_sector = servicios == form_data["Servicio Principal IT"]
+    distancias = (
+        PESOS["tamano"] * (tamanos[mismo_sector] - _ordinal(form_data["Tamaño Empresa"], TAMANOS_EMPRESA)) ** 2
+        + PESOS["pais"] * (paises[mismo_sector] != form_data["País Sede"])
+        + PESOS["nivel_iso"] * (niveles[mismo_sector] - _ordinal(form_data["Nivel ISO 27001"], NIVELES_ISO27001)) ** 2
+        + PESOS["empleados"] * (claves[mismo_sector] - _log_empleados(form_data["Número Empleados"])) ** 2
+    )
+    return float(np.sort(distancias)[min(k, len(distancias)) - 1])
+
+
+def medir_tamano(n, consultas=CONSULTAS_POR_DEFECTO, k=K_PARES, semilla=SEMILLA_POR_DEFECTO):
+    rasgos = generar_rasgos(n, semilla)
+    inicio = time.perf_counter()
+    indice = _construir(rasgos)
+    segundos_construccion = time.perf_counter() - inicio
+
+    lista_form_data, roi_neto, horas = _consultas(consultas, semilla)
+    latencias = []
+    for form_data, roi, horas_empresa in zip(lista_form_data, roi_neto, horas):
+        inicio = time.perf_counter()
+        indice.comparar(form_data, roi, horas_empresa, k)
+        latencias.append(time.perf_counter() - inicio)
+
+    rasgos_np = (
+        np.array(rasgos[1], dtype=object), np.array([_ordinal(t, TAMANOS_EMPRESA) for t in rasgos[2]]),
+        np.array(rasgos[3], dtype=object), np.array([_ordinal(v, NIVELES_ISO27001) for v in rasgos[4]]),
+        np.log10(1.0 + np.asarray(rasgos[5], dtype=np.float64)).astype(np.float32).astype(np.float64),
+    )
+    exactas = 0
+    for form_data in lista_form_data[:CONSULTAS_VERIFICADAS]:
+        _, distancias = indice.buscar(form_data["Servicio Principal IT"], form_data["Tamaño Empresa"], form_data["País Sede"],
+                                      form_data["Nivel ISO 27001"], form_data["Número Empleados"], k)
+        exactas += bool(np.isclose(distancias[-1], _k_esima_distancia_exacta(rasgos_np, form_data, k)))
+
+    # Envíos nuevos indexados uno por uno, como llegan desde el almacén entre cargas de página.
+    nuevos = generar_rasgos(INSERCIONES_INCREMENTALES, semilla + 2, primer_id=n + 1)
+    inicio = time.perf_counter()
+    for i in range(INSERCIONES_INCREMENTALES):
+        indice.agregar(*([columna[i]] for columna in nuevos))
+    segundos_incremental = time.perf_counter() - inicio
+
+    ms = np.array(latencias) * 1000
+    return {
+        "empresas": n,
+        "k": k,
+        "construccion_s": segundos_construccion,
+        "insercion_incremental_ms": segundos_incremental / INSERCIONES_INCREMENTALES * 1000,
+        "consultas": len(latencias),
+        "latencia_p50_ms": float(np.percentile(ms, 50)),
+        "latencia_p99_ms": float(np.percentile(ms, 99)),
+        "latencia_max_ms": float(ms.max()),
+        "consultas_verificadas": min(CONSULTAS_VERIFICADAS, len(lista_form_data)),
+        "consultas_exactas": exactas,
+    }
+
+
+def ejecutar(tamanos=TAMANOS_POR_DEFECTO, consultas=CONSULTAS_POR_DEFECTO, k=K_PARES, semilla=SEMILLA_POR_DEFECTO):
+    resultados = []
+    for n in tamanos:
+        resultado = medir_tamano(n, consultas, k, semilla)
+        resultados.append(resultado)
+        print(json.dumps(resultado, ensure_ascii=False), file=sys.stderr)
+    return {
+        "metadatos": {
+            "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _commit_git(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "semilla": semilla,
+        },
+        "resultados": resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del índice de pares.")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS_POR_DEFECTO, help="Empresas indexadas por corrida.")
+    parser.add_argument("--consultas", type=int, default=CONSULTAS_POR_DEFECTO)
+    parser.add_argument("--k", type=int, default=K_PARES, help="Pares por consulta.")
+    parser.add_argument("--semilla", type=int, default=SEMILLA_POR_DEFECTO)
+    parser.add_argument("--limite-p99-ms", type=float, default=None, help="Código de salida 1 si el p99 lo supera.")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de salida (por defecto, la salida estándar).")
+    args = parser.parse_args(argv)
+
+    reporte = ejecutar(args.tamanos, args.consultas, args.k, args.semilla)
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
+    else:
+        print(texto)
+    if args.limite_p99_ms is not None and any(r["latencia_p99_ms"] > args.limite_p99_ms for r in reporte["resultados"]):
+        return 1
+    if any(r["consultas_exactas"] < r["consultas_verificadas"] for r in reporte["resultados"]):
+        print("El índice devolvió pares que no son los más cercanos.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Benchmark reproducible del núcleo del ROI (calculo_roi + recomendaciones), sin Streamlit.
+
+Mide rendimiento (empresas/s) y memoria pico (tracemalloc) con portafolios sintéticos de
+1, 1k, 100k y 1M empresas con un número variable de incidentes por empresa, y emite los
+resultados en JSON para comparar versiones.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.benchmark_roi --salida resultados.json
+    python -m benchmarks.benchmark_roi --tamanos 1 1000 --repeticiones 5
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from calculo_roi import calcular_roi_lote, calcular_roi_segmentado
+from recomendaciones import generar_recomendaciones, generar_recomendaciones_lote
+
+TAMANOS_POR_DEFECTO = [1, 1000, 100000, 1000000]
+# Los casos que recorren empresa por empresa en Python se limitan a este número de filas.
+MAX_FILAS_ESCALAR_POR_DEFECTO = 100000
+SEMILLA_POR_DEFECTO = 20240601
+
+_PAISES = ["Colombia", "México", "Perú", "Chile", "Argentina", "Ecuador", "España", "Otro"]
+_ESTADOS_LEY_1581 = ["Sí", "No", "Parcialmente", "No aplica"]
+_NIVELES_ISO = ["No implementado", "En proceso de implementación", "Implementado, no certificado", "Certificado"]
+_TIPOS_INCIDENTE = ["Malware Virus", "Ransomware", "Phishing Correos electrónicos fraudulentos", "Ataque DoS/DDoS",
+                    "Violación de Datos", "Errores humanos", "Configuración Errónea", "Otro"]
+
+
+def generar_portafolio(n, semilla=SEMILLA_POR_DEFECTO):
+    """DataFrame sintético con las columnas de form_data y el número de incidentes por empresa."""
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        "ID Empresa": np.char.add("EMP-", np.arange(n).astype(str)),
+        "País Sede": rng.choice(_PAISES, n),
+        "Nivel ISO 27001": rng.choice(_NIVELES_ISO, n),
+        "Facturación Anual (COP)": rng.integers(0, 50_000_000_000, n),
+        "Presupuesto Ciberseguridad (%)": np.round(rng.uniform(0, 15, n), 1) * (rng.random(n) > 0.1),
+        "ROI Estimado ISO 27001 (%)": np.round(rng.uniform(0, 300, n), 1) * (rng.random(n) > 0.2),
+        "Cumple Ley 1581": rng.choice(_ESTADOS_LEY_1581, n),
+        "Sanciones Regulatorias (COP, 3a)": rng.integers(0, 500_000_000, n) * (rng.random(n) > 0.6),
+        "Riesgo Reputacional (1-5)": rng.integers(1, 6, n),
+        "Incidentes Ciber (12m)": rng.poisson(3, n),
+        # Número de incidentes detallados: mayoría con pocos, algunas con muchos (cola larga).
+        "num_incidentes_detallados": np.minimum(rng.geometric(0.35, n) - 1, 200),
+    })
+
+
+def materializar_form_data(portafolio, semilla=SEMILLA_POR_DEFECTO):
+    """Convierte filas del portafolio en dicts form_data con su lista de "Detalles Incidentes"."""
+    rng = np.random.default_rng(semilla + 1)
+    registros = portafolio.drop(columns="num_incidentes_detallados").to_dict(orient="records")
+    for registro, num_incidentes in zip(registros, portafolio["num_incidentes_detallados"].tolist()):
+        tipos = rng.choice(_TIPOS_INCIDENTE, num_incidentes)
+        duraciones = np.round(rng.exponential(6.0, num_incidentes), 1)
+        registro["Detalles Incidentes"] = [
+            {"Incidente": tipo, "Duración (h)": duracion} for tipo, duracion in zip(tipos.tolist(), duraciones.tolist())
+        ]
+    return registros
+
+
+# --- CASOS DE BENCHMARK ---
+# Cada caso recibe (portafolio, lista de form_data o None) y procesa todas las filas.
+def _roi_escalar(portafolio, registros):
+    for form_data in registros:
+        calcular_roi_segmentado(form_data)
+
+
+def _roi_lote(portafolio, registros):
+    calcular_roi_lote(portafolio)
+
+
+def _roi_y_recomendaciones_escalar(portafolio, registros):
+    for form_data in registros:
+        generar_recomendaciones(form_data, calcular_roi_segmentado(form_data))
+
+
+def _roi_y_recomendaciones_lote(portafolio, registros):
+    # Mismas filas que el caso escalar, evaluadas como un solo DataFrame con las reglas compiladas.
+    df = pd.DataFrame(registros)
+    generar_recomendaciones_lote(df, calcular_roi_lote(df))
+
+
+CASOS = {
+    # nombre: (función, necesita form_data materializados)
+    "roi_escalar": (_roi_escalar, True),
+    "roi_lote": (_roi_lote, False),
+    "roi_y_recomendaciones_escalar": (_roi_y_recomendaciones_escalar, True),
+    "roi_y_recomendaciones_lote": (_roi_y_recomendaciones_lote, True),
+}
+
+
+def medir(funcion, portafolio, registros, repeticiones):
+    # Tiempo: mejor de `repeticiones`; memoria pico: una corrida aparte bajo tracemalloc
+    # (tracemalloc ralentiza la ejecución, por eso no se mezcla con la medición de tiempo).
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(portafolio, registros)
+        tiempos.append(time.perf_counter() - inicio)
+    tracemalloc.start()
+    funcion(portafolio, registros)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tiempos), pico
+
+
+def _commit_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(tamanos=TAMANOS_POR_DEFECTO, repeticiones=3, max_filas_escalar=MAX_FILAS_ESCALAR_POR_DEFECTO,
+             semilla=SEMILLA_POR_DEFECTO, casos=None):
+    resultados = []
+    for n in tamanos:
+        portafolio = generar_portafolio(n, semilla)
+        registros = materializar_form_data(portafolio, semilla) if n <= max_filas_escalar else None
+        # Con portafolios grandes se repite menos para mantener acotada la duración total.
+        repeticiones_n = repeticiones if n <= 1000 else 1
+        for nombre in casos or CASOS:
+            funcion, requiere_registros = CASOS[nombre]
+            resultado = {"caso": nombre, "empresas": n, "incidentes_detallados": int(portafolio["num_incidentes_detallados"].sum())}
+            if requiere_registros and registros is None:
+                resultado["omitido"] = f"más de {max_filas_escalar} filas para un caso escalar"
+            else:
+                segundos, pico = medir(funcion, portafolio, registros, repeticiones_n)
+                resultado.update({
+                    "segundos": segundos,
+                    "empresas_por_segundo": n / segundos if segundos > 0 else None,
+                    "memoria_pico_bytes": pico,
+                    "repeticiones": repeticiones_n,
+                })
+            resultados.append(resultado)
+            print(json.dumps(resultado, ensure_ascii=False), file=sys.stderr)
+    return {
+        "metadatos": {
+            "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _commit_git(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "plataforma": platform.platform(),
+            "semilla": semilla,
+        },
+        "resultados": resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del núcleo del ROI.")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS_POR_DEFECTO, help="Número de empresas por corrida.")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones para tamaños <= 1000 (se reporta la mejor).")
+    parser.add_argument("--max-filas-escalar", type=int, default=MAX_FILAS_ESCALAR_POR_DEFECTO,
+                        help="Tamaño máximo para los casos que recorren empresa por empresa.")
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), default=None, help="Subconjunto de casos a medir.")
+    parser.add_argument("--semilla", type=int, default=SEMILLA_POR_DEFECTO)
+    parser.add_argument("--salida", default=None, help="Archivo JSON de salida (por defecto, la salida estándar).")
+    args = parser.parse_args(argv)
+
+    reporte = ejecutar(args.tamanos, args.repeticiones, args.max_filas_escalar, args.semilla, args.casos)
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
+    else:
+        print(texto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Generador de carga para servicio_puntuacion.py: latencia p50/p99 y rendimiento bajo concurrencia.
+
+Cada cliente concurrente mantiene una conexión keep-alive y envía solicitudes POST /puntuar una
+tras otra con empresas sintéticas (las mismas de benchmark_roi). Sin --url se levanta el servicio
+en el mismo proceso, en un puerto libre de localhost.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.carga_servicio --concurrencia 1 16 64 --solicitudes 2000
+    python -m benchmarks.carga_servicio --url http://127.0.0.1:8765 --empresas-por-solicitud 10
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from benchmarks.benchmark_roi import SEMILLA_POR_DEFECTO, generar_portafolio, materializar_form_data
+from servicio_puntuacion import ESPERA_MAX_MS, MAX_EMPRESAS_LOTE, ServicioPuntuacion
+
+CONCURRENCIAS_POR_DEFECTO = [1, 8, 64]
+SOLICITUDES_POR_DEFECTO = 2000
+# Cuerpos distintos que se reparten cíclicamente entre las solicitudes.
+NUM_CUERPOS = 256
+
+
+def generar_cuerpos(empresas_por_solicitud, num_cuerpos=NUM_CUERPOS, semilla=SEMILLA_POR_DEFECTO):
+    registros = materializar_form_data(generar_portafolio(num_cuerpos * empresas_por_solicitud, semilla), semilla)
+    cuerpos = []
+    for i in range(num_cuerpos):
+        empresas = registros[i * empresas_por_solicitud:(i + 1) * empresas_por_solicitud]
+        cuerpo = empresas[0] if empresas_por_solicitud == 1 else empresas
+        cuerpos.append(json.dumps(cuerpo, ensure_ascii=False).encode("utf-8"))
+    return cuerpos
+
+
+async def _cliente(host, puerto, cuerpos, siguiente, total, latencias, errores):
+    reader, writer = await asyncio.open_connection(host, puerto)
+    try:
+        while (i := next(siguiente)) < total:
+            cuerpo = cuerpos[i % len(cuerpos)]
+            inicio = time.perf_counter()
+            writer.write(
+                f"POST /puntuar HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(cuerpo)}\r\n\r\n".encode("latin-1") + cuerpo
+            )
+            await writer.drain()
+            estado = int((await reader.readline()).split()[1])
+            largo = 0
+            while (encabezado := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                nombre, _, valor = encabezado.decode("latin-1").partition(":")
+                if nombre.strip().lower() == "content-length":
+                    largo = int(valor)
+            await reader.readexactly(largo)
+            latencias.append(time.perf_counter() - inicio)
+            if estado != 200:
+                errores.append(estado)
+    finally:
+        writer.close()
+
+
+async def medir_concurrencia(host, puerto, cuerpos, concurrencia, solicitudes):
+    """Envía `solicitudes` con `concurrencia` clientes y devuelve percentiles de latencia y rendimiento."""
+    siguiente = iter(range(solicitudes + concurrencia))  # Contador compartido (un solo hilo: sin candado)
+    latencias, errores = [], []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(
+        _cliente(host, puerto, cuerpos, siguiente, solicitudes, latencias, errores) for _ in range(concurrencia)
+    ))
+    duracion = time.perf_counter() - inicio
+    ms = np.array(latencias) * 1000
+    return {
+        "concurrencia": concurrencia,
+        "solicitudes": len(latencias),
+        "errores": len(errores),
+        "segundos": duracion,
+        "solicitudes_por_segundo": len(latencias) / duracion,
+        "latencia_p50_ms": float(np.percentile(ms, 50)),
+        "latencia_p99_ms": float(np.percentile(ms, 99)),
+        "latencia_max_ms": float(ms.max()),
+    }
+
+
+async def ejecutar(url=None, concurrencias=CONCURRENCIAS_POR_DEFECTO, solicitudes=SOLICITUDES_POR_DEFECTO,
+                   empresas_por_solicitud=1, max_empresas_lote=MAX_EMPRESAS_LOTE, espera_max_ms=ESPERA_MAX_MS):
+    cuerpos = generar_cuerpos(empresas_por_solicitud)
+    servicio = None
+    if url is None:
+        servicio = ServicioPuntuacion(max_empresas_lote, espera_max_ms)
+        host, puerto = "127.0.0.1", await servicio.iniciar("127.0.0.1", 0)
+    else:
+        partes = urlsplit(url)
+        host, puerto = partes.hostname, partes.port or 80
+    resultados = []
+    try:
+        # Calentamiento: importaciones diferidas (pandas) y primera conexión.
+        await medir_concurrencia(host, puerto, cuerpos, 1, 5)
+        for concurrencia in concurrencias:
+            lotes_antes = servicio.estadisticas["lotes"] if servicio else None
+            resultado = {"empresas_por_solicitud": empresas_por_solicitud,
+                         **await medir_concurrencia(host, puerto, cuerpos, concurrencia, solicitudes)}
+            resultado["empresas_por_segundo"] = resultado["solicitudes_por_segundo"] * empresas_por_solicitud
+            if servicio:
+                resultado["microlotes"] = servicio.estadisticas["lotes"] - lotes_antes
+            resultados.append(resultado)
+            print(json.dumps(resultado, ensure_ascii=False), file=sys.stderr)
+    finally:
+        if servicio:
+            await servicio.detener()
+    return {"url": url or f"http://{host}:{puerto} (en proceso)", "espera_max_ms": espera_max_ms,
+            "max_empresas_lote": max_empresas_lote, "resultados": resultados}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de puntuación.")
+    parser.add_argument("--url", default=None, help="Servicio ya iniciado (por defecto se levanta uno en proceso).")
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=CONCURRENCIAS_POR_DEFECTO,
+                        help="Clientes concurrentes por corrida.")
+    parser.add_argument("--solicitudes", type=int, default=SOLICITUDES_POR_DEFECTO, help="Solicitudes por corrida.")
+    parser.add_argument("--empresas-por-solicitud", type=int, default=1)
+    parser.add_argument("--max-empresas-lote", type=int, default=MAX_EMPRESAS_LOTE,
+                        help="Solo para el servicio en proceso.")
+    parser.add_argument("--espera-ms", type=float, default=ESPERA_MAX_MS, help="Solo para el servicio en proceso.")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de salida (por defecto, la salida estándar).")
+    args = parser.parse_args(argv)
+
+    reporte = asyncio.run(ejecutar(args.url, args.concurrencia, args.solicitudes, args.empresas_por_solicitud,
+                                   args.max_empresas_lote, args.espera_ms))
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
+    else:
+        print(texto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
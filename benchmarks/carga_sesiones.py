@@ -0,0 +1,323 @@
+"""Prueba de carga de sesiones concurrentes de la aplicación (app.py -> pages/roi.py) con AppTest.
+
+Cada sesión simulada llena `caracterizacion_empresa_form` con valores aleatorios (incluidos los
+incidentes del editor de tabla), lo envía, lo que la lleva a pages/roi.py, y vuelve a ejecutar
+la página de ROI una vez más (la ejecución que provoca cualquier interacción posterior). Se
+reportan percentiles de latencia por ejecución del script y la memoria que cada sesión retiene en
+`st.session_state`, además del crecimiento de RSS por sesión que se mantiene abierta.
+
+Como en un servidor `streamlit run`, las N sesiones concurrentes son hilos de un mismo proceso:
+comparten el GIL, `st.cache_data`, metricas.REGISTRO y los singletons (almacén, índice de pares,
+gestor de reportes), y arrancan juntas tras una barrera. Cada nivel de concurrencia corre en un
+proceso nuevo para que sus cachés y su RSS no arrastren los de la corrida anterior. Los envíos se
+guardan en una base de datos temporal, no en roi_envios.db.
+
+Límites de la medición (también en los metadatos del reporte): AppTest ejecuta el script sin
+servidor web, así que la latencia no incluye Tornado, el websocket ni la serialización de los
+mensajes al navegador.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.carga_sesiones --concurrencia 1 4 8 --sesiones-por-hilo 5
+    python -m benchmarks.carga_sesiones --concurrencia 4 --limite-p99-ms 3000   # código 1 si se supera
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+RAIZ = Path(__file__).resolve().parent.parent
+CONCURRENCIAS_POR_DEFECTO = [1, 4, 8]
+SESIONES_POR_HILO_POR_DEFECTO = 5
+MAX_INCIDENTES_POR_DEFECTO = 30
+SEMILLA_POR_DEFECTO = 20240601
+# Ejecuciones del script que se miden en cada sesión, en orden.
+ETAPAS = ["formulario", "envio_y_roi", "roi_rerun"]
+PERCENTILES = (50, 90, 99)
+MODELO_CONCURRENCIA = "hilos en un solo proceso (un servidor compartido)"
+LIMITACIONES = ("AppTest ejecuta el script sin servidor web: la latencia no incluye Tornado, el websocket "
+                "ni la serialización de mensajes al navegador, y todas las sesiones usan el mismo session_id "
+                "(no se prueban descargas de archivos).")
+
+
+# --- MEMORIA ---
+def tamano_profundo(objeto, vistos=None):
+    """Bytes aproximados de un objeto y todo lo que referencia (DataFrames y arreglos incluidos)."""
+    if vistos is None:
+        vistos = set()
+    if id(objeto) in vistos:
+        return 0
+    vistos.add(id(objeto))
+    if isinstance(objeto, np.ndarray):
+        return sys.getsizeof(objeto) + (objeto.nbytes if objeto.base is None else 0)
+    if hasattr(objeto, "memory_usage") and hasattr(objeto, "columns"):  # DataFrame
+        return sys.getsizeof(objeto) + int(objeto.memory_usage(deep=True).sum())
+    tamano = sys.getsizeof(objeto)
+    if isinstance(objeto, dict):
+        tamano += sum(tamano_profundo(k, vistos) + tamano_profundo(v, vistos) for k, v in objeto.items())
+    elif isinstance(objeto, (list, tuple, set, frozenset)):
+        tamano += sum(tamano_profundo(elemento, vistos) for elemento in objeto)
+    elif hasattr(objeto, "__dict__") and not isinstance(objeto, type):
+        tamano += tamano_profundo(vars(objeto), vistos)
+    elif hasattr(type(objeto), "__slots__"):  # p. ej. incidentes.IncidentesCompactos
+        tamano += sum(tamano_profundo(getattr(objeto, nombre), vistos)
+                      for nombre in type(objeto).__slots__ if hasattr(objeto, nombre))
+    return tamano
+
+
+def _rss_bytes():
+    # RSS actual del proceso (Linux); None si /proc no está disponible.
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+# --- SESIÓN SIMULADA ---
+def _widget(elementos, etiqueta):
+    return next(elemento for elemento in elementos if elemento.label == etiqueta)
+
+
+def _rellenar_formulario(at, rng, max_incidentes):
+    """Completa el formulario con valores aleatorios y devuelve el estado del editor de incidentes."""
+    _widget(at.text_input, "Nombre de la Empresa").input(f"Empresa {rng.randrange(10**6)}")
+    _widget(at.text_input, "ID Empresa (NIT o RUT)").input(str(rng.randrange(10**8, 10**9)))
+    for etiqueta in ["País Sede", "Tamaño de la Empresa", "Servicio Principal de IT", "Nivel de Implementación ISO 27001"]:
+        selector = _widget(at.selectbox, etiqueta)
+        selector.set_value(rng.choice(selector.options))
+    ley = _widget(at.radio, "¿Cumple con Ley 1581 de 2012 (Protección de Datos Colombia)?")
+    ley.set_value(rng.choice(ley.options))
+    _widget(at.number_input, "Número de Empleados").set_value(rng.randrange(1, 2000))
+    _widget(at.number_input, "Incidentes de Ciberseguridad (Últimos 12 Meses)").set_value(rng.randrange(0, 20))
+    _widget(at.number_input, "Facturación Anual (COP)").set_value(rng.randrange(0, 50_000_000_000, 100_000))
+    _widget(at.number_input, "Presupuesto Anual Ciberseguridad (%)").set_value(round(rng.uniform(0, 15), 1))
+    _widget(at.number_input, "ROI Estimado por ISO 27001 (%)").set_value(round(rng.uniform(0, 300), 1))
+    _widget(at.number_input, "Valor Sanciones Regulatorias Recibidas (COP, últimos 3 años)").set_value(
+        rng.randrange(0, 500_000_000, 1000) if rng.random() < 0.4 else 0
+    )
+    _widget(at.slider, "Nivel de Riesgo Reputacional Percibido").set_value(rng.randint(1, 5))
+
+    # AppTest no expone el editor de tabla como widget: se entrega el mismo estado de edición
+    # (filas agregadas) que enviaría el navegador.
+    tipos = _widget(at.selectbox, "Tipo de Incidente Más Común").options
+    num_incidentes = min(int(rng.expovariate(1 / 4)), max_incidentes)
+    return {
+        "edited_rows": {},
+        "added_rows": [
+            {"Incidente": rng.choice(tipos), "Duración (h)": round(rng.expovariate(1 / 6), 1)} for _ in range(num_incidentes)
+        ],
+        "deleted_rows": [],
+    }
+
+
+def _ejecutar(at, latencias, etapa):
+    inicio = time.perf_counter()
+    at.run()
+    latencias[etapa] = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(f"{etapa}: {at.exception[0].message}")
+
+
+def simular_sesion(rng, max_incidentes=MAX_INCIDENTES_POR_DEFECTO, timeout=120):
+    """Recorre formulario -> envío -> página de ROI. Devuelve (AppTest, latencias por etapa en s)."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(RAIZ / "app.py"), default_timeout=timeout)
+    latencias = {}
+    _ejecutar(at, latencias, "formulario")
+    estado_editor = _rellenar_formulario(at, rng, max_incidentes)
+    _widget(at.button, "💾 Guardar Información").click()
+    at.session_state["editor_incidentes"] = estado_editor
+    _ejecutar(at, latencias, "envio_y_roi")
+    if len(at.metric) < 4:  # Las 4 del ROI (más las de la comparación con pares, si hay pares)
+        raise RuntimeError("envio_y_roi: la página de ROI no mostró las 4 métricas del ROI")
+    _ejecutar(at, latencias, "roi_rerun")
+    return at, latencias
+
+
+def _usar_runtime_compartido():
+    """Permite varias AppTest a la vez en un proceso, como las sesiones de un mismo servidor.
+
+    En cada ejecución AppTest instala estado global de proceso y lo deshace al terminar, lo que
+    rompe las ejecuciones simultáneas de otros hilos:
+    - su Runtime falso en `Runtime._instance`: aquí se instala uno solo para todo el proceso y
+      AppTest escribe el suyo en una subclase que nadie consulta;
+    - la opción `global.appTest` (parchando config.get_option): se activa de forma permanente;
+    - un ScriptCache nuevo (recompila las páginas, y `ast.parse` simultáneo falla en Python 3.11):
+      se comparte uno, como hace el Runtime del servidor.
+    """
+    from unittest.mock import MagicMock
+
+    import streamlit.testing.v1.app_test as app_test
+    import streamlit.testing.v1.local_script_runner as local_script_runner
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test.Runtime = type("RuntimeDeAppTest", (Runtime,), {})
+    config.set_option("global.appTest", True)
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+
+def _hilo_sesiones(indice, sesiones, semilla, max_incidentes, barrera):
+    # Cada hilo es una "sesión concurrente": recorre sus sesiones una tras otra y las mantiene
+    # abiertas (como el servidor hasta que expiran) para medir su memoria retenida.
+    rng = random.Random(semilla + indice)
+    abiertas, latencias, memoria_session_state, errores = [], [], [], []
+    barrera.wait()
+    for _ in range(sesiones):
+        try:
+            at, latencias_sesion = simular_sesion(rng, max_incidentes)
+        except Exception as e:
+            errores.append(str(e))
+            continue
+        abiertas.append(at)
+        latencias.append(latencias_sesion)
+        memoria_session_state.append(tamano_profundo(dict(at.session_state.filtered_state)))
+    return {"abiertas": abiertas, "latencias": latencias, "memoria_session_state_bytes": memoria_session_state,
+            "errores": errores}
+
+
+def _servidor(concurrencia, sesiones, semilla, max_incidentes, ruta_bd, resultados):
+    # Un proceso = un servidor: `concurrencia` hilos con sesiones simultáneas.
+    os.environ["ROI_DB_PATH"] = ruta_bd
+    sys.path.insert(0, str(RAIZ))
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    _usar_runtime_compartido()
+    errores = []
+    try:
+        simular_sesion(random.Random(semilla - 1), max_incidentes)  # Calentamiento: importaciones y cachés
+    except Exception as e:
+        errores.append(f"calentamiento: {e}")
+    rss_inicial = _rss_bytes()
+
+    barrera = threading.Barrier(concurrencia)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        por_hilo = list(ejecutor.map(
+            lambda i: _hilo_sesiones(i, sesiones, semilla, max_incidentes, barrera), range(concurrencia)
+        ))
+    duracion = time.perf_counter() - inicio
+    rss_final = _rss_bytes()
+    abiertas = sum(len(resultado["abiertas"]) for resultado in por_hilo)
+    resultados.put({
+        "latencias": [sesion for resultado in por_hilo for sesion in resultado["latencias"]],
+        "memoria_session_state_bytes": [b for resultado in por_hilo for b in resultado["memoria_session_state_bytes"]],
+        "rss_por_sesion_bytes": (rss_final - rss_inicial) / abiertas if abiertas and rss_inicial else None,
+        "segundos": duracion,
+        "errores": errores + [error for resultado in por_hilo for error in resultado["errores"]],
+    })
+
+
+# --- CORRIDAS ---
+def _percentiles(valores_s):
+    ms = np.array(valores_s) * 1000
+    if not len(ms):
+        return {}
+    return {**{f"p{p}_ms": float(np.percentile(ms, p)) for p in PERCENTILES}, "max_ms": float(ms.max())}
+
+
+def medir_concurrencia(concurrencia, sesiones_por_hilo, semilla=SEMILLA_POR_DEFECTO,
+                       max_incidentes=MAX_INCIDENTES_POR_DEFECTO, ruta_bd=None):
+    contexto = multiprocessing.get_context("spawn")  # Proceso limpio: sin estado de Streamlit heredado
+    cola = contexto.Queue()
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_bd = ruta_bd or os.path.join(directorio, "carga_sesiones.db")
+        proceso = contexto.Process(target=_servidor,
+                                   args=(concurrencia, sesiones_por_hilo, semilla, max_incidentes, ruta_bd, cola))
+        proceso.start()
+        resultado = cola.get()
+        proceso.join()
+
+    latencias = resultado["latencias"]
+    memoria = resultado["memoria_session_state_bytes"]
+    duracion = resultado["segundos"]
+    return {
+        "concurrencia": concurrencia,
+        "sesiones": len(latencias),
+        "errores": resultado["errores"],
+        "sesiones_por_segundo": len(latencias) / duracion if duracion > 0 else None,
+        "latencia_por_etapa": {etapa: _percentiles([sesion[etapa] for sesion in latencias]) for etapa in ETAPAS},
+        "latencia_reruns": _percentiles([segundos for sesion in latencias for segundos in sesion.values()]),
+        "memoria_session_state_bytes": {
+            "media": float(np.mean(memoria)) if memoria else None,
+            "max": int(max(memoria)) if memoria else None,
+        },
+        "rss_por_sesion_bytes": resultado["rss_por_sesion_bytes"],
+    }
+
+
+def ejecutar(concurrencias=CONCURRENCIAS_POR_DEFECTO, sesiones_por_hilo=SESIONES_POR_HILO_POR_DEFECTO,
+             semilla=SEMILLA_POR_DEFECTO, max_incidentes=MAX_INCIDENTES_POR_DEFECTO):
+    resultados = []
+    for concurrencia in concurrencias:
+        resultado = medir_concurrencia(concurrencia, sesiones_por_hilo, semilla, max_incidentes)
+        resultados.append(resultado)
+        print(json.dumps(resultado, ensure_ascii=False), file=sys.stderr)
+    return {
+        "metadatos": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "semilla": semilla,
+            "sesiones_por_hilo": sesiones_por_hilo,
+            "max_incidentes": max_incidentes,
+            "modelo_concurrencia": MODELO_CONCURRENCIA,
+            "limitaciones": LIMITACIONES,
+        },
+        "resultados": resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de sesiones concurrentes de la aplicación.")
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=CONCURRENCIAS_POR_DEFECTO,
+                        help="Sesiones simultáneas por corrida (hilos de un mismo proceso servidor).")
+    parser.add_argument("--sesiones-por-hilo", type=int, default=SESIONES_POR_HILO_POR_DEFECTO,
+                        help="Sesiones que cada hilo recorre una tras otra.")
+    parser.add_argument("--max-incidentes", type=int, default=MAX_INCIDENTES_POR_DEFECTO,
+                        help="Máximo de incidentes aleatorios por envío.")
+    parser.add_argument("--semilla", type=int, default=SEMILLA_POR_DEFECTO)
+    parser.add_argument("--salida", default=None, help="Archivo JSON de salida (por defecto, la salida estándar).")
+    parser.add_argument("--limite-p99-ms", type=float, default=None,
+                        help="Falla (código 1) si el p99 de las ejecuciones supera este tiempo o hubo errores.")
+    args = parser.parse_args(argv)
+
+    reporte = ejecutar(args.concurrencia, args.sesiones_por_hilo, args.semilla, args.max_incidentes)
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
+    else:
+        print(texto)
+
+    if args.limite_p99_ms is not None:
+        fallas = [r for r in reporte["resultados"]
+                  if r["errores"] or r["latencia_reruns"].get("p99_ms", float("inf")) > args.limite_p99_ms]
+        if fallas:
+            print(f"{len(fallas)} corrida(s) con errores o p99 mayor a {args.limite_p99_ms:.0f} ms", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
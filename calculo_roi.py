@@ -0,0 +1,193 @@
+"""Núcleo del cálculo del ROI de ciberseguridad, sin dependencia de Streamlit.
+
+Incluye el cálculo por empresa (`calcular_roi_segmentado`, el que usa pages/roi.py) y su versión
+vectorizada para portafolios (`calcular_roi_vectorizado` / `calcular_roi_lote`).
+"""
+import hashlib
+import json
+import numbers
+
+import numpy as np
+
+# --- CLAVES DEL FORMULARIO (mismas que app.py guarda en st.session_state["form_data"]) ---
+COL_FACTURACION = "Facturación Anual (COP)"
+COL_PRESUPUESTO = "Presupuesto Ciberseguridad (%)"
+COL_ROI_ISO = "ROI Estimado ISO 27001 (%)"
+COL_SANCIONES = "Sanciones Regulatorias (COP, 3a)"
+COL_RIESGO_REPUTACIONAL = "Riesgo Reputacional (1-5)"
+COL_CUMPLE_LEY_1581 = "Cumple Ley 1581"
+
+# --- COMPONENTES DEL RESULTADO (mismas claves que devuelve calcular_roi_segmentado) ---
+ROI_AHORRO_ISO = "ROI Financiero (Ahorro ISO)"
+ROI_COSTO_LEGAL = "Estimación Costo Incumplimiento Legal"
+ROI_IMPACTO_REPUTACIONAL = "Estimación Impacto Reputacional"
+ROI_NETO = "ROI Neto Estimado Ciberseguridad"
+COMPONENTES_ROI = [ROI_AHORRO_ISO, ROI_COSTO_LEGAL, ROI_IMPACTO_REPUTACIONAL, ROI_NETO]
+
+# --- FACTORES DEL MODELO ---
+# Factor de ejemplo para convertir el nivel de riesgo reputacional a un valor monetario (COP por punto).
+FACTOR_REPUTACIONAL_COP = 10000000
+# Fracción de las sanciones reportadas que se asume como costo por incumplimiento legal.
+FACTOR_PENALIZACION_LEGAL = 0.5
+# Estados de la Ley 1581 que generan penalización legal.
+ESTADOS_LEY_1581_PENALIZADOS = ["No", "Parcialmente"]
+
+# Valores por defecto cuando un dato no viene (clave ausente o celda vacía), en el escalar y en el lote.
+_VALORES_POR_DEFECTO = {
+    COL_FACTURACION: 0,
+    COL_PRESUPUESTO: 0.0,
+    COL_ROI_ISO: 0.0,
+    COL_SANCIONES: 0,
+    COL_RIESGO_REPUTACIONAL: 1,
+    COL_CUMPLE_LEY_1581: "No aplica",
+}
+
+
+def _es_numero(valor):
+    # int, float y bool, y también los escalares de NumPy (los que devuelve un DataFrame o un arreglo):
+    # un np.int64 es una cantidad igual que un int. El texto, aunque sea numérico ("1000"), no cuenta.
+    return isinstance(valor, numbers.Real)
+
+
+def _valor(form_data, clave):
+    # Una clave ausente, None o NaN (lo que en un lote es una celda vacía) toma el valor por defecto.
+    valor = form_data.get(clave)
+    if valor is None or (_es_numero(valor) and valor != valor):
+        return _VALORES_POR_DEFECTO[clave]
+    return valor
+
+
+# --- Lógica del ROI ---
+def calcular_roi_segmentado(form_data):
+    facturacion_anual = _valor(form_data, COL_FACTURACION)
+    presupuesto_ciber_porc = _valor(form_data, COL_PRESUPUESTO)
+    roi_estimado_iso_porc = _valor(form_data, COL_ROI_ISO)
+    sanciones_regulatorias_valor = _valor(form_data, COL_SANCIONES)
+    # El valor por defecto del slider es 1, así que usamos eso si la clave no estuviera (aunque debería estar)
+    riesgo_reputacional_nivel = _valor(form_data, COL_RIESGO_REPUTACIONAL)
+    cumple_ley_1581_estado = _valor(form_data, COL_CUMPLE_LEY_1581)
+
+    # Cálculo del ahorro por ISO
+    # Si presupuesto_ciber_porc o roi_estimado_iso_porc es 0, el ahorro será 0.
+    inversion_ciber_estimada = facturacion_anual * (presupuesto_ciber_porc / 100.0 if presupuesto_ciber_porc > 0 else 0)
+    ahorro_por_iso = inversion_ciber_estimada * (roi_estimado_iso_porc / 100.0 if roi_estimado_iso_porc > 0 else 0)
+
+    # Cálculo de penalización legal
+    penalizacion_legal_calculada = 0
+    if _es_numero(sanciones_regulatorias_valor) and cumple_ley_1581_estado in ESTADOS_LEY_1581_PENALIZADOS:
+        # Usamos un factor de ejemplo, podría ser el valor completo de las sanciones o un %
+        # float(): un escalar de NumPy (p. ej. float32) se opera en float64, igual que en el lote.
+        penalizacion_legal_calculada = float(sanciones_regulatorias_valor) * FACTOR_PENALIZACION_LEGAL
+
+    # Cálculo de penalización reputacional
+    penalizacion_reputacional_calculada = 0
+    if _es_numero(riesgo_reputacional_nivel):
+        # Este factor (FACTOR_REPUTACIONAL_COP) es crucial y debe ajustarse a la realidad de la empresa.
+        penalizacion_reputacional_calculada = float(riesgo_reputacional_nivel) * FACTOR_REPUTACIONAL_COP
+
+    roi_total_neto = ahorro_por_iso - penalizacion_legal_calculada - penalizacion_reputacional_calculada
+
+    return {
+        ROI_AHORRO_ISO: ahorro_por_iso,
+        ROI_COSTO_LEGAL: penalizacion_legal_calculada,
+        ROI_IMPACTO_REPUTACIONAL: penalizacion_reputacional_calculada,
+        ROI_NETO: roi_total_neto,
+    }
+
+
+def calcular_roi_vectorizado(facturacion, presupuesto_porc, roi_iso_porc, sanciones,
+                             riesgo_reputacional, cumple_ley_1581,
+                             factor_reputacional=FACTOR_REPUTACIONAL_COP,
+                             factor_legal=FACTOR_PENALIZACION_LEGAL):
+    """Calcula los cuatro componentes del ROI para arreglos del mismo largo.
+
+    `sanciones` y `riesgo_reputacional` pueden contener NaN: igual que en el cálculo escalar,
+    un valor no numérico no genera penalización. Todos los argumentos, incluidos los factores,
+    se difunden con las reglas de NumPy, lo que permite evaluar rejillas de parámetros.
+    """
+    facturacion = np.asarray(facturacion, dtype=np.float64)
+    presupuesto_porc = np.asarray(presupuesto_porc, dtype=np.float64)
+    roi_iso_porc = np.asarray(roi_iso_porc, dtype=np.float64)
+    sanciones = np.asarray(sanciones, dtype=np.float64)
+    riesgo_reputacional = np.asarray(riesgo_reputacional, dtype=np.float64)
+    cumple_ley_1581 = np.asarray(cumple_ley_1581, dtype=object)
+
+    # Ahorro por ISO: porcentajes no positivos cuentan como 0 (mismo orden de operaciones que el escalar).
+    inversion_ciber_estimada = facturacion * np.where(presupuesto_porc > 0, presupuesto_porc / 100.0, 0.0)
+    ahorro_por_iso = inversion_ciber_estimada * np.where(roi_iso_porc > 0, roi_iso_porc / 100.0, 0.0)
+
+    # Penalización legal: solo si la ley no se cumple (o se cumple parcialmente) y la sanción es numérica.
+    aplica_penalizacion = np.isin(cumple_ley_1581, ESTADOS_LEY_1581_PENALIZADOS) & ~np.isnan(sanciones)
+    penalizacion_legal = np.where(aplica_penalizacion, sanciones * factor_legal, 0.0)
+
+    # Penalización reputacional: nivel de riesgo por el factor monetario.
+    penalizacion_reputacional = np.where(
+        np.isnan(riesgo_reputacional), 0.0, riesgo_reputacional * factor_reputacional
+    )
+
+    roi_total_neto = ahorro_por_iso - penalizacion_legal - penalizacion_reputacional
+
+    return {
+        ROI_AHORRO_ISO: ahorro_por_iso,
+        ROI_COSTO_LEGAL: penalizacion_legal,
+        ROI_IMPACTO_REPUTACIONAL: penalizacion_reputacional,
+        ROI_NETO: roi_total_neto,
+    }
+
+
+def _columna_numerica(df, columna, conservar_no_numericos):
+    import pandas as pd  # Diferido: el cálculo sobre arreglos y las constantes no requieren pandas
+
+    por_defecto = _VALORES_POR_DEFECTO[columna]
+    if columna not in df:
+        return np.full(len(df), por_defecto, dtype=np.float64)
+    celdas_vacias = df[columna].isna().to_numpy()
+    if conservar_no_numericos:
+        # Solo las celdas vacías toman el valor por defecto. Como en el escalar, en una columna de
+        # objetos solo cuentan los números (_es_numero): el texto, incluso "1000", queda como NaN.
+        if df[columna].dtype == object:
+            valores = np.array([float(v) if _es_numero(v) else np.nan for v in df[columna].tolist()], dtype=np.float64)
+        else:
+            valores = pd.to_numeric(df[columna], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.where(celdas_vacias, por_defecto, valores)
+    valores = pd.to_numeric(df[columna], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isnan(valores), por_defecto, valores)
+
+
+def calcular_roi_lote(df):
+    """Calcula el ROI para cada fila de un DataFrame con las columnas de `form_data`.
+
+    Devuelve un DataFrame con las cuatro columnas de COMPONENTES_ROI y el mismo índice que `df`.
+    Las columnas ausentes o las celdas vacías toman el valor por defecto del formulario;
+    en sanciones y riesgo reputacional un valor no numérico (incluido el texto numérico) anula la
+    penalización, como en el escalar.
+    """
+    import pandas as pd
+
+    if COL_CUMPLE_LEY_1581 in df:
+        cumple_ley = df[COL_CUMPLE_LEY_1581].fillna(_VALORES_POR_DEFECTO[COL_CUMPLE_LEY_1581]).to_numpy(dtype=object)
+    else:
+        cumple_ley = np.full(len(df), _VALORES_POR_DEFECTO[COL_CUMPLE_LEY_1581], dtype=object)
+
+    resultados = calcular_roi_vectorizado(
+        facturacion=_columna_numerica(df, COL_FACTURACION, conservar_no_numericos=False),
+        presupuesto_porc=_columna_numerica(df, COL_PRESUPUESTO, conservar_no_numericos=False),
+        roi_iso_porc=_columna_numerica(df, COL_ROI_ISO, conservar_no_numericos=False),
+        sanciones=_columna_numerica(df, COL_SANCIONES, conservar_no_numericos=True),
+        riesgo_reputacional=_columna_numerica(df, COL_RIESGO_REPUTACIONAL, conservar_no_numericos=True),
+        cumple_ley_1581=cumple_ley,
+    )
+    return pd.DataFrame(resultados, index=df.index, columns=COMPONENTES_ROI)
+
+
+def _serializable(valor):
+    # Objetos con representación propia (p. ej. incidentes.IncidentesCompactos); el resto, como texto.
+    if hasattr(valor, "estado_serializable"):
+        return valor.estado_serializable()
+    return str(valor)
+
+
+def huella_form_data(form_data):
+    """Hash estable (independiente del orden de las claves y del proceso) de un form_data."""
+    serializado = json.dumps(form_data, sort_keys=True, ensure_ascii=False, default=_serializable)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
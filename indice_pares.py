@@ -0,0 +1,262 @@
+"""Índice de similitud entre empresas para compararlas con sus pares más cercanos.
+
+Los rasgos de cada empresa se normalizan a un vector: tamaño y nivel ISO 27001 como ordinales en
+[0, 1], número de empleados en escala log10 (1.0 = un orden de magnitud) y país como coincidencia
+exacta (0 o 1). La distancia es la suma ponderada de las diferencias al cuadrado (ver PESOS).
+El sector (`Servicio Principal IT`) no entra en la distancia: los pares siempre son del mismo sector.
+
+Búsqueda particionada: dentro de cada sector las empresas se agrupan en celdas (tamaño, país,
+nivel ISO) con un costo categórico constante, y en cada celda se ordenan por log10(empleados).
+Una consulta recorre las celdas de menor a mayor costo, toma en cada una los k vecinos por
+empleados (búsqueda binaria) y se detiene cuando el costo de la celda ya supera al k-ésimo mejor,
+así que no depende del total de empresas indexadas.
+
+El índice se construye una vez por proceso desde el almacén de envíos y se actualiza de forma
+incremental (solo los envíos con ID mayor al último indexado).
+"""
+import math
+import threading
+
+import numpy as np
+
+from calculo_roi import COL_PRESUPUESTO
+
+COL_SERVICIO = "Servicio Principal IT"
+COL_TAMANO = "Tamaño Empresa"
+COL_EMPLEADOS = "Número Empleados"
+COL_PAIS = "País Sede"
+COL_NIVEL_ISO = "Nivel ISO 27001"
+
+# Opciones ordinales del formulario (app.py), de menor a mayor.
+TAMANOS_EMPRESA = ['Micro (<10 empleados)', 'Pequeña (10-50 empleados)', 'Mediana (51-200 empleados)', 'Grande (>200 empleados)']
+NIVELES_ISO27001 = ["No implementado", "En proceso de implementación", "Implementado, no certificado", "Certificado"]
+
+# Peso de cada rasgo en la distancia (diferencias al cuadrado).
+PESOS = {"tamano": 1.0, "empleados": 1.0, "pais": 0.5, "nivel_iso": 1.0}
+K_PARES = 50
+# Métricas comparadas con los pares: clave del resultado -> etiqueta.
+METRICAS_PARES = {
+    "roi_neto": "ROI Neto (COP)",
+    "horas_incidentes": "Horas de Incidentes",
+    "presupuesto": "Presupuesto Ciberseguridad (%)",
+}
+# Inserciones que una celda acumula sin ordenar antes de fusionarlas con su arreglo ordenado.
+MAX_PENDIENTES_CELDA = 1024
+TAMANO_BLOQUE_CARGA = 50000
+
+
+def _ordinal(valor, opciones):
+    # Posición normalizada a [0, 1]; los valores desconocidos quedan en el medio.
+    try:
+        return opciones.index(valor) / (len(opciones) - 1)
+    except ValueError:
+        return 0.5
+
+
+def _numero(valor, defecto=0.0):
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return defecto
+    return numero if math.isfinite(numero) else defecto
+
+
+def _log_empleados(valor):
+    return math.log10(1.0 + max(_numero(valor), 0.0))
+
+
+class _Columna:
+    """Arreglo de numpy que crece por bloques con capacidad duplicada (inserción amortizada O(1))."""
+
+    __slots__ = ("_datos", "_largo")
+
+    def __init__(self, dtype):
+        self._datos = np.empty(1024, dtype=dtype)
+        self._largo = 0
+
+    def extender(self, valores):
+        valores = np.asarray(valores, dtype=self._datos.dtype)
+        fin = self._largo + len(valores)
+        if fin > len(self._datos):
+            datos = np.empty(max(fin, 2 * len(self._datos)), dtype=self._datos.dtype)
+            datos[:self._largo] = self._datos[:self._largo]
+            self._datos = datos
+        self._datos[self._largo:fin] = valores
+        self._largo = fin
+
+    def vista(self):
+        return self._datos[:self._largo]
+
+
+class _Celda:
+    """Empresas de una celda (sector, tamaño, país, nivel ISO) ordenadas por log10(empleados)."""
+
+    __slots__ = ("claves", "filas", "_pendientes_claves", "_pendientes_filas")
+
+    def __init__(self):
+        self.claves = np.empty(0, dtype=np.float32)
+        self.filas = np.empty(0, dtype=np.int64)
+        self._pendientes_claves = np.empty(0, dtype=np.float32)
+        self._pendientes_filas = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.claves) + len(self._pendientes_claves)
+
+    def extender(self, claves, filas):
+        self._pendientes_claves = np.concatenate([self._pendientes_claves, claves])
+        self._pendientes_filas = np.concatenate([self._pendientes_filas, filas])
+        if len(self._pendientes_claves) >= MAX_PENDIENTES_CELDA:
+            self.fusionar()
+
+    def fusionar(self):
+        if not len(self._pendientes_claves):
+            return
+        claves = np.concatenate([self.claves, self._pendientes_claves])
+        orden = np.argsort(claves, kind="stable")
+        self.claves = claves[orden]
+        self.filas = np.concatenate([self.filas, self._pendientes_filas])[orden]
+        self._pendientes_claves = self._pendientes_claves[:0]
+        self._pendientes_filas = self._pendientes_filas[:0]
+
+    def candidatos(self, clave, k):
+        # En un arreglo ordenado, los k más cercanos a `clave` están entre los k anteriores y los k
+        # siguientes a su posición; las pendientes (pocas) se revisan todas.
+        i = int(np.searchsorted(self.claves, clave))
+        inicio = max(i - k, 0)
+        claves, filas = self.claves[inicio:i + k], self.filas[inicio:i + k]
+        if len(self._pendientes_claves):
+            claves = np.concatenate([claves, self._pendientes_claves])
+            filas = np.concatenate([filas, self._pendientes_filas])
+        return claves, filas
+
+
+class IndicePares:
+    """Índice de vecinos más cercanos sobre los envíos guardados, particionado por sector."""
+
+    def __init__(self, pesos=PESOS):
+        self.pesos = dict(pesos)
+        self.ultimo_envio_id = 0
+        # Por sector: {(tamaño ordinal, país, nivel ISO ordinal): _Celda}
+        self._particiones = {}
+        self._envio_id = _Columna(np.int64)
+        self._roi_neto = _Columna(np.float64)
+        # float64 como el valor de la empresa consultada: en float32 los empates (p. ej. 3.3 %) no se
+        # reconocen al calcular el percentil.
+        self._horas = _Columna(np.float64)
+        self._presupuesto = _Columna(np.float64)
+        self._candado = threading.Lock()
+
+    def __len__(self):
+        return len(self._envio_id.vista())
+
+    # --- CONSTRUCCIÓN E INSERCIÓN ---
+    def agregar(self, envio_ids, servicios, tamanos, paises, niveles_iso, empleados, roi_neto, horas_incidentes, presupuesto):
+        """Indexa un bloque de empresas (secuencias paralelas, una posición por envío)."""
+        with self._candado:
+            primera_fila = len(self)
+            self._envio_id.extender(envio_ids)
+            self._roi_neto.extender([_numero(valor, np.nan) for valor in roi_neto])
+            self._horas.extender([_numero(valor) for valor in horas_incidentes])
+            self._presupuesto.extender([_numero(valor) for valor in presupuesto])
+            claves = np.array([_log_empleados(valor) for valor in empleados], dtype=np.float32)
+            # Agrupación por celda en un solo paso: cada celda recibe su parte del bloque de una vez.
+            celdas = {}
+            for posicion, celda in enumerate(zip(servicios, tamanos, paises, niveles_iso)):
+                celdas.setdefault(celda, []).append(posicion)
+            for (servicio, tamano, pais, nivel_iso), posiciones in celdas.items():
+                clave_celda = (_ordinal(tamano, TAMANOS_EMPRESA), pais or "Sin dato", _ordinal(nivel_iso, NIVELES_ISO27001))
+                celda = self._particiones.setdefault(servicio or "Sin dato", {}).setdefault(clave_celda, _Celda())
+                posiciones = np.array(posiciones, dtype=np.int64)
+                celda.extender(claves[posiciones], posiciones + primera_fila)
+            if len(envio_ids):
+                self.ultimo_envio_id = max(self.ultimo_envio_id, int(np.max(envio_ids)))
+
+    def actualizar_desde(self, almacen, tamano_bloque=TAMANO_BLOQUE_CARGA):
+        """Indexa los envíos guardados después del último indexado; devuelve cuántos se agregaron."""
+        nuevos = 0
+        while True:
+            filas = almacen.leer_rasgos_pares(self.ultimo_envio_id, tamano_bloque)
+            if not filas:
+                return nuevos
+            self.agregar(*zip(*filas))
+            nuevos += len(filas)
+
+    # --- CONSULTA ---
+    def buscar(self, servicio, tamano, pais, nivel_iso, empleados, k=K_PARES, excluir_envio=None):
+        """Los k pares más cercanos del mismo sector: (filas del índice, distancias al cuadrado), de menor a mayor."""
+        tamano, nivel_iso = _ordinal(tamano, TAMANOS_EMPRESA), _ordinal(nivel_iso, NIVELES_ISO27001)
+        pais = pais or "Sin dato"
+        clave = _log_empleados(empleados)
+        w = self.pesos
+        with self._candado:
+            particion = self._particiones.get(servicio or "Sin dato", {})
+            celdas = sorted(
+                (w["tamano"] * (tamano_celda - tamano) ** 2 + w["pais"] * (pais_celda != pais)
+                 + w["nivel_iso"] * (iso_celda - nivel_iso) ** 2, orden, celda)
+                for orden, ((tamano_celda, pais_celda, iso_celda), celda) in enumerate(particion.items())
+            )
+            filas = np.empty(0, dtype=np.int64)
+            distancias = np.empty(0, dtype=np.float64)
+            envio_ids = self._envio_id.vista()
+            for costo, _, celda in celdas:
+                if len(distancias) >= k and costo >= distancias.max():
+                    break  # Ninguna empresa de esta celda (ni de las siguientes) mejora el k-ésimo
+                claves_celda, filas_celda = celda.candidatos(clave, k + (excluir_envio is not None))
+                if excluir_envio is not None:
+                    conservar = envio_ids[filas_celda] != excluir_envio
+                    claves_celda, filas_celda = claves_celda[conservar], filas_celda[conservar]
+                filas = np.concatenate([filas, filas_celda])
+                distancias = np.concatenate([distancias, costo + w["empleados"] * (claves_celda.astype(np.float64) - clave) ** 2])
+                if len(distancias) > k:
+                    mejores = np.argpartition(distancias, k - 1)[:k]
+                    filas, distancias = filas[mejores], distancias[mejores]
+        orden = np.argsort(distancias, kind="stable")
+        return filas[orden], distancias[orden]
+
+    def comparar(self, form_data, roi_neto, horas_incidentes, k=K_PARES, excluir_envio=None):
+        """Posición de la empresa entre sus k pares para cada métrica de METRICAS_PARES, o None sin pares.
+
+        El percentil es el rango medio (empates cuentan la mitad): 50 = en la mediana de los pares.
+        """
+        filas, distancias = self.buscar(
+            form_data.get(COL_SERVICIO), form_data.get(COL_TAMANO), form_data.get(COL_PAIS),
+            form_data.get(COL_NIVEL_ISO), form_data.get(COL_EMPLEADOS), k, excluir_envio,
+        )
+        if not len(filas):
+            return None
+        valores_empresa = {
+            "roi_neto": _numero(roi_neto), "horas_incidentes": _numero(horas_incidentes),
+            "presupuesto": _numero(form_data.get(COL_PRESUPUESTO)),
+        }
+        with self._candado:
+            valores_pares = {
+                "roi_neto": self._roi_neto.vista()[filas], "horas_incidentes": self._horas.vista()[filas],
+                "presupuesto": self._presupuesto.vista()[filas],
+            }
+        metricas = {}
+        for nombre, valores in valores_pares.items():
+            valores = valores[~np.isnan(valores)]
+            valor = valores_empresa[nombre]
+            if not len(valores):
+                continue
+            p25, mediana, p75 = np.percentile(valores, [25, 50, 75])
+            metricas[nombre] = {
+                "valor": valor,
+                "percentil": float(100.0 * (np.count_nonzero(valores < valor) + 0.5 * np.count_nonzero(valores == valor)) / len(valores)),
+                "p25": float(p25), "mediana": float(mediana), "p75": float(p75),
+            }
+        return {"pares": len(filas), "distancia_max": float(math.sqrt(distancias[-1])), "metricas": metricas}
+
+
+_indice_por_defecto = None
+_candado_indice = threading.Lock()
+
+
+def indice_por_defecto(almacen):
+    """Índice compartido por todas las sesiones del servidor, puesto al día con los envíos nuevos del almacén."""
+    global _indice_por_defecto
+    with _candado_indice:
+        if _indice_por_defecto is None:
+            _indice_por_defecto = IndicePares()
+        _indice_por_defecto.actualizar_desde(almacen)
+        return _indice_por_defecto
@@ -0,0 +1,222 @@
+"""Tiempos por etapa del flujo (formulario -> ROI) como histogramas, exportables en formato Prometheus.
+
+Las páginas envuelven cada etapa con `medir_etapa("nombre")`. Los histogramas son acumulativos y
+compartidos por todas las sesiones del proceso del servidor. Se pueden consultar de tres formas:
+
+- Panel de depuración en la barra lateral: abrir la app con ?depurar=1 (o ROI_DEPURACION=1).
+- Archivo de texto para el textfile collector de node_exporter: ROI_METRICAS_ARCHIVO=/ruta/roi.prom
+  (se reescribe de forma atómica como máximo cada INTERVALO_ESCRITURA_S segundos).
+- Endpoint HTTP local: ROI_METRICAS_PUERTO=9464 expone GET /metrics en 127.0.0.1.
+"""
+import atexit
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+NOMBRE_METRICA = "roi_etapa_duracion_segundos"
+# Etapas instrumentadas (en orden del flujo) y su descripción.
+ETAPAS = {
+    "formulario_render": "Construcción del formulario en app.py",
+    "armado_envio": "Armado del diccionario form_data al enviar",
+    "calculo_roi": "calcular_roi_segmentado",
+    "dataframe_incidentes": "Resumen por tipo de los incidentes (DataFrame)",
+    "figura_plotly": "figura_resumen_incidentes (figura de incidentes por tipo)",
+    "plotly_chart": "st.plotly_chart del gráfico de incidentes",
+    "recomendaciones": "generar_recomendaciones_detalladas",
+    "comparacion_pares": "Búsqueda de empresas similares en indice_pares (incluye la puesta al día del índice)",
+    "pagina_roi": "Ejecución completa de pages/roi.py",
+}
+# Límites superiores (le) de las cubetas, en segundos.
+BORDES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INTERVALO_ESCRITURA_S = 5.0
+HOST_EXPORTADOR = "127.0.0.1"
+
+
+class Histograma:
+    """Histograma acumulativo con las cubetas de BORDES_SEGUNDOS (la última cubeta es +Inf)."""
+
+    def __init__(self, bordes=BORDES_SEGUNDOS):
+        self.bordes = bordes
+        self.conteos = [0] * (len(bordes) + 1)
+        self.suma = 0.0
+        self.total = 0
+        self.ultimo = None
+        self.maximo = 0.0
+
+    def observar(self, segundos):
+        self.conteos[bisect.bisect_left(self.bordes, segundos)] += 1
+        self.suma += segundos
+        self.total += 1
+        self.ultimo = segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def cuantil(self, q):
+        # Interpolación lineal dentro de la cubeta, como histogram_quantile() de Prometheus,
+        # acotada por el máximo observado.
+        if self.total == 0:
+            return None
+        objetivo = q * self.total
+        acumulado = 0
+        for i, conteo in enumerate(self.conteos):
+            if acumulado + conteo >= objetivo and conteo > 0:
+                if i == len(self.bordes):
+                    return self.maximo
+                inferior = self.bordes[i - 1] if i > 0 else 0.0
+                return min(inferior + (self.bordes[i] - inferior) * (objetivo - acumulado) / conteo, self.maximo)
+            acumulado += conteo
+        return self.maximo
+
+
+class RegistroMetricas:
+    """Histogramas por etapa, seguros entre hilos (cada sesión de Streamlit corre en su propio hilo)."""
+
+    def __init__(self, bordes=BORDES_SEGUNDOS):
+        self.bordes = bordes
+        self._histogramas = {}
+        self._candado = threading.Lock()
+        self._ruta_archivo = None
+        self._ultima_escritura = 0.0
+
+    def observar(self, etapa, segundos):
+        with self._candado:
+            if etapa not in self._histogramas:
+                self._histogramas[etapa] = Histograma(self.bordes)
+            self._histogramas[etapa].observar(segundos)
+            escribir = self._ruta_archivo is not None and time.monotonic() - self._ultima_escritura >= INTERVALO_ESCRITURA_S
+            if escribir:
+                self._ultima_escritura = time.monotonic()
+        if escribir:
+            self.escribir_archivo(self._ruta_archivo)
+
+    @contextmanager
+    def medir_etapa(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def resumen(self):
+        """Una fila por etapa observada: conteo, último, media y percentiles estimados (en ms)."""
+        orden = list(ETAPAS)
+        with self._candado:
+            etapas = sorted(self._histogramas, key=lambda e: (orden.index(e) if e in orden else len(orden), e))
+            filas = []
+            for etapa in etapas:
+                h = self._histogramas[etapa]
+                filas.append({
+                    "Etapa": etapa,
+                    "Ejecuciones": h.total,
+                    "Último (ms)": h.ultimo * 1000,
+                    "Media (ms)": h.suma / h.total * 1000,
+                    "P50 (ms)": h.cuantil(0.5) * 1000,
+                    "P95 (ms)": h.cuantil(0.95) * 1000,
+                })
+        return filas
+
+    def texto_prometheus(self):
+        lineas = [
+            f"# HELP {NOMBRE_METRICA} Duración de cada etapa del flujo de la aplicación de ROI.",
+            f"# TYPE {NOMBRE_METRICA} histogram",
+        ]
+        with self._candado:
+            for etapa in sorted(self._histogramas):
+                h = self._histogramas[etapa]
+                acumulado = 0
+                for borde, conteo in zip(list(h.bordes) + ["+Inf"], h.conteos):
+                    acumulado += conteo
+                    le = borde if isinstance(borde, str) else repr(float(borde))
+                    lineas.append(f'{NOMBRE_METRICA}_bucket{{etapa="{etapa}",le="{le}"}} {acumulado}')
+                lineas.append(f'{NOMBRE_METRICA}_sum{{etapa="{etapa}"}} {h.suma!r}')
+                lineas.append(f'{NOMBRE_METRICA}_count{{etapa="{etapa}"}} {h.total}')
+        return "\n".join(lineas) + "\n"
+
+    def escribir_archivo(self, ruta):
+        # Escritura atómica: el recolector nunca lee un archivo a medio escribir.
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as archivo:
+                archivo.write(self.texto_prometheus())
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logger.warning("No se pudieron escribir las métricas en %s: %s", ruta, e)
+
+    def exportar_a_archivo(self, ruta):
+        self._ruta_archivo = ruta
+        atexit.register(self.escribir_archivo, ruta)
+
+
+def _manejador(registro):
+    class ManejadorMetricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/metricas"):
+                self.send_error(404)
+                return
+            contenido = registro.texto_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(contenido)))
+            self.end_headers()
+            self.wfile.write(contenido)
+
+        def log_message(self, formato, *args):
+            logger.debug(formato, *args)
+
+    return ManejadorMetricas
+
+
+def iniciar_exportador_http(registro, puerto, host=HOST_EXPORTADOR):
+    servidor = ThreadingHTTPServer((host, puerto), _manejador(registro))
+    threading.Thread(target=servidor.serve_forever, name="exportador-metricas", daemon=True).start()
+    return servidor
+
+
+# --- REGISTRO DEL PROCESO ---
+REGISTRO = RegistroMetricas()
+medir_etapa = REGISTRO.medir_etapa
+
+_candado_exportacion = threading.Lock()
+_exportacion_iniciada = False
+
+
+def iniciar_exportacion():
+    """Activa (una sola vez por proceso) las salidas configuradas con ROI_METRICAS_ARCHIVO / ROI_METRICAS_PUERTO."""
+    global _exportacion_iniciada
+    with _candado_exportacion:
+        if _exportacion_iniciada:
+            return
+        _exportacion_iniciada = True
+        if os.environ.get("ROI_METRICAS_ARCHIVO"):
+            REGISTRO.exportar_a_archivo(os.environ["ROI_METRICAS_ARCHIVO"])
+        if os.environ.get("ROI_METRICAS_PUERTO"):
+            try:
+                iniciar_exportador_http(REGISTRO, int(os.environ["ROI_METRICAS_PUERTO"]))
+            except (OSError, ValueError) as e:
+                logger.warning("No se pudo iniciar el endpoint de métricas: %s", e)
+
+
+# --- PANEL DE DEPURACIÓN ---
+def mostrar_panel_tiempos():
+    """Panel opcional en la barra lateral; se activa con ?depurar=1 (persiste en la sesión) o ROI_DEPURACION=1."""
+    import streamlit as st
+
+    if st.query_params.get("depurar") == "1":
+        st.session_state["depuracion"] = True
+    if not (st.session_state.get("depuracion") or os.environ.get("ROI_DEPURACION") == "1"):
+        return
+    with st.sidebar.expander("⏱️ Tiempos por etapa (depuración)", expanded=True):
+        filas = REGISTRO.resumen()
+        if not filas:
+            st.caption("Aún no hay tiempos registrados.")
+            return
+        st.dataframe(filas, hide_index=True, use_container_width=True,
+                     column_config={col: st.column_config.NumberColumn(format="%.1f") for col in filas[0] if "(ms)" in col})
+        st.caption("Histogramas acumulados de todas las sesiones de este proceso; P50/P95 estimados por cubetas.")
+        st.download_button("Descargar métricas (Prometheus)", REGISTRO.texto_prometheus(),
+                           file_name="metricas_roi.prom", mime="text/plain")
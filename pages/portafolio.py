@@ -0,0 +1,151 @@
+import streamlit as st
+
+from almacen import BORDES_HISTOGRAMA_ROI, almacen_por_defecto
+from reportes import ColaReportesLlena, formatos_disponibles, gestor_por_defecto, mostrar_trabajos_reporte, seguir_trabajo
+
+st.set_page_config(layout="wide")
+
+st.title("📈 Portafolio de Empresas Evaluadas")
+st.caption(
+    "Los agregados se actualizan con cada envío guardado; esta página solo lee los totales ya calculados, "
+    "sin recorrer el historial de envíos."
+)
+
+almacen = almacen_por_defecto()
+totales = almacen.leer_agregados("total")
+if not totales:
+    st.info("Aún no hay envíos guardados. Completa el formulario para comenzar a construir el portafolio.")
+    if st.button("Ir al formulario"):
+        st.switch_page("app.py")
+    st.stop()
+
+total = totales[0]
+
+# --- RESUMEN GENERAL ---
+st.divider()
+st.subheader("🌎 Resumen General")
+col_res1, col_res2, col_res3 = st.columns(3)
+with col_res1:
+    st.metric("🏢 Empresas Evaluadas", f"{total['num_envios']:,}")
+    st.metric("✅ ROI Neto Promedio", f"${total['suma_roi_neto'] / total['num_envios']:,.0f} COP")
+with col_res2:
+    st.metric("🔴 Empresas con ROI Neto Negativo", f"{total['num_roi_negativo'] / total['num_envios']:.1%}")
+    st.metric("⚖️ Costo Total por Incumplimiento Legal", f"${total['suma_costo_legal']:,.0f} COP")
+with col_res3:
+    st.metric("📉 Impacto Reputacional Total", f"${total['suma_impacto_reputacional']:,.0f} COP")
+    st.metric("⏱️ Horas Totales de Incidentes", f"{total['suma_horas_incidentes']:,.1f} h")
+
+# --- DESGLOSE POR DIMENSIÓN ---
+st.divider()
+st.subheader("🔎 Desglose del Portafolio")
+dimensiones = {
+    "País Sede": "pais_sede",
+    "Tamaño de la Empresa": "tamano_empresa",
+    "Servicio Principal de IT": "servicio_principal",
+}
+dimension_elegida = st.selectbox("Agrupar por", options=list(dimensiones))
+dimension = dimensiones[dimension_elegida]
+
+
+def mostrar_desglose(agregados, dimension_elegida):
+    # Importaciones diferidas, como en pages/roi.py: el resumen general se dibuja sin esperar a pandas ni a plotly.
+    import pandas as pd
+    import plotly.express as px
+
+    df_agregados = pd.DataFrame(agregados)
+    df_agregados["ROI Neto Promedio (COP)"] = df_agregados["suma_roi_neto"] / df_agregados["num_envios"]
+    df_agregados = df_agregados.rename(columns={
+        "valor": dimension_elegida,
+        "num_envios": "Empresas",
+        "suma_costo_legal": "Costo Legal (COP)",
+        "suma_impacto_reputacional": "Impacto Reputacional (COP)",
+        "num_incidentes": "Incidentes Detallados",
+        "suma_horas_incidentes": "Horas de Incidentes",
+    })
+
+    col_graf1, col_graf2 = st.columns(2)
+    with col_graf1:
+        fig_roi = px.bar(
+            df_agregados, x=dimension_elegida, y="ROI Neto Promedio (COP)", color="ROI Neto Promedio (COP)",
+            color_continuous_scale="RdYlGn", color_continuous_midpoint=0,
+            title=f"ROI Neto Promedio por {dimension_elegida}",
+        )
+        st.plotly_chart(fig_roi, use_container_width=True)
+    with col_graf2:
+        fig_costos = px.bar(
+            df_agregados, x=dimension_elegida, y=["Costo Legal (COP)", "Impacto Reputacional (COP)"], barmode="group",
+            title=f"Costos Legales y Reputacionales por {dimension_elegida}",
+            labels={"value": "COP", "variable": "Componente"},
+        )
+        st.plotly_chart(fig_costos, use_container_width=True)
+
+    fig_horas = px.bar(
+        df_agregados, x=dimension_elegida, y="Horas de Incidentes", text="Horas de Incidentes",
+        title=f"Horas de Incidentes por {dimension_elegida}",
+    )
+    fig_horas.update_traces(texttemplate='%{text:,.1f}h', textposition="outside")
+    st.plotly_chart(fig_horas, use_container_width=True)
+
+    st.dataframe(
+        df_agregados[[dimension_elegida, "Empresas", "ROI Neto Promedio (COP)", "Costo Legal (COP)",
+                      "Impacto Reputacional (COP)", "Incidentes Detallados", "Horas de Incidentes"]]
+        .style.format({
+            "ROI Neto Promedio (COP)": "{:,.0f}", "Costo Legal (COP)": "{:,.0f}",
+            "Impacto Reputacional (COP)": "{:,.0f}", "Horas de Incidentes": "{:,.1f}",
+        }),
+        hide_index=True,
+    )
+
+
+agregados = almacen.leer_agregados(dimension)
+mostrar_desglose(agregados, dimension_elegida)
+
+# --- DISTRIBUCIÓN DEL ROI NETO ---
+st.divider()
+st.subheader("📊 Distribución del ROI Neto")
+valor_elegido = st.selectbox(f"Filtrar por {dimension_elegida}", options=["Todas"] + [fila["valor"] for fila in agregados])
+if valor_elegido == "Todas":
+    conteos = almacen.leer_histograma_roi()
+else:
+    conteos = almacen.leer_histograma_roi(dimension, valor_elegido)
+
+def etiqueta_cubeta(i):
+    # Cubetas de BORDES_HISTOGRAMA_ROI expresadas en millones de COP.
+    if i == 0:
+        return f"< {BORDES_HISTOGRAMA_ROI[0] / 1e6:,.0f} M"
+    if i == len(BORDES_HISTOGRAMA_ROI):
+        return f"≥ {BORDES_HISTOGRAMA_ROI[-1] / 1e6:,.0f} M"
+    return f"{BORDES_HISTOGRAMA_ROI[i - 1] / 1e6:,.0f} M a {BORDES_HISTOGRAMA_ROI[i] / 1e6:,.0f} M"
+
+
+def mostrar_histograma(conteos):
+    import pandas as pd
+    import plotly.express as px
+
+    df_histograma = pd.DataFrame({
+        "ROI Neto (COP)": [etiqueta_cubeta(i) for i in range(len(conteos))],
+        "Empresas": conteos,
+    })
+    fig_hist = px.bar(df_histograma, x="ROI Neto (COP)", y="Empresas", title="Empresas por Rango de ROI Neto")
+    st.plotly_chart(fig_hist, use_container_width=True)
+
+
+mostrar_histograma(conteos)
+
+# --- REPORTE DEL PORTAFOLIO ---
+# Se genera en segundo plano por bloques de envíos (ver reportes.py); la página sigue respondiendo
+# y muestra el progreso hasta que la descarga está lista.
+st.divider()
+st.subheader("📄 Reporte del Portafolio")
+alcances = {"Todo el portafolio": {}}
+if valor_elegido not in ("Todas", "Sin dato"):
+    alcances[f"Solo {dimension_elegida}: {valor_elegido}"] = {dimension: valor_elegido}
+col_alcance, col_formato = st.columns(2)
+alcance = col_alcance.selectbox("Empresas incluidas", options=list(alcances))
+formato_reporte = col_formato.radio("Formato del reporte", formatos_disponibles(), format_func=str.upper, horizontal=True)
+if st.button("Generar reporte del portafolio"):
+    try:
+        seguir_trabajo(gestor_por_defecto().encolar_portafolio(almacen, formato_reporte, **alcances[alcance]))
+    except ColaReportesLlena as e:
+        st.warning(str(e))
+mostrar_trabajos_reporte()
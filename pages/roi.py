@@ -1,11 +1,61 @@
+import time
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+import numpy as np
+
+from almacen import almacen_por_defecto
+from calculo_roi import FACTOR_PENALIZACION_LEGAL, FACTOR_REPUTACIONAL_COP, calcular_roi_segmentado, huella_form_data
+from incidentes import RESUMEN_PERCENTILES, RESUMEN_TOTAL, como_compactos, figura_resumen_incidentes
+from indice_pares import METRICAS_PARES, indice_por_defecto
+from metricas import REGISTRO, iniciar_exportacion, medir_etapa, mostrar_panel_tiempos
+from reportes import ColaReportesLlena, formatos_disponibles, gestor_por_defecto, mostrar_trabajos_reporte, seguir_trabajo
+from recomendaciones import SEVERIDAD_ADVERTENCIA, SEVERIDAD_ERROR, SEVERIDAD_EXITO, generar_recomendaciones_detalladas
+from sensibilidad_roi import barrido_sensibilidad, rejilla
+from simulacion_roi import DISTRIBUCIONES, NUM_SIMULACIONES_POR_DEFECTO, VARIABLES_INCIERTAS, resumir_simulacion, simular_roi_neto
+
+inicio_pagina = time.perf_counter()
+iniciar_exportacion()
 
 st.set_page_config(layout="wide")
 
 st.title("📊 Resultados del ROI en Ciberseguridad")
 
+# --- CARGA DE ENVÍOS GUARDADOS ---
+# Un envío anterior se puede abrir por ID desde la barra lateral o con el parámetro ?envio=<ID> en la URL.
+def cargar_envio_guardado(envio_id):
+    form_data_guardado = almacen_por_defecto().cargar_envio(envio_id)
+    if form_data_guardado is None:
+        st.sidebar.error(f"No existe un envío con ID {envio_id}.")
+        return
+    st.session_state["form_data"] = form_data_guardado
+    st.session_state["envio_futuro"] = None
+    st.session_state["envio_id"] = envio_id
+
+if "envio" in st.query_params and st.query_params["envio"].isdigit():
+    envio_solicitado = int(st.query_params["envio"])
+    if st.session_state.get("envio_id") != envio_solicitado:
+        cargar_envio_guardado(envio_solicitado)
+
+st.sidebar.subheader("📂 Envíos Guardados")
+envio_a_cargar = st.sidebar.number_input("ID del envío", min_value=1, step=1, help="Identificador asignado al guardar el formulario.")
+if st.sidebar.button("Cargar envío"):
+    cargar_envio_guardado(int(envio_a_cargar))
+
+# El ID de un envío recién hecho se conoce cuando el hilo escritor lo confirma.
+envio_futuro = st.session_state.get("envio_futuro")
+if envio_futuro is not None and envio_futuro.done():
+    st.session_state["envio_futuro"] = None
+    if envio_futuro.exception() is None:
+        st.session_state["envio_id"] = envio_futuro.result()
+    else:
+        st.session_state["envio_id"] = None  # Los datos en pantalla no corresponden a ningún envío guardado
+        st.sidebar.error(f"No se pudo guardar el envío: {envio_futuro.exception()}")
+envio_guardandose = envio_futuro is not None and not envio_futuro.done()
+if envio_guardandose:
+    st.sidebar.caption("Guardando envío...")
+elif st.session_state.get("envio_id") is not None:
+    st.sidebar.caption(f"Envío actual: **#{st.session_state['envio_id']}**")
+
 if "form_data" not in st.session_state or not st.session_state["form_data"]:
     st.warning("No se encontraron datos del formulario. Por favor, completa primero el formulario.")
     if st.button("Ir al formulario"):
@@ -30,44 +80,38 @@ with col_datos3:
 st.divider()
 
 
-# --- Lógica del ROI ---
-def calcular_roi_segmentado(form_data):
-    facturacion_anual = form_data.get("Facturación Anual (COP)", 0)
-    presupuesto_ciber_porc = form_data.get("Presupuesto Ciberseguridad (%)", 0.0)
-    roi_estimado_iso_porc = form_data.get("ROI Estimado ISO 27001 (%)", 0.0)
-    sanciones_regulatorias_valor = form_data.get("Sanciones Regulatorias (COP, 3a)", 0)
-    # El valor por defecto del slider es 1, así que usamos eso si la clave no estuviera (aunque debería estar)
-    riesgo_reputacional_nivel = form_data.get("Riesgo Reputacional (1-5)", 1)
-    cumple_ley_1581_estado = form_data.get("Cumple Ley 1581", "No aplica")
-
-    # Cálculo del ahorro por ISO
-    # Si presupuesto_ciber_porc o roi_estimado_iso_porc es 0, el ahorro será 0.
-    inversion_ciber_estimada = facturacion_anual * (presupuesto_ciber_porc / 100.0 if presupuesto_ciber_porc > 0 else 0)
-    ahorro_por_iso = inversion_ciber_estimada * (roi_estimado_iso_porc / 100.0 if roi_estimado_iso_porc > 0 else 0)
-    
-    # Cálculo de penalización legal
-    penalizacion_legal_calculada = 0
-    if isinstance(sanciones_regulatorias_valor, (int, float)) and cumple_ley_1581_estado in ["No", "Parcialmente"]:
-        # Usamos un factor de ejemplo, podría ser el valor completo de las sanciones o un %
-        penalizacion_legal_calculada = sanciones_regulatorias_valor * 0.5 
-    
-    # Cálculo de penalización reputacional
-    penalizacion_reputacional_calculada = 0
-    if isinstance(riesgo_reputacional_nivel, (int, float)):
-        # Factor de ejemplo para convertir el nivel de riesgo a un valor monetario.
-        # Este factor (10,000,000 aquí) es crucial y debe ajustarse a la realidad de la empresa.
-        penalizacion_reputacional_calculada = riesgo_reputacional_nivel * 10000000 
-
-    roi_total_neto = ahorro_por_iso - penalizacion_legal_calculada - penalizacion_reputacional_calculada
-    
-    return {
-        "ROI Financiero (Ahorro ISO)": ahorro_por_iso,
-        "Estimación Costo Incumplimiento Legal": penalizacion_legal_calculada,
-        "Estimación Impacto Reputacional": penalizacion_reputacional_calculada,
-        "ROI Neto Estimado Ciberseguridad": roi_total_neto
-    }
-
-roi_resultados = calcular_roi_segmentado(data)
+# --- PIPELINE MEMORIZADO ---
+# El resumen de incidentes, el ROI, las recomendaciones y la figura serializada se calculan una
+# sola vez por contenido del formulario (hash estable) y se comparten entre reruns y sesiones.
+# max_entries acota la memoria: al llenarse se descartan las entradas menos usadas (LRU).
+# Los incidentes se agregan por tipo antes de graficar: la figura y la tabla tienen a lo sumo una
+# fila por tipo de incidente, sin importar cuántos incidentes reporte la empresa.
+@st.cache_data(max_entries=256, show_spinner=False)
+def procesar_form_data(huella, _form_data):
+    # `huella` es la clave de caché; `_form_data` (con guion bajo) no se vuelve a hashear.
+    # Cada etapa se mide solo cuando se calcula de verdad (en un acierto de caché no se ejecuta).
+    with medir_etapa("calculo_roi"):
+        roi = calcular_roi_segmentado(_form_data)
+    resultado = {"roi": roi, "resumen_incidentes": None, "figura_incidentes": None, "error_grafico": None}
+    incidentes = como_compactos(_form_data.get("Detalles Incidentes"))
+    if len(incidentes):
+        import pandas as pd  # Importación diferida: solo hace falta si hay incidentes que tabular
+
+        try:
+            with medir_etapa("dataframe_incidentes"):
+                resumen = incidentes.resumen_por_tipo()
+                resultado["resumen_incidentes"] = pd.DataFrame(resumen)
+            with medir_etapa("figura_plotly"):
+                resultado["figura_incidentes"] = figura_resumen_incidentes(resumen)
+        except Exception as e:
+            resultado["error_grafico"] = str(e)
+    with medir_etapa("recomendaciones"):
+        resultado["recomendaciones"] = generar_recomendaciones_detalladas(_form_data, resultado["roi"])
+    resultado["horas_incidentes"] = incidentes.horas_totales()
+    return resultado
+
+resultado_envio = procesar_form_data(huella_form_data(data), data)
+roi_resultados = resultado_envio["roi"]
 
 st.subheader("💰 Estimación del Retorno de Inversión (ROI)")
 col_roi1, col_roi2 = st.columns(2)
@@ -85,171 +129,261 @@ if roi_resultados["ROI Neto Estimado Ciberseguridad"] > 0:
 else:
     st.error("El ROI neto estimado es negativo. Se recomienda revisar y optimizar las estrategias e inversiones en ciberseguridad para mitigar pérdidas y mejorar el retorno.")
 
-st.divider()
+# --- COMPARACIÓN CON PARES ---
+# Empresas guardadas más parecidas (mismo sector; tamaño, empleados, país y nivel ISO cercanos).
+# No se memoriza: el índice cambia con cada envío nuevo y la consulta toma pocos milisegundos.
+st.subheader("👥 Comparación con Empresas Similares")
+FORMATOS_METRICA_PARES = {
+    "roi_neto": lambda v: f"${v:,.0f} COP",
+    "horas_incidentes": lambda v: f"{v:,.1f} h",
+    "presupuesto": lambda v: f"{v:.1f} %",
+}
+# Más horas de incidentes es peor: la diferencia contra la mediana se colorea al revés.
+COLOR_DELTA_PARES = {"roi_neto": "normal", "horas_incidentes": "inverse", "presupuesto": "off"}
+# Mientras el envío propio se guarda, este bloque se revisa con esta frecuencia sin bloquear el script.
+INTERVALO_ENVIO_PENDIENTE_S = 1.0
 
-# --- GRÁFICO DE INCIDENTES ---
-# La clave en app.py es "Detalles Incidentes".
-# Cada incidente en la lista tiene la clave "Incidente" para el tipo.
-if "Detalles Incidentes" in data and data["Detalles Incidentes"]:
-    st.subheader("🛡️ Análisis de Incidentes de Ciberseguridad Reportados")
-    try:
-        df_incidentes = pd.DataFrame(data["Detalles Incidentes"])
-
-        # Verificar que las columnas necesarias existan y no estén vacías
-        if not df_incidentes.empty and "Incidente" in df_incidentes and "Duración (h)" in df_incidentes: #
-            df_plot = df_incidentes.copy()
-
-            fig = px.bar(
-                df_plot,
-                x="Incidente",  # CORREGIDO: Usar "Incidente" como en app.py
-                y="Duración (h)",
-                text="Duración (h)",
-                labels={"Duración (h)": "Duración en Horas", "Incidente": "Tipo de Incidente"}, #
-                title="Duración de Incidentes de Ciberseguridad Reportados",
-                color="Incidente" #
-            )
-            fig.update_traces(texttemplate='%{text:.1f}h', textposition="outside")
-            fig.update_layout(
-                xaxis_title="Tipo de Incidente",
-                yaxis_title="Duración en Horas",
-                xaxis_tickangle=-45,
-                uniformtext_minsize=8,
-                uniformtext_mode='hide',
-                legend_title_text='Tipos de Incidente'
-            )
-            st.plotly_chart(fig, use_container_width=True)
 
-            st.markdown("##### Datos de los Incidentes Reportados:")
-            st.dataframe(df_incidentes.style.format({"Duración (h)": "{:.1f}"}))
-        else:
-            st.info("No hay suficientes datos en los incidentes detallados para generar un gráfico (se requieren columnas 'Incidente' y 'Duración (h)').")
-    except Exception as e:
-        st.error(f"Ocurrió un error al generar el gráfico de incidentes: {e}")
-        st.warning("Verifica que los datos de incidentes tengan las columnas 'Incidente' y 'Duración (h)'.")
-else:
-    st.info("No se registraron incidentes específicos detallados en el formulario (sección 'Detalles Incidentes').")
+@st.fragment(run_every=INTERVALO_ENVIO_PENDIENTE_S if envio_guardandose else None)
+def mostrar_comparacion_pares():
+    # El envío propio se excluye de sus pares, así que se espera a conocer su ID: el hilo escritor
+    # podría confirmarlo mientras el índice se pone al día y la empresa sería su propio par.
+    envio_futuro = st.session_state.get("envio_futuro")
+    if envio_futuro is not None:
+        if envio_futuro.done():
+            st.rerun()  # Rerun completo: la barra lateral registra el ID y deja de programar revisiones
+        st.info("El envío todavía se está guardando: la comparación con empresas similares aparecerá en cuanto se confirme.")
+        return
+    with medir_etapa("comparacion_pares"), st.spinner("Preparando el índice de empresas similares..."):
+        comparacion = indice_por_defecto(almacen_por_defecto()).comparar(
+            data, roi_resultados["ROI Neto Estimado Ciberseguridad"], resultado_envio["horas_incidentes"],
+            excluir_envio=st.session_state.get("envio_id"),
+        )
+    if comparacion is None or not comparacion["metricas"]:
+        st.info("Todavía no hay envíos guardados del mismo sector para comparar.")
+        return
+    st.caption(f"Comparado con los {comparacion['pares']} envíos guardados más similares del sector "
+               f"**{data.get('Servicio Principal IT', 'Sin dato')}**. El percentil indica qué parte de los pares tiene un valor menor.")
+    columnas_pares = st.columns(len(comparacion["metricas"]))
+    for columna, (nombre, metrica) in zip(columnas_pares, comparacion["metricas"].items()):
+        formato = FORMATOS_METRICA_PARES[nombre]
+        diferencia = metrica["valor"] - metrica["mediana"]
+        columna.metric(
+            f"{METRICAS_PARES[nombre]} · percentil {metrica['percentil']:.0f}", formato(metrica["valor"]),
+            delta=f"{'+' if diferencia >= 0 else '-'}{formato(abs(diferencia))} vs. mediana",
+            delta_color=COLOR_DELTA_PARES[nombre],
+        )
+    st.table([
+        {"Métrica": METRICAS_PARES[nombre], "Su empresa": FORMATOS_METRICA_PARES[nombre](metrica["valor"]),
+         "Percentil": f"{metrica['percentil']:.0f}",
+         **{etiqueta: FORMATOS_METRICA_PARES[nombre](metrica[clave]) for clave, etiqueta in (("p25", "P25 pares"), ("mediana", "Mediana pares"), ("p75", "P75 pares"))}}
+        for nombre, metrica in comparacion["metricas"].items()
+    ])
+
+
+mostrar_comparacion_pares()
 
 st.divider()
 
-# --- SECCIÓN DE RECOMENDACIONES ---
-st.subheader("💡 Recomendaciones Personalizadas")
+# --- SIMULACIÓN DE INCERTIDUMBRE (MONTE CARLO) ---
+# El resultado se memoriza por parámetros: cambiar otros widgets de la página no vuelve a simular.
+@st.cache_data(max_entries=32, show_spinner="Simulando escenarios...")
+def simular_roi_cacheado(entradas_fijas, distribuciones, n_simulaciones, semilla):
+    roi_neto = simular_roi_neto(dict(entradas_fijas), dict(distribuciones), n_simulaciones, semilla)
+    return resumir_simulacion(roi_neto)
 
-def generar_recomendaciones(form_data, roi_data):
-    recomendaciones = []
-    # --- Análisis del ROI Neto ---
-    if roi_data["ROI Neto Estimado Ciberseguridad"] < 0:
-        recomendaciones.append(
-            "**🔴 ROI Neto Negativo:** Su Retorno de Inversión Neto Estimado en Ciberseguridad es negativo. "
-            "Es crucial identificar áreas de mejora para optimizar sus inversiones y reducir pérdidas potenciales."
-        )
-        costo_legal = roi_data["Estimación Costo Incumplimiento Legal"]
-        costo_reputacional = roi_data["Estimación Impacto Reputacional"]
-
-        if costo_reputacional >= costo_legal and costo_reputacional > 0 : # Considerar si es el mayor o igual
-            recomendaciones.append(
-                f"  - El **Impacto Reputacional Estimado** (${costo_reputacional:,.0f} COP) es un factor muy significativo. "
-                f"Su actual percepción de Riesgo Reputacional es de **{form_data.get('Riesgo Reputacional (1-5)', 'N/A')}/5**. " #
-                "Fortalecer la postura de seguridad, mejorar la comunicación en crisis y construir confianza son claves. "
-                "El factor multiplicador actual en la fórmula es de 10,000,000 por cada punto de riesgo; considere si este factor refleja adecuadamente su contexto."
-            )
-        elif costo_legal > 0:
-            recomendaciones.append(
-                f"  - El **Costo Estimado por Incumplimiento Legal** (${costo_legal:,.0f} COP) está afectando su ROI. "
-                f"Dado que el estado de cumplimiento de la Ley 1581 es '{form_data.get('Cumple Ley 1581', 'N/A')}' y se reportaron sanciones, " #
-                "es fundamental priorizar la adecuación a esta normativa para evitar o reducir sanciones futuras."
-            )
-        
-        if roi_data["ROI Financiero (Ahorro ISO)"] <= 0: # Si es cero o negativo (aunque la fórmula actual no lo hace negativo)
-            msg_ahorro_iso = "- El **Ahorro Estimado por ISO 27001 es bajo o nulo.** "
-            if form_data.get("Facturación Anual (COP)", 0) == 0: #
-                msg_ahorro_iso += "Esto se debe a que la 'Facturación Anual' reportada es cero, y este cálculo depende de ella. "
-            if form_data.get("Presupuesto Ciberseguridad (%)", 0.0) == 0: #
-                msg_ahorro_iso += "El 'Presupuesto de Ciberseguridad (%)' es cero. Considere asignar un presupuesto. "
-            if form_data.get("ROI Estimado ISO 27001 (%)", 0.0) == 0: #
-                msg_ahorro_iso += "El 'ROI Estimado para ISO 27001 (%)' es cero. Si espera beneficios, reevalúe esta estimación. "
-            recomendaciones.append(msg_ahorro_iso.strip())
-
-    else: # ROI Neto Positivo o Cero
-        recomendaciones.append(
-            "**🟢 ROI Neto Positivo o Cero:** ¡Excelente! Su Retorno de Inversión Neto Estimado en Ciberseguridad es positivo o cero. "
-            "Esto sugiere que sus estrategias e inversiones actuales están, en general, bien orientadas."
-        )
-        if roi_data["ROI Financiero (Ahorro ISO)"] > 0:
-             recomendaciones.append(
-                f"  - El **Ahorro Estimado por ISO 27001** (${roi_data['ROI Financiero (Ahorro ISO)']:,.0f} COP) es un contribuyente positivo importante. "
-                "Continuar y optimizar la adhesión a estándares como ISO 27001 es valioso."
-            )
-        elif form_data.get("Nivel ISO 27001", "No implementado") != "Certificado": #
-            recomendaciones.append(
-                f"  - Aunque el ROI es positivo, su nivel actual de implementación de ISO 27001 es '{form_data.get('Nivel ISO 27001', 'N/A')}'. " #
-                "Avanzar hacia la certificación podría desbloquear aún más beneficios y ahorros."
+with st.expander("🎲 Simulación de Incertidumbre del ROI (Monte Carlo)"):
+    st.markdown(
+        "Las entradas del ROI son estimaciones. Defina para cada una un rango (mínimo, más probable, máximo) "
+        "y una distribución para ver el rango probable del ROI neto."
+    )
+    roi_iso_form = float(data.get("ROI Estimado ISO 27001 (%)", 0.0))
+    riesgo_form = float(data.get("Riesgo Reputacional (1-5)", 1))
+    sanciones_form = float(data.get("Sanciones Regulatorias (COP, 3a)", 0))
+    # (clave del formulario, distribución por defecto, mínimo, más probable, máximo, paso)
+    variables_simulables = [
+        ("ROI Estimado ISO 27001 (%)", "Triangular", roi_iso_form * 0.5, roi_iso_form, min(roi_iso_form * 1.5, 500.0), 1.0),
+        ("Riesgo Reputacional (1-5)", "Triangular", max(riesgo_form - 1, 1.0), riesgo_form, min(riesgo_form + 1, 5.0), 0.5),
+        ("Sanciones Regulatorias (COP, 3a)", "Fija", sanciones_form * 0.5, sanciones_form, sanciones_form * 1.5, 1000.0),
+    ]
+
+    with st.form("simulacion_roi_form"):
+        distribuciones_elegidas = {}
+        for clave, dist_defecto, minimo, mas_probable, maximo, paso in variables_simulables:
+            st.markdown(f"**{clave}**")
+            col_dist, col_min, col_mod, col_max = st.columns(4)
+            distribucion = col_dist.selectbox("Distribución", DISTRIBUCIONES, index=DISTRIBUCIONES.index(dist_defecto), key=f"sim_dist_{clave}")
+            minimo = col_min.number_input("Mínimo", value=minimo, step=paso, key=f"sim_min_{clave}")
+            mas_probable = col_mod.number_input("Más probable", value=mas_probable, step=paso, key=f"sim_mod_{clave}")
+            maximo = col_max.number_input("Máximo", value=maximo, step=paso, key=f"sim_max_{clave}")
+            distribuciones_elegidas[clave] = (distribucion, minimo, mas_probable, maximo)
+        col_n, col_semilla = st.columns(2)
+        n_simulaciones = col_n.number_input("Número de simulaciones", min_value=1000, max_value=2000000, value=NUM_SIMULACIONES_POR_DEFECTO, step=50000)
+        semilla = col_semilla.number_input("Semilla aleatoria", min_value=0, value=42, step=1, help="Misma semilla y parámetros = mismo resultado.")
+        simular = st.form_submit_button("▶️ Ejecutar simulación")
+
+    if simular:
+        st.session_state["simulacion_roi_parametros"] = (distribuciones_elegidas, int(n_simulaciones), int(semilla))
+
+    if "simulacion_roi_parametros" in st.session_state:
+        distribuciones_elegidas, n_simulaciones, semilla = st.session_state["simulacion_roi_parametros"]
+        entradas_fijas = tuple(sorted(
+            (clave, data.get(clave)) for clave in
+            ["Facturación Anual (COP)", "Presupuesto Ciberseguridad (%)", "Cumple Ley 1581"] + list(VARIABLES_INCIERTAS)
+            if clave in data
+        ))
+        try:
+            resumen = simular_roi_cacheado(entradas_fijas, tuple(sorted(distribuciones_elegidas.items())), n_simulaciones, semilla)
+        except ValueError as e:
+            st.error(f"Parámetros de simulación inválidos: {e}")
+        else:
+            col_p5, col_p50, col_p95, col_neg = st.columns(4)
+            col_p5.metric("P5 ROI Neto", f"${resumen['percentiles']['P5']:,.0f} COP")
+            col_p50.metric("P50 ROI Neto", f"${resumen['percentiles']['P50']:,.0f} COP")
+            col_p95.metric("P95 ROI Neto", f"${resumen['percentiles']['P95']:,.0f} COP")
+            col_neg.metric("Probabilidad ROI Negativo", f"{resumen['probabilidad_negativo']:.1%}")
+
+            import pandas as pd
+            import plotly.express as px
+
+            bordes = resumen["histograma_bordes"]
+            df_histograma = pd.DataFrame({
+                "ROI Neto (COP)": (bordes[:-1] + bordes[1:]) / 2,
+                "Simulaciones": resumen["histograma_conteos"],
+            })
+            fig_sim = px.bar(
+                df_histograma, x="ROI Neto (COP)", y="Simulaciones",
+                title=f"Distribución del ROI Neto Estimado ({n_simulaciones:,} simulaciones)",
             )
+            fig_sim.update_traces(width=float(bordes[1] - bordes[0]))
+            for nombre, valor in resumen["percentiles"].items():
+                fig_sim.add_vline(x=valor, line_dash="dash", annotation_text=nombre)
+            st.plotly_chart(fig_sim, use_container_width=True)
+
+# --- ANÁLISIS WHAT-IF (SENSIBILIDAD A LOS FACTORES DEL MODELO) ---
+# Se calcula el cubo completo (presupuesto x factor legal x factor reputacional) de una sola vez y se
+# memoriza por hash de las entradas con un número acotado de entradas; mover el control de
+# presupuesto solo selecciona un corte del cubo ya calculado.
+@st.cache_data(max_entries=16, show_spinner="Calculando superficie de sensibilidad...")
+def barrido_sensibilidad_cacheado(entradas_fijas, rango_presupuesto, rango_legal, rango_reputacional):
+    return np.array(barrido_sensibilidad(
+        dict(entradas_fijas), rejilla(*rango_presupuesto), rejilla(*rango_legal), rejilla(*rango_reputacional)
+    ))
+
+with st.expander("🧪 Análisis What-If: Sensibilidad del ROI Neto"):
+    st.markdown(
+        "Explore cómo cambia el ROI neto al mover los factores del modelo: el costo en COP por cada punto de "
+        "riesgo reputacional, la fracción de las sanciones asumida como costo legal y el presupuesto de ciberseguridad."
+    )
+    with st.form("sensibilidad_roi_form"):
+        col_rep, col_legal, col_pres = st.columns(3)
+        with col_rep:
+            rep_min = st.number_input("Factor reputacional mínimo (COP/punto)", min_value=0, value=0, step=1000000, format="%d")
+            rep_max = st.number_input("Factor reputacional máximo (COP/punto)", min_value=0, value=2 * FACTOR_REPUTACIONAL_COP, step=1000000, format="%d")
+        with col_legal:
+            legal_min = st.number_input("Factor legal mínimo", min_value=0.0, value=0.0, step=0.05, format="%.2f")
+            legal_max = st.number_input("Factor legal máximo", min_value=0.0, value=1.0, step=0.05, format="%.2f")
+        with col_pres:
+            pres_min = st.number_input("Presupuesto mínimo (%)", min_value=0.0, max_value=100.0, value=0.0, step=0.5, format="%.1f")
+            pres_max = st.number_input("Presupuesto máximo (%)", min_value=0.0, max_value=100.0, value=20.0, step=0.5, format="%.1f")
+        resolucion = st.slider("Puntos por eje", min_value=5, max_value=101, value=41)
+        if st.form_submit_button("🔄 Calcular superficie"):
+            st.session_state["sensibilidad_activa"] = True
 
+    # La superficie (y plotly) solo se cargan cuando el usuario la pide por primera vez en la sesión.
+    if not st.session_state.get("sensibilidad_activa"):
+        st.caption("Ajuste los rangos y presione 'Calcular superficie' para ver el mapa de calor.")
+    elif rep_min > rep_max or legal_min > legal_max or pres_min > pres_max:
+        st.error("Cada mínimo debe ser menor o igual a su máximo.")
+    else:
+        import plotly.express as px
 
-    # --- Análisis de Cumplimiento Legal Detallado ---
-    if form_data.get("Cumple Ley 1581") in ["No", "Parcialmente"]: #
-        recomendaciones.append(
-            f"- **Atención al Cumplimiento Normativo (Ley 1581):** Ha indicado un cumplimiento '{form_data.get('Cumple Ley 1581')}' con la Ley 1581. " #
-            "Es prioritario adecuar sus procesos para garantizar la protección de datos personales. Esto no solo evita sanciones "
-            f"(${form_data.get('Sanciones Regulatorias (COP, 3a)', 0):,.0f} COP reportadas en los últimos 3 años), sino que también fortalece la confianza." #
+        entradas_fijas = tuple(sorted(
+            (clave, data.get(clave)) for clave in
+            ["Facturación Anual (COP)", "ROI Estimado ISO 27001 (%)", "Sanciones Regulatorias (COP, 3a)",
+             "Riesgo Reputacional (1-5)", "Cumple Ley 1581"]
+            if clave in data
+        ))
+        rango_presupuesto = (pres_min, pres_max, resolucion)
+        rango_legal = (legal_min, legal_max, resolucion)
+        rango_reputacional = (rep_min, rep_max, resolucion)
+        superficie = barrido_sensibilidad_cacheado(entradas_fijas, rango_presupuesto, rango_legal, rango_reputacional)
+
+        presupuestos = rejilla(*rango_presupuesto)
+        presupuesto_form = float(data.get("Presupuesto Ciberseguridad (%)", 0.0))
+        presupuesto_elegido = st.select_slider(
+            "Presupuesto de Ciberseguridad (%) para el mapa de calor",
+            options=[round(float(p), 2) for p in presupuestos],
+            value=round(float(presupuestos[np.abs(presupuestos - presupuesto_form).argmin()]), 2),
+        )
+        indice_presupuesto = int(np.abs(presupuestos - presupuesto_elegido).argmin())
+
+        fig_sens = px.imshow(
+            superficie[indice_presupuesto],
+            x=rejilla(*rango_reputacional),
+            y=rejilla(*rango_legal),
+            origin="lower",
+            aspect="auto",
+            color_continuous_scale="RdYlGn",
+            color_continuous_midpoint=0,
+            labels={"x": "Factor Reputacional (COP por punto de riesgo)", "y": "Factor Legal (fracción de sanciones)", "color": "ROI Neto (COP)"},
+            title=f"ROI Neto Estimado con presupuesto de {presupuesto_elegido:.1f}%",
         )
-    elif form_data.get("Cumple Ley 1581") == "Sí": #
-        recomendaciones.append(
-            "- **Fortaleza en Cumplimiento Normativo:** ¡Muy bien por cumplir con la Ley 1581! Mantener este estándar es clave."
+        # Punto de los factores actuales del modelo como referencia.
+        fig_sens.add_scatter(
+            x=[FACTOR_REPUTACIONAL_COP], y=[FACTOR_PENALIZACION_LEGAL], mode="markers",
+            marker={"symbol": "x", "size": 12, "color": "black"}, name="Factores actuales", showlegend=False,
         )
+        st.plotly_chart(fig_sens, use_container_width=True)
 
-    # --- Análisis basado en Incidentes ---
-    incidentes = form_data.get("Detalles Incidentes", []) #
-    if incidentes:
-        df_incidentes_rec = pd.DataFrame(incidentes)
-        if not df_incidentes_rec.empty and "Duración (h)" in df_incidentes_rec:
-            total_horas_perdidas = df_incidentes_rec["Duración (h)"].sum()
-            num_incidentes_detallados = len(df_incidentes_rec)
-            recomendaciones.append(
-                f"- **Análisis de Incidentes Detallados:** Se reportaron **{num_incidentes_detallados} incidente(s) específicos**, sumando un total de **{total_horas_perdidas:,.1f} horas de duración**. "
-                "Cada hora de inactividad o recuperación tiene costos asociados (directos e indirectos). Reducir la frecuencia y la duración de los incidentes es una vía clara para mejorar el ROI. "
-                "Analice las causas raíz de estos incidentes para fortalecer sus defensas."
-            )
-            if "Incidente" in df_incidentes_rec: #
-                try:
-                    tipos_comunes = df_incidentes_rec["Incidente"].mode() #
-                    if not tipos_comunes.empty:
-                        recomendaciones.append(
-                            f"  - **Tipos de incidentes más frecuentes (detallados):** {', '.join(tipos_comunes)}. Considere enfocar esfuerzos preventivos y de mitigación en estas áreas."
-                        )
-                except Exception: # En caso de que .mode() falle por algún tipo de dato inesperado.
-                    pass 
-    
-    # Considerar el número general de incidentes si no hay detalles
-    if not incidentes and form_data.get("Incidentes Ciber (12m)", 0) > 0: #
-         recomendaciones.append(
-            f"- **Registro General de Incidentes:** Aunque no se detallaron incidentes específicos en esta ocasión, se reportaron **{form_data.get('Incidentes Ciber (12m)', 0)} incidentes en los últimos 12 meses**. " #
-            "Es importante llevar un registro detallado de cada uno (tipo, impacto, duración, causa raíz, lecciones aprendidas) para identificar patrones y áreas de mejora."
+st.divider()
+
+# --- GRÁFICO DE INCIDENTES ---
+# La clave en app.py es "Detalles Incidentes" (forma compacta, ver incidentes.py).
+if resultado_envio["resumen_incidentes"] is not None or resultado_envio["error_grafico"] is not None:
+    st.subheader("🛡️ Análisis de Incidentes de Ciberseguridad Reportados")
+    if resultado_envio["error_grafico"] is not None:
+        st.error(f"Ocurrió un error al generar el gráfico de incidentes: {resultado_envio['error_grafico']}")
+        st.warning("Verifica que los datos de incidentes tengan las columnas 'Incidente' y 'Duración (h)'.")
+    else:
+        with medir_etapa("plotly_chart"):
+            st.plotly_chart(resultado_envio["figura_incidentes"], use_container_width=True)
+
+        st.markdown("##### Resumen de los Incidentes Reportados por Tipo:")
+        st.dataframe(
+            resultado_envio["resumen_incidentes"].style.format({columna: "{:.1f}" for columna in [RESUMEN_TOTAL, *RESUMEN_PERCENTILES.values()]}),
+            hide_index=True,
         )
-    elif not incidentes and form_data.get("Incidentes Ciber (12m)", 0) == 0: #
-        recomendaciones.append(
-            "- **Registro de Incidentes:** No se reportaron incidentes generales ni específicos. Si bien esto es ideal, asegúrese de tener procesos para detectar y registrar cualquier incidente futuro."
-            )
+else:
+    st.info("No se registraron incidentes específicos detallados en el formulario (sección 'Detalles Incidentes').")
 
+st.divider()
 
-    # --- Recomendación General Final ---
-    recomendaciones.append(
-        "- **Visión Estratégica y Mejora Continua:** La ciberseguridad debe ser vista como una inversión estratégica y un proceso de mejora continua. "
-        "Reevalúe periódicamente su perfil de riesgo, actualice sus defensas conforme evolucionan las amenazas y fomente una cultura de seguridad en toda la organización. "
-        "Considere realizar análisis de riesgos más profundos y pruebas de penetración para validar la efectividad de sus controles."
-    )
-    return recomendaciones
+# --- SECCIÓN DE RECOMENDACIONES ---
+st.subheader("💡 Recomendaciones Personalizadas")
 
-recomendaciones_generadas = generar_recomendaciones(data, roi_resultados)
+recomendaciones_generadas = resultado_envio["recomendaciones"]
 if recomendaciones_generadas:
-    for i, rec in enumerate(recomendaciones_generadas):
-        if rec.startswith("**🔴 ROI Neto Negativo:**"):
-            st.error(rec)
-        elif rec.startswith("**🟢 ROI Neto Positivo o Cero:**"):
-            st.success(rec)
-        elif rec.startswith("- **Atención al Cumplimiento Normativo") or rec.startswith("- **Análisis de Incidentes Detallados:") or rec.startswith("- **Registro General de Incidentes:"):
-            st.warning(rec)
-        else:
-            st.markdown(rec)
+    # El estilo de cada alerta lo define la severidad declarada en la regla.
+    estilos = {SEVERIDAD_ERROR: st.error, SEVERIDAD_EXITO: st.success, SEVERIDAD_ADVERTENCIA: st.warning}
+    for rec in recomendaciones_generadas:
+        estilos.get(rec["severidad"], st.markdown)(rec["texto"])
 else:
-    st.info("No se pudieron generar recomendaciones específicas con los datos proporcionados.")
\ No newline at end of file
+    st.info("No se pudieron generar recomendaciones específicas con los datos proporcionados.")
+
+st.divider()
+
+# --- EXPORTACIÓN DE REPORTES ---
+# El reporte se genera en segundo plano (ver reportes.py) a partir de los resultados ya memorizados
+# de esta página; la descarga aparece aquí cuando termina.
+st.subheader("📄 Exportar Reporte")
+formato_reporte = st.radio("Formato del reporte", formatos_disponibles(), format_func=str.upper, horizontal=True, key="formato_reporte_roi")
+if st.button("Generar reporte"):
+    try:
+        seguir_trabajo(gestor_por_defecto().encolar_empresa(data, formato_reporte, resultado_envio))
+    except ColaReportesLlena as e:
+        st.warning(str(e))
+mostrar_trabajos_reporte()
+
+REGISTRO.observar("pagina_roi", time.perf_counter() - inicio_pagina)
+mostrar_panel_tiempos()
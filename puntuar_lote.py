@@ -0,0 +1,133 @@
+"""Puntuación masiva (sin interfaz) del ROI y las recomendaciones a partir de un archivo CSV o Parquet.
+
+Uso:
+    python puntuar_lote.py empresas.csv resultados.parquet --tamano-bloque 50000
+
+Cada fila del archivo de entrada usa las mismas claves que app.py guarda en
+st.session_state["form_data"]. La columna "Detalles Incidentes" puede venir como texto JSON
+(CSV) o como lista de registros (Parquet). La lectura y la escritura se hacen por bloques de
+tamaño fijo, así que la memoria no depende del tamaño del archivo.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from calculo_roi import COMPONENTES_ROI, calcular_roi_lote
+from incidentes import COL_INCIDENTES, IncidentesCompactos
+from recomendaciones import generar_recomendaciones_lote
+
+TAMANO_BLOQUE_POR_DEFECTO = 50000
+COL_RECOMENDACIONES = "Recomendaciones"
+# Columnas de identificación que se copian de la entrada a la salida (como texto).
+COLUMNAS_IDENTIFICACION = ["ID Empresa", "Nombre Empresa"]
+
+ESQUEMA_SALIDA = pa.schema(
+    [pa.field(col, pa.string()) for col in COLUMNAS_IDENTIFICACION]
+    + [pa.field(col, pa.float64()) for col in COMPONENTES_ROI]
+    + [pa.field(COL_RECOMENDACIONES, pa.string())]
+)
+
+
+def _formato(ruta):
+    sufijo = Path(ruta).suffix.lower()
+    if sufijo == ".csv":
+        return "csv"
+    if sufijo in (".parquet", ".pq"):
+        return "parquet"
+    raise ValueError(f"Formato no soportado para '{ruta}': use .csv o .parquet")
+
+
+def leer_bloques(ruta, tamano_bloque):
+    # Generador de DataFrames de a lo sumo `tamano_bloque` filas.
+    if _formato(ruta) == "csv":
+        # Los identificadores se leen como texto para no perder ceros a la izquierda (NIT/RUT).
+        try:
+            yield from pd.read_csv(ruta, chunksize=tamano_bloque, dtype={col: str for col in COLUMNAS_IDENTIFICACION})
+        except pd.errors.EmptyDataError:
+            return  # Archivo vacío (ni siquiera encabezado): cero bloques
+    else:
+        archivo = pq.ParquetFile(ruta)
+        for lote in archivo.iter_batches(batch_size=tamano_bloque):
+            yield lote.to_pandas()
+
+
+def _es_vacio(valor):
+    return valor is None or (isinstance(valor, float) and valor != valor)
+
+
+def _incidentes(valor):
+    # Normaliza "Detalles Incidentes" (lista de registros o texto JSON) a la forma compacta de app.py.
+    if _es_vacio(valor):
+        return IncidentesCompactos()
+    if isinstance(valor, str):
+        valor = json.loads(valor) if valor.strip() else []
+    return IncidentesCompactos.desde_registros([dict(incidente) for incidente in valor])
+
+
+def puntuar_bloque(df):
+    roi = calcular_roi_lote(df)
+    salida = pd.DataFrame(index=df.index)
+    for col in COLUMNAS_IDENTIFICACION:
+        salida[col] = df[col].astype("string") if col in df else pd.Series(pd.NA, index=df.index, dtype="string")
+    salida[COMPONENTES_ROI] = roi
+
+    # Las reglas se evalúan sobre todo el bloque; las celdas vacías toman los valores por defecto del formulario.
+    datos = df.copy(deep=False)
+    incidentes = df[COL_INCIDENTES] if COL_INCIDENTES in df else [None] * len(df)
+    datos[COL_INCIDENTES] = pd.Series([_incidentes(valor) for valor in incidentes], index=df.index, dtype=object)
+    salida[COL_RECOMENDACIONES] = [
+        json.dumps([recomendacion["texto"] for recomendacion in recomendaciones], ensure_ascii=False)
+        for recomendaciones in generar_recomendaciones_lote(datos, roi)
+    ]
+    return salida.reset_index(drop=True)
+
+
+def puntuar_archivo(entrada, salida, tamano_bloque=TAMANO_BLOQUE_POR_DEFECTO):
+    formato_salida = _formato(salida)
+    filas = 0
+    escritor_parquet = None
+    try:
+        for i, bloque in enumerate(leer_bloques(entrada, tamano_bloque)):
+            resultado = puntuar_bloque(bloque)
+            if formato_salida == "csv":
+                resultado.to_csv(salida, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            else:
+                if escritor_parquet is None:
+                    escritor_parquet = pq.ParquetWriter(salida, ESQUEMA_SALIDA)
+                escritor_parquet.write_table(pa.Table.from_pandas(resultado, schema=ESQUEMA_SALIDA, preserve_index=False))
+            filas += len(resultado)
+        if escritor_parquet is None and filas == 0:
+            # Sin bloques que escribir: igual se crea la salida, vacía pero con el esquema completo,
+            # para que quien la consuma no falle por un archivo inexistente.
+            if formato_salida == "csv":
+                ESQUEMA_SALIDA.empty_table().to_pandas().to_csv(salida, index=False)
+            else:
+                pq.write_table(ESQUEMA_SALIDA.empty_table(), salida)
+    finally:
+        if escritor_parquet is not None:
+            escritor_parquet.close()
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcula el ROI y las recomendaciones para un archivo de empresas.")
+    parser.add_argument("entrada", help="Archivo .csv o .parquet con los datos del formulario por empresa.")
+    parser.add_argument("salida", help="Archivo .csv o .parquet donde se escriben los resultados.")
+    parser.add_argument("--tamano-bloque", type=int, default=TAMANO_BLOQUE_POR_DEFECTO,
+                        help=f"Filas procesadas por bloque (por defecto {TAMANO_BLOQUE_POR_DEFECTO}).")
+    args = parser.parse_args(argv)
+    if args.tamano_bloque <= 0:
+        parser.error("--tamano-bloque debe ser mayor que 0")
+
+    filas = puntuar_archivo(args.entrada, args.salida, args.tamano_bloque)
+    print(f"{filas} empresa(s) puntuadas -> {args.salida}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""Reglas de recomendaciones personalizadas a partir del formulario y del ROI calculado.
+
+Las reglas están declaradas en la tabla REGLAS (en el orden en que se muestran). Cada regla tiene
+una condición vectorizada, que se evalúa como máscara booleana sobre todo un lote de empresas, una
+severidad explícita y una plantilla de texto que solo se formatea para las empresas en las que la
+regla se cumple.
+"""
+import string
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from calculo_roi import (
+    COL_FACTURACION,
+    COL_PRESUPUESTO,
+    COL_RIESGO_REPUTACIONAL,
+    COL_ROI_ISO,
+    COL_SANCIONES,
+    COMPONENTES_ROI,
+    ESTADOS_LEY_1581_PENALIZADOS,
+    ROI_AHORRO_ISO,
+    ROI_COSTO_LEGAL,
+    ROI_IMPACTO_REPUTACIONAL,
+    ROI_NETO,
+)
+from incidentes import COL_INCIDENTES, IncidentesCompactos
+
+# --- SEVERIDADES (definen el estilo de alerta en pages/roi.py) ---
+SEVERIDAD_ERROR = "error"
+SEVERIDAD_EXITO = "exito"
+SEVERIDAD_ADVERTENCIA = "advertencia"
+SEVERIDAD_NORMAL = "normal"
+
+Regla = namedtuple("Regla", ["id", "severidad", "condicion", "plantilla"])
+
+
+def _texto_ahorro_bajo(c, i):
+    msg_ahorro_iso = "- El **Ahorro Estimado por ISO 27001 es bajo o nulo.** "
+    if c["facturacion"][i] == 0:
+        msg_ahorro_iso += "Esto se debe a que la 'Facturación Anual' reportada es cero, y este cálculo depende de ella. "
+    if c["presupuesto"][i] == 0:
+        msg_ahorro_iso += "El 'Presupuesto de Ciberseguridad (%)' es cero. Considere asignar un presupuesto. "
+    if c["roi_iso"][i] == 0:
+        msg_ahorro_iso += "El 'ROI Estimado para ISO 27001 (%)' es cero. Si espera beneficios, reevalúe esta estimación. "
+    return msg_ahorro_iso.strip()
+
+
+def _texto_incumplimiento_ley(c, i):
+    sanciones = c["sanciones"][i]
+    # Sanciones no numéricas (NaN): se omite el monto en lugar de mostrar "$nan COP".
+    monto = f" (${sanciones:,.0f} COP reportadas en los últimos 3 años)" if np.isfinite(sanciones) else ""
+    return (f"- **Atención al Cumplimiento Normativo (Ley 1581):** Ha indicado un cumplimiento '{c['cumple_ley_1581'][i]}' con la Ley 1581. "
+            "Es prioritario adecuar sus procesos para garantizar la protección de datos personales. Esto no solo evita sanciones"
+            f"{monto}, sino que también fortalece la confianza.")
+
+
+def _reputacional_domina(c):
+    return (c["costo_reputacional"] >= c["costo_legal"]) & (c["costo_reputacional"] > 0)
+
+
+# Cada condición recibe el contexto del lote (dict de arreglos, ver _contexto) y devuelve una máscara.
+# Las plantillas str se formatean con los campos del contexto; las callables reciben (contexto, fila).
+REGLAS = [
+    # --- Análisis del ROI Neto ---
+    Regla("roi_negativo", SEVERIDAD_ERROR,
+          lambda c: c["roi_neto"] < 0,
+          "**🔴 ROI Neto Negativo:** Su Retorno de Inversión Neto Estimado en Ciberseguridad es negativo. "
+          "Es crucial identificar áreas de mejora para optimizar sus inversiones y reducir pérdidas potenciales."),
+    Regla("impacto_reputacional", SEVERIDAD_NORMAL,
+          lambda c: (c["roi_neto"] < 0) & _reputacional_domina(c),
+          "  - El **Impacto Reputacional Estimado** (${costo_reputacional:,.0f} COP) es un factor muy significativo. "
+          "Su actual percepción de Riesgo Reputacional es de **{riesgo_reputacional}/5**. "
+          "Fortalecer la postura de seguridad, mejorar la comunicación en crisis y construir confianza son claves. "
+          "El factor multiplicador actual en la fórmula es de 10,000,000 por cada punto de riesgo; considere si este factor refleja adecuadamente su contexto."),
+    Regla("costo_legal", SEVERIDAD_NORMAL,
+          lambda c: (c["roi_neto"] < 0) & ~_reputacional_domina(c) & (c["costo_legal"] > 0),
+          "  - El **Costo Estimado por Incumplimiento Legal** (${costo_legal:,.0f} COP) está afectando su ROI. "
+          "Dado que el estado de cumplimiento de la Ley 1581 es '{cumple_ley_1581_texto}' y se reportaron sanciones, "
+          "es fundamental priorizar la adecuación a esta normativa para evitar o reducir sanciones futuras."),
+    Regla("ahorro_iso_bajo", SEVERIDAD_NORMAL,
+          lambda c: (c["roi_neto"] < 0) & (c["ahorro_iso"] <= 0),
+          _texto_ahorro_bajo),
+    Regla("roi_positivo", SEVERIDAD_EXITO,
+          lambda c: ~(c["roi_neto"] < 0),
+          "**🟢 ROI Neto Positivo o Cero:** ¡Excelente! Su Retorno de Inversión Neto Estimado en Ciberseguridad es positivo o cero. "
+          "Esto sugiere que sus estrategias e inversiones actuales están, en general, bien orientadas."),
+    Regla("ahorro_iso_positivo", SEVERIDAD_NORMAL,
+          lambda c: ~(c["roi_neto"] < 0) & (c["ahorro_iso"] > 0),
+          "  - El **Ahorro Estimado por ISO 27001** (${ahorro_iso:,.0f} COP) es un contribuyente positivo importante. "
+          "Continuar y optimizar la adhesión a estándares como ISO 27001 es valioso."),
+    Regla("avanzar_certificacion_iso", SEVERIDAD_NORMAL,
+          lambda c: ~(c["roi_neto"] < 0) & ~(c["ahorro_iso"] > 0) & (c["nivel_iso27001"] != "Certificado"),
+          "  - Aunque el ROI es positivo, su nivel actual de implementación de ISO 27001 es '{nivel_iso27001_texto}'. "
+          "Avanzar hacia la certificación podría desbloquear aún más beneficios y ahorros."),
+    # --- Análisis de Cumplimiento Legal Detallado ---
+    Regla("incumplimiento_ley_1581", SEVERIDAD_ADVERTENCIA,
+          lambda c: np.isin(c["cumple_ley_1581"], ESTADOS_LEY_1581_PENALIZADOS),
+          _texto_incumplimiento_ley),
+    Regla("cumplimiento_ley_1581", SEVERIDAD_NORMAL,
+          lambda c: c["cumple_ley_1581"] == "Sí",
+          "- **Fortaleza en Cumplimiento Normativo:** ¡Muy bien por cumplir con la Ley 1581! Mantener este estándar es clave."),
+    # --- Análisis basado en Incidentes ---
+    Regla("incidentes_detallados", SEVERIDAD_ADVERTENCIA,
+          lambda c: (c["num_incidentes"] > 0) & c["incidentes_con_duracion"],
+          "- **Análisis de Incidentes Detallados:** Se reportaron **{num_incidentes} incidente(s) específicos**, sumando un total de **{horas_incidentes:,.1f} horas de duración**. "
+          "Cada hora de inactividad o recuperación tiene costos asociados (directos e indirectos). Reducir la frecuencia y la duración de los incidentes es una vía clara para mejorar el ROI. "
+          "Analice las causas raíz de estos incidentes para fortalecer sus defensas."),
+    Regla("tipos_incidentes_frecuentes", SEVERIDAD_NORMAL,
+          lambda c: (c["num_incidentes"] > 0) & c["incidentes_con_duracion"] & (c["tipos_mas_frecuentes"] != ""),
+          "  - **Tipos de incidentes más frecuentes (detallados):** {tipos_mas_frecuentes}. Considere enfocar esfuerzos preventivos y de mitigación en estas áreas."),
+    # Considerar el número general de incidentes si no hay detalles
+    Regla("registro_general_incidentes", SEVERIDAD_ADVERTENCIA,
+          lambda c: (c["num_incidentes"] == 0) & (c["incidentes_12m_num"] > 0),
+          "- **Registro General de Incidentes:** Aunque no se detallaron incidentes específicos en esta ocasión, se reportaron **{incidentes_12m} incidentes en los últimos 12 meses**. "
+          "Es importante llevar un registro detallado de cada uno (tipo, impacto, duración, causa raíz, lecciones aprendidas) para identificar patrones y áreas de mejora."),
+    Regla("sin_incidentes", SEVERIDAD_NORMAL,
+          lambda c: (c["num_incidentes"] == 0) & (c["incidentes_12m_num"] == 0),
+          "- **Registro de Incidentes:** No se reportaron incidentes generales ni específicos. Si bien esto es ideal, asegúrese de tener procesos para detectar y registrar cualquier incidente futuro."),
+    # --- Recomendación General Final ---
+    Regla("mejora_continua", SEVERIDAD_NORMAL,
+          lambda c: np.ones(c["n"], dtype=bool),
+          "- **Visión Estratégica y Mejora Continua:** La ciberseguridad debe ser vista como una inversión estratégica y un proceso de mejora continua. "
+          "Reevalúe periódicamente su perfil de riesgo, actualice sus defensas conforme evolucionan las amenazas y fomente una cultura de seguridad en toda la organización. "
+          "Considere realizar análisis de riesgos más profundos y pruebas de penetración para validar la efectividad de sus controles."),
+]
+
+ReglaCompilada = namedtuple("ReglaCompilada", ["id", "severidad", "condicion", "formatear"])
+
+
+def compilar_reglas(reglas):
+    """Prepara una vez cada plantilla: extrae sus campos y devuelve funciones (contexto, fila) -> texto."""
+    compiladas = []
+    for regla in reglas:
+        if callable(regla.plantilla):
+            formatear = regla.plantilla
+        else:
+            campos = sorted({campo for _, campo, _, _ in string.Formatter().parse(regla.plantilla) if campo})
+            if campos:
+                formatear = (lambda plantilla, campos: lambda c, i: plantilla.format_map({campo: c[campo][i] for campo in campos}))(regla.plantilla, campos)
+            else:
+                # Texto fijo: se comparte la misma cadena entre todas las empresas.
+                formatear = (lambda texto: lambda c, i: texto)(regla.plantilla)
+        compiladas.append(ReglaCompilada(regla.id, regla.severidad, regla.condicion, formatear))
+    return compiladas
+
+
+REGLAS_COMPILADAS = compilar_reglas(REGLAS)
+
+
+# --- CONTEXTO DEL LOTE ---
+def _es_vacio(valor):
+    return valor is None or (isinstance(valor, float) and valor != valor)
+
+
+def _valores(crudos, por_defecto):
+    # Celdas vacías (o claves ausentes) reemplazadas por el valor por defecto de los .get() del formulario.
+    return np.array([por_defecto if _es_vacio(valor) else valor for valor in crudos], dtype=object)
+
+
+def _a_numero(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _numeros(valores):
+    return np.fromiter((_a_numero(valor) for valor in valores), dtype=np.float64, count=len(valores))
+
+
+def _como_texto(valores):
+    # Enteros guardados como float (p. ej. por una celda vacía en la columna) se muestran sin ".0".
+    return np.array([int(v) if isinstance(v, float) and v.is_integer() else v for v in valores], dtype=object)
+
+
+def _resumen_incidentes(listas_incidentes):
+    """Número de incidentes, horas totales y tipos más frecuentes (moda) de cada empresa del lote."""
+    n = len(listas_incidentes)
+    num_incidentes = np.zeros(n, dtype=np.int64)
+    con_duracion = np.zeros(n, dtype=bool)
+    horas = np.zeros(n, dtype=np.float64)
+    tipos_mas_frecuentes = np.full(n, "", dtype=object)
+    for i, incidentes in enumerate(listas_incidentes):
+        if isinstance(incidentes, IncidentesCompactos):
+            # Forma compacta (app.py): conteos por tipo con bincount, sin recorrer los incidentes.
+            if len(incidentes):
+                num_incidentes[i] = len(incidentes)
+                con_duracion[i] = True
+                horas[i] = incidentes.horas_totales()
+                tipos_mas_frecuentes[i] = ", ".join(incidentes.tipos_mas_frecuentes())
+            continue
+        if not isinstance(incidentes, (list, tuple)) or not incidentes:
+            continue
+        num_incidentes[i] = len(incidentes)
+        total_horas = 0.0
+        conteo_tipos = Counter()
+        for incidente in incidentes:
+            if "Duración (h)" in incidente:
+                con_duracion[i] = True
+                duracion = incidente["Duración (h)"]
+                if isinstance(duracion, (int, float)) and not _es_vacio(duracion):
+                    total_horas += duracion
+            tipo = incidente.get("Incidente")
+            if isinstance(tipo, str):
+                conteo_tipos[tipo] += 1
+        horas[i] = total_horas
+        if conteo_tipos:
+            # Igual que Series.mode(): todos los tipos con el conteo máximo, en orden alfabético.
+            maximo = max(conteo_tipos.values())
+            tipos_mas_frecuentes[i] = ", ".join(sorted(tipo for tipo, conteo in conteo_tipos.items() if conteo == maximo))
+    return num_incidentes, con_duracion, horas, tipos_mas_frecuentes
+
+
+def _contexto(columna, n, roi):
+    """Arreglos que usan las condiciones y las plantillas. `columna(clave)` devuelve los n valores crudos."""
+    num_incidentes, con_duracion, horas, tipos_mas_frecuentes = _resumen_incidentes(columna(COL_INCIDENTES))
+    cumple_ley_1581 = columna("Cumple Ley 1581")
+    nivel_iso27001 = columna("Nivel ISO 27001")
+    incidentes_12m = _valores(columna("Incidentes Ciber (12m)"), 0)
+    return {
+        "n": n,
+        "roi_neto": np.asarray(roi[ROI_NETO], dtype=np.float64),
+        "ahorro_iso": np.asarray(roi[ROI_AHORRO_ISO], dtype=np.float64),
+        "costo_legal": np.asarray(roi[ROI_COSTO_LEGAL], dtype=np.float64),
+        "costo_reputacional": np.asarray(roi[ROI_IMPACTO_REPUTACIONAL], dtype=np.float64),
+        "facturacion": _numeros(_valores(columna(COL_FACTURACION), 0)),
+        "presupuesto": _numeros(_valores(columna(COL_PRESUPUESTO), 0.0)),
+        "roi_iso": _numeros(_valores(columna(COL_ROI_ISO), 0.0)),
+        "sanciones": _numeros(_valores(columna(COL_SANCIONES), 0)),
+        "riesgo_reputacional": _como_texto(_valores(columna(COL_RIESGO_REPUTACIONAL), "N/A")),
+        "cumple_ley_1581": _valores(cumple_ley_1581, None),
+        "cumple_ley_1581_texto": _valores(cumple_ley_1581, "N/A"),
+        "nivel_iso27001": _valores(nivel_iso27001, "No implementado"),
+        "nivel_iso27001_texto": _valores(nivel_iso27001, "N/A"),
+        "incidentes_12m": _como_texto(incidentes_12m),
+        "incidentes_12m_num": _numeros(incidentes_12m),
+        "num_incidentes": num_incidentes,
+        "incidentes_con_duracion": con_duracion,
+        "horas_incidentes": horas,
+        "tipos_mas_frecuentes": tipos_mas_frecuentes,
+    }
+
+
+# --- EVALUACIÓN ---
+def _evaluar(contexto, reglas):
+    resultados = [[] for _ in range(contexto["n"])]
+    for regla in reglas:
+        mascara = np.asarray(regla.condicion(contexto), dtype=bool)
+        # La plantilla solo se formatea para las empresas en las que la regla se cumple.
+        for i in np.flatnonzero(mascara).tolist():
+            resultados[i].append({"regla": regla.id, "severidad": regla.severidad, "texto": regla.formatear(contexto, i)})
+    return resultados
+
+
+def generar_recomendaciones_lote(df, roi=None, reglas=REGLAS_COMPILADAS):
+    """Recomendaciones para cada fila de `df` (columnas de form_data; "Detalles Incidentes" compacto o lista).
+
+    `roi` es el resultado de calcular_roi_lote(df) (se calcula si no se entrega). Devuelve, por empresa,
+    una lista de dicts {"regla", "severidad", "texto"} en el orden de REGLAS.
+    """
+    if roi is None:
+        from calculo_roi import calcular_roi_lote
+
+        roi = calcular_roi_lote(df)
+    n = len(df)
+    contexto = _contexto(lambda clave: df[clave].tolist() if clave in df else [None] * n, n, roi)
+    return _evaluar(contexto, reglas)
+
+
+def generar_recomendaciones_detalladas(form_data, roi_data, reglas=REGLAS_COMPILADAS):
+    """Recomendaciones de una sola empresa, con su regla y severidad."""
+    roi = {col: [roi_data[col]] for col in COMPONENTES_ROI}
+    return _evaluar(_contexto(lambda clave: [form_data.get(clave)], 1, roi), reglas)[0]
+
+
+def generar_recomendaciones(form_data, roi_data):
+    # Solo los textos, en el mismo formato que el CLI y versiones anteriores de la página.
+    return [recomendacion["texto"] for recomendacion in generar_recomendaciones_detalladas(form_data, roi_data)]
@@ -0,0 +1,584 @@
+"""Reportes descargables (HTML y XLSX) del ROI, generados en segundo plano.
+
+Un reporte cubre una empresa (la de pages/roi.py) o los envíos guardados de un portafolio
+(pages/portafolio.py). Los trabajos se encolan en un `GestorReportes` compartido por todas las
+sesiones del servidor: un grupo acotado de hilos los genera por bloques de empresas mientras los
+hilos de los scripts siguen atendiendo reruns, y cada trabajo publica su progreso para la página.
+
+Las figuras de incidentes se memorizan por contenido del resumen por tipo (`CacheFiguras`):
+empresas con los mismos incidentes y reportes sucesivos de la misma empresa reutilizan el mismo
+JSON de Plotly, y en un reporte HTML cada figura distinta se escribe una sola vez.
+El formato XLSX (solo tablas) requiere openpyxl.
+"""
+import hashlib
+import html
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from calculo_roi import COMPONENTES_ROI, ROI_NETO, calcular_roi_lote, calcular_roi_segmentado
+from incidentes import (
+    COL_INCIDENTES, RESUMEN_CONTEO, RESUMEN_PERCENTILES, RESUMEN_TIPO, RESUMEN_TOTAL, como_compactos,
+    figura_resumen_incidentes,
+)
+from recomendaciones import generar_recomendaciones_detalladas, generar_recomendaciones_lote
+
+logger = logging.getLogger(__name__)
+
+# Formato -> (tipo MIME, extensión).
+FORMATOS = {
+    "html": ("text/html", ".html"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx"),
+}
+# Hilos que generan reportes a la vez (el resto de los trabajos espera en la cola del grupo).
+MAX_TRABAJADORES = 2
+# Trabajos en cola o en generación admitidos a la vez; por encima se rechazan los nuevos.
+MAX_TRABAJOS_PENDIENTES = 8
+# Trabajos terminados cuyo archivo se conserva para descargarlo. Los archivos van a disco (un reporte
+# HTML con figuras pesa varios MB): en memoria solo queda la ruta.
+MAX_TRABAJOS_RETENIDOS = 16
+MAX_FIGURAS_EN_CACHE = 1024
+# Envíos leídos y puntuados juntos en un reporte de portafolio (el progreso avanza por bloques).
+TAMANO_BLOQUE_PORTAFOLIO = 500
+# Cada cuánto se refresca el progreso en la página mientras hay trabajos activos.
+INTERVALO_PROGRESO_S = 1.0
+# Clave de st.session_state con los IDs de los trabajos de la sesión.
+CLAVE_SESION = "trabajos_reporte"
+
+ESTADO_EN_COLA = "en_cola"
+ESTADO_GENERANDO = "generando"
+ESTADO_LISTO = "listo"
+ESTADO_ERROR = "error"
+ESTADO_CANCELADO = "cancelado"
+_ESTADOS_TERMINADOS = (ESTADO_LISTO, ESTADO_ERROR, ESTADO_CANCELADO)
+
+
+class ColaReportesLlena(RuntimeError):
+    """Hay MAX_TRABAJOS_PENDIENTES trabajos pendientes; se debe esperar a que terminen."""
+
+
+def formatos_disponibles():
+    # XLSX solo si openpyxl está instalado (ver requirements.txt).
+    return [formato for formato in FORMATOS if formato != "xlsx" or importlib.util.find_spec("openpyxl")]
+
+
+# --- CACHÉ DE FIGURAS ---
+class CacheFiguras:
+    """JSON de las figuras de incidentes por contenido del resumen, con descarte LRU (seguro entre hilos)."""
+
+    def __init__(self, max_entradas=MAX_FIGURAS_EN_CACHE):
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = OrderedDict()
+        self._candado = threading.Lock()
+
+    def obtener(self, clave, construir):
+        with self._candado:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave]
+        valor = construir()  # Fuera del candado: dos hilos pueden construir la misma figura, no se bloquean
+        with self._candado:
+            self.fallos += 1
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+
+def _clave_resumen(resumen):
+    huella = hashlib.sha1("\x1f".join(resumen[RESUMEN_TIPO]).encode("utf-8"))
+    for columna in [RESUMEN_CONTEO, RESUMEN_TOTAL, *RESUMEN_PERCENTILES.values()]:
+        huella.update(np.ascontiguousarray(resumen[columna], dtype=np.float64).tobytes())
+    return huella.hexdigest()[:20]
+
+
+def _json_figura(figura):
+    # (JSON de la figura sin su plantilla de estilo, JSON de la plantilla): la plantilla de Plotly
+    # ocupa ~80 % de cada figura y es la misma para todas, así que el reporte HTML la escribe una vez.
+    import plotly.io as pio  # Importación diferida: solo en los hilos que generan reportes HTML
+
+    diseno = dict(figura["layout"])
+    plantilla = diseno.pop("template", {})
+    return pio.to_json({**figura, "layout": diseno}, validate=False), json.dumps(plantilla, ensure_ascii=False)
+
+
+# --- TRABAJOS ---
+class TrabajoReporte:
+    """Estado de un reporte: lo actualiza el hilo trabajador y lo lee la página en cada refresco."""
+
+    def __init__(self, trabajo_id, descripcion, formato, nombre_base):
+        self.id = trabajo_id
+        self.descripcion = descripcion
+        self.formato = formato
+        self.nombre_archivo = nombre_base + FORMATOS[formato][1]
+        self.tipo_mime = FORMATOS[formato][0]
+        self.estado = ESTADO_EN_COLA
+        self.procesadas = 0
+        self.total = None
+        self.ruta_archivo = None
+        self.tamano_bytes = None
+        self.error = None
+        self.creado_en = time.time()
+        self.duracion_s = None
+        self._cancelado = threading.Event()
+
+    @property
+    def terminado(self):
+        return self.estado in _ESTADOS_TERMINADOS
+
+    @property
+    def progreso(self):
+        if self.estado == ESTADO_LISTO:
+            return 1.0
+        return min(self.procesadas / self.total, 1.0) if self.total else 0.0
+
+    def leer_contenido(self):
+        with open(self.ruta_archivo, "rb") as archivo:
+            return archivo.read()
+
+    def cancelar(self):
+        # Se respeta entre bloques: un bloque en curso termina antes de detenerse.
+        self._cancelado.set()
+
+    def __repr__(self):
+        return f"TrabajoReporte({self.id}, {self.descripcion!r}, {self.estado}, {self.procesadas}/{self.total})"
+
+
+class GestorReportes:
+    """Cola de reportes atendida por un grupo acotado de hilos, con progreso por trabajo."""
+
+    def __init__(self, max_trabajadores=MAX_TRABAJADORES, max_pendientes=MAX_TRABAJOS_PENDIENTES,
+                 max_retenidos=MAX_TRABAJOS_RETENIDOS, cache_figuras=None):
+        self.max_pendientes = max_pendientes
+        self.max_retenidos = max_retenidos
+        self.cache_figuras = cache_figuras if cache_figuras is not None else CacheFiguras()
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_trabajadores, thread_name_prefix="reportes")
+        self._trabajos = OrderedDict()
+        self._candado = threading.Lock()
+        self._ids = itertools.count(1)
+        self._directorio = tempfile.mkdtemp(prefix="reportes_roi_")
+        # Borra los archivos al cerrar el gestor o, si nunca se cierra, al terminar el proceso.
+        self._borrar_directorio = weakref.finalize(self, shutil.rmtree, self._directorio, ignore_errors=True)
+
+    # --- ENCOLADO ---
+    def encolar_empresa(self, form_data, formato, resultado=None):
+        """Reporte de una empresa. `resultado` es el de pages/roi.py (ROI, recomendaciones y figura ya calculados)."""
+        nombre = form_data.get("Nombre Empresa") or "Empresa"
+
+        def preparar():
+            return 1, iter([[self._fila_empresa(form_data, resultado, formato)]])
+
+        return self._encolar(f"Reporte de {nombre}", formato, f"reporte_roi_{_nombre_archivo(nombre)}", preparar)
+
+    def encolar_portafolio(self, almacen, formato, tamano_bloque=TAMANO_BLOQUE_PORTAFOLIO, **filtros):
+        """Reporte de los envíos guardados que cumplen los filtros de `AlmacenEnvios.iterar_envios`."""
+        filtros = {clave: valor for clave, valor in filtros.items() if valor is not None}
+        descripcion = "Reporte del portafolio" + (f" ({', '.join(map(str, filtros.values()))})" if filtros else "")
+
+        def preparar():
+            # El total y el último ID salen de la misma consulta: los envíos guardados durante el
+            # trabajo quedan fuera del reporte y el progreso no pasa del 100 %.
+            total, hasta_id = almacen.contar_envios_hasta_ultimo(**filtros)
+            return total, self._bloques_portafolio(almacen, filtros, hasta_id, tamano_bloque, formato)
+
+        return self._encolar(descripcion, formato, f"reporte_portafolio_{datetime.now():%Y%m%d_%H%M%S}", preparar)
+
+    def _encolar(self, descripcion, formato, nombre_base, preparar):
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de reporte no soportado: {formato}")
+        with self._candado:
+            pendientes = sum(not trabajo.terminado for trabajo in self._trabajos.values())
+            if pendientes >= self.max_pendientes:
+                raise ColaReportesLlena(
+                    f"Ya hay {pendientes} reportes en generación o en cola; intente de nuevo cuando terminen."
+                )
+            trabajo = TrabajoReporte(next(self._ids), descripcion, formato, nombre_base)
+            self._trabajos[trabajo.id] = trabajo
+        self._ejecutor.submit(self._generar, trabajo, preparar)
+        return trabajo
+
+    def obtener(self, trabajo_id):
+        """El trabajo con ese ID, o None si ya se descartó (ver MAX_TRABAJOS_RETENIDOS)."""
+        with self._candado:
+            return self._trabajos.get(trabajo_id)
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True, cancel_futures=True)
+        self._borrar_directorio()
+
+    # --- GENERACIÓN (hilos trabajadores) ---
+    def _generar(self, trabajo, preparar):
+        inicio = time.perf_counter()
+        try:
+            if trabajo._cancelado.is_set():
+                trabajo.estado = ESTADO_CANCELADO
+                return
+            trabajo.estado = ESTADO_GENERANDO
+            trabajo.total, bloques = preparar()
+            escritor = (_ReporteHtml if trabajo.formato == "html" else _ReporteXlsx)(trabajo.descripcion)
+            for filas in bloques:
+                if trabajo._cancelado.is_set():
+                    trabajo.estado = ESTADO_CANCELADO
+                    return
+                escritor.agregar(filas)
+                trabajo.procesadas += len(filas)
+            contenido = escritor.contenido()
+            trabajo.ruta_archivo = os.path.join(self._directorio, f"{trabajo.id}{FORMATOS[trabajo.formato][1]}")
+            with open(trabajo.ruta_archivo, "wb") as archivo:
+                archivo.write(contenido)
+            trabajo.tamano_bytes = len(contenido)
+            trabajo.estado = ESTADO_LISTO
+        except Exception as e:
+            logger.exception("Error al generar %r", trabajo)
+            trabajo.error = str(e)
+            trabajo.estado = ESTADO_ERROR
+        finally:
+            trabajo.duracion_s = time.perf_counter() - inicio
+            self._descartar_antiguos()
+
+    def _descartar_antiguos(self):
+        with self._candado:
+            terminados = [trabajo_id for trabajo_id, trabajo in self._trabajos.items() if trabajo.terminado]
+            sobrantes = terminados[:max(len(terminados) - self.max_retenidos, 0)]
+            descartados = [self._trabajos.pop(trabajo_id) for trabajo_id in sobrantes]
+        for trabajo in descartados:
+            if trabajo.ruta_archivo is not None:
+                try:
+                    os.remove(trabajo.ruta_archivo)
+                except FileNotFoundError:
+                    pass
+
+    def _fila_empresa(self, form_data, resultado, formato):
+        if resultado is None:
+            roi = calcular_roi_segmentado(form_data)
+            recomendaciones = generar_recomendaciones_detalladas(form_data, roi)
+            figura = None
+        else:
+            roi, recomendaciones, figura = resultado["roi"], resultado["recomendaciones"], resultado.get("figura_incidentes")
+        return self._fila(None, form_data, roi, recomendaciones, formato, figura)
+
+    def _bloques_portafolio(self, almacen, filtros, hasta_id, tamano_bloque, formato):
+        # Generador que se consume en el hilo trabajador: cada bloque se puntúa de forma vectorizada
+        # (igual que puntuar_lote.py) antes de pasar sus filas al escritor.
+        import pandas as pd
+
+        for bloque in almacen.iterar_envios(**filtros, tamano_bloque=tamano_bloque, hasta_id=hasta_id):
+            df = pd.DataFrame(
+                [{clave: valor for clave, valor in form_data.items() if clave != COL_INCIDENTES} for _, form_data in bloque],
+                index=range(len(bloque)),
+            )
+            df[COL_INCIDENTES] = pd.Series([form_data[COL_INCIDENTES] for _, form_data in bloque], index=df.index, dtype=object)
+            roi = calcular_roi_lote(df)
+            recomendaciones = generar_recomendaciones_lote(df, roi)
+            yield [
+                self._fila(envio_id, form_data, roi_envio, recomendaciones_envio, formato)
+                for (envio_id, form_data), roi_envio, recomendaciones_envio
+                in zip(bloque, roi.to_dict(orient="records"), recomendaciones)
+            ]
+
+    def _fila(self, envio_id, form_data, roi, recomendaciones, formato, figura=None):
+        incidentes = como_compactos(form_data.get(COL_INCIDENTES))
+        resumen = incidentes.resumen_por_tipo() if len(incidentes) else None
+        fila = {
+            "envio_id": envio_id,
+            "nombre": form_data.get("Nombre Empresa") or "",
+            "id_empresa": form_data.get("ID Empresa") or "",
+            "roi": roi,
+            "num_incidentes": len(incidentes),
+            "horas_incidentes": incidentes.horas_totales(),
+            "resumen": resumen,
+            "recomendaciones": recomendaciones,
+            "clave_figura": None,
+            "figura": None,
+        }
+        if resumen is not None and formato == "html":
+            fila["clave_figura"] = _clave_resumen(resumen)
+            fila["figura"] = self.cache_figuras.obtener(
+                fila["clave_figura"], lambda: _json_figura(figura if figura is not None else figura_resumen_incidentes(resumen))
+            )
+        return fila
+
+
+# --- ESCRITORES ---
+_VINETA = re.compile(r"^\s*-\s+")
+_NEGRITA = re.compile(r"\*\*(.+?)\*\*")
+
+
+def _nombre_archivo(texto):
+    return re.sub(r"[^\w-]+", "_", texto, flags=re.UNICODE).strip("_")[:60] or "empresa"
+
+
+def _titulo_empresa(fila):
+    partes = [f"#{fila['envio_id']}" if fila["envio_id"] is not None else "", fila["nombre"] or "Empresa sin nombre"]
+    if fila["id_empresa"]:
+        partes.append(f"({fila['id_empresa']})")
+    return " ".join(parte for parte in partes if parte)
+
+
+def _texto_plano(texto):
+    # Las recomendaciones usan markdown de Streamlit: viñetas ("- ", "  - ") y negritas.
+    return _VINETA.sub("", texto).replace("**", "")
+
+
+_ESTILO_HTML = """
+body { font-family: system-ui, sans-serif; margin: 2rem; color: #1f2328; }
+table { border-collapse: collapse; margin: 0.5rem 0 1rem; }
+th, td { border: 1px solid #d0d7de; padding: 0.25rem 0.6rem; text-align: left; }
+td.num { text-align: right; font-variant-numeric: tabular-nums; }
+details { border: 1px solid #d0d7de; border-radius: 6px; padding: 0.5rem 1rem; margin: 0.5rem 0; }
+summary { cursor: pointer; font-size: 1.1rem; }
+.figura { min-height: 450px; }
+li { margin: 0.3rem 0; }
+li.detalle { margin-left: 1.5rem; }
+li.error { color: #b42318; } li.exito { color: #067647; } li.advertencia { color: #9a6700; }
+.negativo { color: #b42318; }
+"""
+# Las figuras de una sección se dibujan al abrirla: un reporte de miles de empresas no crea miles de gráficos al cargar.
+_SCRIPT_HTML = """
+const FIGURAS = JSON.parse(document.getElementById("figuras-reporte").textContent);
+function dibujar(seccion) {
+  seccion.querySelectorAll("div[data-figura]:not(.dibujada)").forEach(function (div) {
+    const [plantilla, figura] = FIGURAS.figuras[div.dataset.figura];
+    figura.layout.template = FIGURAS.plantillas[plantilla];
+    Plotly.newPlot(div, figura.data, figura.layout, {responsive: true});
+    div.classList.add("dibujada");
+  });
+}
+document.querySelectorAll("details").forEach(function (seccion) {
+  if (seccion.open) dibujar(seccion);
+  seccion.addEventListener("toggle", function () { if (seccion.open) dibujar(seccion); });
+});
+"""
+
+
+class _ReporteHtml:
+    """Documento HTML autónomo: tabla resumen, una sección desplegable por empresa y las figuras únicas en JSON.
+
+    plotly.js va incrustado una sola vez por reporte (unos 4.5 MB, y solo si hay figuras), así que
+    los gráficos se ven sin conexión a internet.
+    """
+
+    def __init__(self, titulo):
+        self.titulo = titulo
+        self._filas_resumen = []
+        self._secciones = []
+        self._figuras = {}
+        self._plantillas = {}
+
+    def agregar(self, filas):
+        for fila in filas:
+            roi_neto = fila["roi"][ROI_NETO]
+            clase_roi = ' class="negativo"' if roi_neto < 0 else ""
+            titulo = html.escape(_titulo_empresa(fila))
+            self._filas_resumen.append(
+                f"<tr><td>{titulo}</td>"
+                + "".join(f'<td class="num">{fila["roi"][componente]:,.0f}</td>' for componente in COMPONENTES_ROI)
+                + f'<td class="num">{fila["num_incidentes"]:,}</td><td class="num">{fila["horas_incidentes"]:,.1f}</td></tr>'
+            )
+            partes = [
+                f'<details{" open" if len(self._secciones) == 0 else ""}><summary><strong>{titulo}</strong> · ROI neto '
+                f'<span{clase_roi}>${roi_neto:,.0f} COP</span></summary>',
+                "<table>" + "".join(
+                    f'<tr><th>{html.escape(componente)}</th><td class="num">${fila["roi"][componente]:,.0f} COP</td></tr>'
+                    for componente in COMPONENTES_ROI
+                ) + "</table>",
+            ]
+            if fila["resumen"] is not None:
+                json_figura, json_plantilla = fila["figura"]
+                indice_plantilla = self._plantillas.setdefault(json_plantilla, len(self._plantillas))
+                self._figuras[fila["clave_figura"]] = f"[{indice_plantilla},{json_figura}]"
+                partes.append(f'<div class="figura" data-figura="{fila["clave_figura"]}"></div>')
+                partes.append(self._tabla_incidentes(fila["resumen"]))
+            else:
+                partes.append("<p>No se registraron incidentes detallados.</p>")
+            partes.append("<h4>Recomendaciones</h4><ul>" + "".join(
+                self._recomendacion(recomendacion) for recomendacion in fila["recomendaciones"]
+            ) + "</ul></details>")
+            self._secciones.append("".join(partes))
+
+    @staticmethod
+    def _tabla_incidentes(resumen):
+        columnas = [RESUMEN_TIPO, RESUMEN_CONTEO, RESUMEN_TOTAL, *RESUMEN_PERCENTILES.values()]
+        filas = []
+        for i, tipo in enumerate(resumen[RESUMEN_TIPO]):
+            celdas = [f"<td>{html.escape(tipo)}</td>", f'<td class="num">{int(resumen[RESUMEN_CONTEO][i]):,}</td>']
+            celdas += [f'<td class="num">{float(resumen[columna][i]):,.1f}</td>' for columna in columnas[2:]]
+            filas.append("<tr>" + "".join(celdas) + "</tr>")
+        encabezado = "".join(f"<th>{html.escape(columna)}</th>" for columna in columnas)
+        return f"<table><tr>{encabezado}</tr>{''.join(filas)}</table>"
+
+    @staticmethod
+    def _recomendacion(recomendacion):
+        texto = recomendacion["texto"]
+        clases = [recomendacion["severidad"]] + (["detalle"] if texto.startswith("  ") else [])
+        contenido = _NEGRITA.sub(r"<strong>\1</strong>", html.escape(_VINETA.sub("", texto)))
+        return f'<li class="{" ".join(clases)}">{contenido}</li>'
+
+    def contenido(self):
+        from plotly.offline import get_plotlyjs
+
+        # Las figuras ya vienen en JSON: el objeto se arma por concatenación. "</" se escapa para que
+        # ningún texto de las figuras cierre la etiqueta <script>.
+        figuras = (
+            '{"plantillas":[' + ",".join(self._plantillas) + '],"figuras":{'
+            + ",".join(f'"{clave}":{figura}' for clave, figura in self._figuras.items()) + "}}"
+        ).replace("</", "<\\/")
+        encabezado = "".join(
+            f"<th>{html.escape(columna)}</th>"
+            for columna in ["Empresa", *COMPONENTES_ROI, "Incidentes", "Horas de Incidentes"]
+        )
+        documento = (
+            '<!DOCTYPE html><html lang="es"><head><meta charset="utf-8">'
+            f"<title>{html.escape(self.titulo)}</title><style>{_ESTILO_HTML}</style>"
+            + (f'<script type="text/javascript">{get_plotlyjs()}</script>' if self._figuras else "")
+            + "</head><body>"
+            f"<h1>📊 {html.escape(self.titulo)}</h1>"
+            f"<p>Generado el {datetime.now():%Y-%m-%d %H:%M}. Empresas: {len(self._secciones):,}. Valores en COP.</p>"
+            f"<h2>Resumen</h2><table><tr>{encabezado}</tr>{''.join(self._filas_resumen)}</table>"
+            f"<h2>Detalle por Empresa</h2>{''.join(self._secciones)}"
+            f'<script type="application/json" id="figuras-reporte">{figuras}</script>'
+            f"<script>{_SCRIPT_HTML}</script></body></html>"
+        )
+        return documento.encode("utf-8")
+
+
+class _ReporteXlsx:
+    """Libro con tres hojas (resumen de ROI, incidentes por tipo y recomendaciones), escrito por bloques."""
+
+    HOJA_RESUMEN = "Resumen ROI"
+    HOJA_INCIDENTES = "Incidentes por tipo"
+    HOJA_RECOMENDACIONES = "Recomendaciones"
+
+    def __init__(self, titulo):
+        import pandas as pd
+
+        self._pd = pd
+        self._salida = io.BytesIO()
+        self._libro = pd.ExcelWriter(self._salida, engine="openpyxl")
+        self._filas_escritas = {}
+
+    def _escribir(self, hoja, registros):
+        if not registros:
+            return
+        fila_inicial = self._filas_escritas.get(hoja, 0)
+        self._pd.DataFrame(registros).to_excel(
+            self._libro, sheet_name=hoja, startrow=fila_inicial, header=fila_inicial == 0, index=False
+        )
+        self._filas_escritas[hoja] = fila_inicial + len(registros) + (fila_inicial == 0)
+
+    def agregar(self, filas):
+        resumen, incidentes, recomendaciones = [], [], []
+        for fila in filas:
+            empresa = {"ID Envío": fila["envio_id"], "Nombre Empresa": fila["nombre"], "ID Empresa": fila["id_empresa"]}
+            resumen.append({
+                **empresa,
+                **{componente: float(fila["roi"][componente]) for componente in COMPONENTES_ROI},
+                "Incidentes": fila["num_incidentes"],
+                "Horas de Incidentes": fila["horas_incidentes"],
+            })
+            if fila["resumen"] is not None:
+                for i, tipo in enumerate(fila["resumen"][RESUMEN_TIPO]):
+                    incidentes.append({**empresa, RESUMEN_TIPO: tipo, **{
+                        columna: float(fila["resumen"][columna][i])
+                        for columna in [RESUMEN_CONTEO, RESUMEN_TOTAL, *RESUMEN_PERCENTILES.values()]
+                    }})
+            recomendaciones.extend(
+                {**empresa, "Severidad": recomendacion["severidad"], "Regla": recomendacion["regla"],
+                 "Recomendación": _texto_plano(recomendacion["texto"])}
+                for recomendacion in fila["recomendaciones"]
+            )
+        self._escribir(self.HOJA_RESUMEN, resumen)
+        self._escribir(self.HOJA_INCIDENTES, incidentes)
+        self._escribir(self.HOJA_RECOMENDACIONES, recomendaciones)
+
+    def contenido(self):
+        if not self._filas_escritas:
+            self._pd.DataFrame(columns=["Nombre Empresa", *COMPONENTES_ROI]).to_excel(
+                self._libro, sheet_name=self.HOJA_RESUMEN, index=False
+            )
+        self._libro.close()
+        return self._salida.getvalue()
+
+
+# --- GESTOR DEL PROCESO ---
+_gestor_por_defecto = None
+_candado_gestor = threading.Lock()
+
+
+def gestor_por_defecto():
+    # Instancia compartida por todas las sesiones del servidor (el módulo sobrevive a los reruns).
+    global _gestor_por_defecto
+    with _candado_gestor:
+        if _gestor_por_defecto is None:
+            _gestor_por_defecto = GestorReportes()
+        return _gestor_por_defecto
+
+
+# --- INTERFAZ ---
+def seguir_trabajo(trabajo):
+    """Agrega el trabajo a los de la sesión actual (los que muestra mostrar_trabajos_reporte)."""
+    import streamlit as st
+
+    st.session_state.setdefault(CLAVE_SESION, []).append(trabajo.id)
+
+
+def _tamano_legible(num_bytes):
+    return f"{num_bytes / 1e6:,.1f} MB" if num_bytes >= 1e6 else f"{max(num_bytes / 1e3, 1):,.0f} KB"
+
+
+def mostrar_trabajos_reporte():
+    """Progreso y descargas de los reportes de la sesión; mientras haya activos se refresca solo este bloque."""
+    import streamlit as st
+
+    gestor = gestor_por_defecto()
+
+    def trabajos_sesion():
+        return [trabajo for trabajo in map(gestor.obtener, st.session_state.get(CLAVE_SESION, [])) if trabajo is not None]
+
+    if not trabajos_sesion():
+        return
+    hay_activos = any(not trabajo.terminado for trabajo in trabajos_sesion())
+
+    @st.fragment(run_every=INTERVALO_PROGRESO_S if hay_activos else None)
+    def panel():
+        trabajos = trabajos_sesion()
+        for trabajo in reversed(trabajos):
+            if trabajo.estado == ESTADO_LISTO:
+                st.download_button(
+                    f"⬇️ {trabajo.descripcion} ({trabajo.formato.upper()}, {_tamano_legible(trabajo.tamano_bytes)})",
+                    trabajo.leer_contenido(), file_name=trabajo.nombre_archivo, mime=trabajo.tipo_mime,
+                    key=f"descargar_reporte_{trabajo.id}",
+                )
+            elif trabajo.estado == ESTADO_ERROR:
+                st.error(f"{trabajo.descripcion}: no se pudo generar ({trabajo.error}).")
+            elif trabajo.estado == ESTADO_CANCELADO:
+                st.caption(f"{trabajo.descripcion}: cancelado.")
+            else:
+                col_progreso, col_cancelar = st.columns([4, 1])
+                texto = "en cola" if trabajo.estado == ESTADO_EN_COLA else f"{trabajo.procesadas:,} de {trabajo.total or 0:,} empresas"
+                col_progreso.progress(trabajo.progreso, text=f"{trabajo.descripcion}: {texto}")
+                if col_cancelar.button("Cancelar", key=f"cancelar_reporte_{trabajo.id}"):
+                    trabajo.cancelar()
+        # Al terminar el último activo, un rerun completo deja de programar refrescos.
+        if hay_activos and all(trabajo.terminado for trabajo in trabajos):
+            st.rerun()
+
+    panel()
@@ -0,0 +1,43 @@
+"""Barrido de sensibilidad (what-if) del ROI neto sobre los factores del modelo y el presupuesto."""
+import numpy as np
+
+from calculo_roi import (
+    COL_CUMPLE_LEY_1581,
+    COL_FACTURACION,
+    COL_RIESGO_REPUTACIONAL,
+    COL_ROI_ISO,
+    COL_SANCIONES,
+    ROI_NETO,
+    calcular_roi_vectorizado,
+)
+
+
+def rejilla(minimo, maximo, puntos):
+    if puntos < 2 or minimo == maximo:
+        return np.array([float(minimo)])
+    return np.linspace(minimo, maximo, int(puntos))
+
+
+def barrido_sensibilidad(form_data, presupuestos_porc, factores_legales, factores_reputacionales):
+    """Evalúa el ROI neto en todas las combinaciones de los tres ejes en una sola pasada.
+
+    Devuelve un arreglo de forma (len(presupuestos_porc), len(factores_legales),
+    len(factores_reputacionales)); el resto de entradas se toma del formulario.
+    """
+    # Cada eje ocupa su propia dimensión y NumPy difunde el cálculo sobre el cubo completo.
+    presupuestos = np.asarray(presupuestos_porc, dtype=np.float64)[:, None, None]
+    factores_legales = np.asarray(factores_legales, dtype=np.float64)[None, :, None]
+    factores_reputacionales = np.asarray(factores_reputacionales, dtype=np.float64)[None, None, :]
+
+    resultados = calcular_roi_vectorizado(
+        facturacion=form_data.get(COL_FACTURACION, 0),
+        presupuesto_porc=presupuestos,
+        roi_iso_porc=form_data.get(COL_ROI_ISO, 0.0),
+        sanciones=form_data.get(COL_SANCIONES, 0),
+        riesgo_reputacional=form_data.get(COL_RIESGO_REPUTACIONAL, 1),
+        cumple_ley_1581=form_data.get(COL_CUMPLE_LEY_1581, "No aplica"),
+        factor_reputacional=factores_reputacionales,
+        factor_legal=factores_legales,
+    )
+    forma = (presupuestos.shape[0], factores_legales.shape[1], factores_reputacionales.shape[2])
+    return np.broadcast_to(resultados[ROI_NETO], forma)
@@ -0,0 +1,240 @@
+"""Servicio HTTP local (asyncio) de puntuación del ROI y las recomendaciones, sin pasar por Streamlit.
+
+Uso:
+    python servicio_puntuacion.py --puerto 8765
+
+Endpoints:
+    POST /puntuar  Cuerpo JSON con una empresa (objeto con las claves de form_data) o varias (lista).
+                   Responde con {"roi": {...}, "recomendaciones": [...]} por empresa (objeto o lista,
+                   igual que la entrada).
+    GET  /salud    Estado del servicio y estadísticas de los microlotes.
+
+Las solicitudes concurrentes se acumulan durante unos milisegundos y se puntúan juntas como un
+solo DataFrame (calcular_roi_lote + generar_recomendaciones_lote) en un hilo aparte, para que el
+bucle de eventos siga aceptando conexiones mientras se calcula.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import namedtuple
+from http import HTTPStatus
+
+from calculo_roi import calcular_roi_lote
+from recomendaciones import COL_INCIDENTES, generar_recomendaciones_lote
+
+logger = logging.getLogger(__name__)
+
+HOST_POR_DEFECTO = "127.0.0.1"
+PUERTO_POR_DEFECTO = 8765
+# Máximo de empresas que se puntúan juntas en un microlote.
+MAX_EMPRESAS_LOTE = 4096
+# Tiempo máximo que la primera solicitud de un microlote espera a que lleguen otras.
+ESPERA_MAX_MS = 5.0
+# Tamaño máximo del cuerpo de una solicitud.
+MAX_BYTES_CUERPO = 32 * 1024 * 1024
+
+_Pendiente = namedtuple("_Pendiente", ["registros", "futuro"])
+
+
+class ErrorSolicitud(ValueError):
+    """Cuerpo de solicitud inválido (se responde con 400)."""
+
+
+def validar_empresas(datos):
+    """Normaliza el cuerpo a (lista de form_data, si la entrada era una sola empresa)."""
+    una_sola = isinstance(datos, dict)
+    empresas = [datos] if una_sola else datos
+    if not isinstance(empresas, list) or not empresas:
+        raise ErrorSolicitud("Se esperaba un objeto (una empresa) o una lista no vacía de objetos.")
+    for i, empresa in enumerate(empresas):
+        if not isinstance(empresa, dict):
+            raise ErrorSolicitud(f"La empresa {i} no es un objeto JSON.")
+        incidentes = empresa.get(COL_INCIDENTES)
+        if incidentes is not None and not (isinstance(incidentes, list) and all(isinstance(x, dict) for x in incidentes)):
+            raise ErrorSolicitud(f"'{COL_INCIDENTES}' de la empresa {i} debe ser una lista de objetos.")
+    return empresas, una_sola
+
+
+def puntuar_registros(registros):
+    """ROI y recomendaciones (con regla y severidad) para una lista de form_data."""
+    import pandas as pd
+
+    df = pd.DataFrame(registros, index=range(len(registros)))
+    roi = calcular_roi_lote(df)
+    recomendaciones = generar_recomendaciones_lote(df, roi)
+    return [
+        {"roi": roi_empresa, "recomendaciones": recomendaciones_empresa}
+        for roi_empresa, recomendaciones_empresa in zip(roi.to_dict(orient="records"), recomendaciones)
+    ]
+
+
+class ServicioPuntuacion:
+    """Servidor HTTP/1.1 mínimo (con keep-alive) que agrupa las solicitudes concurrentes en microlotes."""
+
+    def __init__(self, max_empresas_lote=MAX_EMPRESAS_LOTE, espera_max_ms=ESPERA_MAX_MS):
+        self.max_empresas_lote = max_empresas_lote
+        self.espera_max_s = espera_max_ms / 1000.0
+        self.estadisticas = {"solicitudes": 0, "empresas": 0, "lotes": 0, "max_empresas_en_lote": 0}
+        self._cola = None
+        self._tarea_lotes = None
+        self._servidor = None
+
+    # --- MICROLOTES ---
+    async def puntuar(self, registros):
+        """Encola las empresas y espera su resultado, que se calcula junto con otras solicitudes."""
+        futuro = asyncio.get_running_loop().create_future()
+        await self._cola.put(_Pendiente(registros, futuro))
+        return await futuro
+
+    async def _recolectar_lote(self):
+        # Espera la primera solicitud y luego acumula las que lleguen antes del plazo o hasta el máximo.
+        lote = [await self._cola.get()]
+        total = len(lote[0].registros)
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + self.espera_max_s
+        while total < self.max_empresas_lote:
+            restante = limite - loop.time()
+            if restante <= 0:
+                break
+            try:
+                pendiente = await asyncio.wait_for(self._cola.get(), restante)
+            except asyncio.TimeoutError:
+                break
+            lote.append(pendiente)
+            total += len(pendiente.registros)
+        return lote, total
+
+    async def _bucle_lotes(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote, total = await self._recolectar_lote()
+            registros = [registro for pendiente in lote for registro in pendiente.registros]
+            try:
+                resultados = await loop.run_in_executor(None, puntuar_registros, registros)
+            except Exception as e:
+                logger.exception("Error al puntuar un microlote de %d empresa(s)", total)
+                for pendiente in lote:
+                    if not pendiente.futuro.done():
+                        pendiente.futuro.set_exception(e)
+                continue
+            self.estadisticas["lotes"] += 1
+            self.estadisticas["max_empresas_en_lote"] = max(self.estadisticas["max_empresas_en_lote"], total)
+            inicio = 0
+            for pendiente in lote:
+                fin = inicio + len(pendiente.registros)
+                if not pendiente.futuro.done():  # La conexión pudo cerrarse mientras tanto
+                    pendiente.futuro.set_result(resultados[inicio:fin])
+                inicio = fin
+
+    # --- HTTP ---
+    async def _despachar(self, metodo, ruta, cuerpo):
+        ruta = ruta.split("?", 1)[0]
+        if ruta == "/salud" and metodo == "GET":
+            return HTTPStatus.OK, {"estado": "ok", **self.estadisticas}
+        if ruta != "/puntuar":
+            return HTTPStatus.NOT_FOUND, {"error": f"Ruta no encontrada: {ruta}"}
+        if metodo != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use POST /puntuar"}
+        try:
+            empresas, una_sola = validar_empresas(json.loads(cuerpo))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"JSON inválido: {e}"}
+        except ErrorSolicitud as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        self.estadisticas["solicitudes"] += 1
+        self.estadisticas["empresas"] += len(empresas)
+        try:
+            resultados = await self.puntuar(empresas)
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"No se pudo puntuar la solicitud: {e}"}
+        return HTTPStatus.OK, resultados[0] if una_sola else resultados
+
+    async def _atender_conexion(self, reader, writer):
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                metodo, ruta, version = linea.decode("latin-1").split()
+                encabezados = {}
+                while (encabezado := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    nombre, _, valor = encabezado.decode("latin-1").partition(":")
+                    encabezados[nombre.strip().lower()] = valor.strip()
+                largo = int(encabezados.get("content-length", 0))
+                if largo > MAX_BYTES_CUERPO:
+                    estado, respuesta, mantener = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Cuerpo demasiado grande"}, False
+                else:
+                    cuerpo = await reader.readexactly(largo) if largo else b""
+                    estado, respuesta = await self._despachar(metodo, ruta, cuerpo)
+                    conexion = encabezados.get("connection", "").lower()
+                    mantener = conexion == "keep-alive" or (version == "HTTP/1.1" and conexion != "close")
+                contenido = json.dumps(respuesta, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {estado.value} {estado.phrase}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(contenido)}\r\n"
+                    f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n".encode("latin-1") + contenido
+                )
+                await writer.drain()
+                if not mantener:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # Conexión cortada o solicitud mal formada: se cierra sin respuesta
+        finally:
+            writer.close()
+
+    # --- CICLO DE VIDA ---
+    async def iniciar(self, host=HOST_POR_DEFECTO, puerto=PUERTO_POR_DEFECTO):
+        """Abre el puerto (0 = uno libre) y devuelve el puerto efectivo."""
+        self._cola = asyncio.Queue()
+        self._tarea_lotes = asyncio.create_task(self._bucle_lotes())
+        self._servidor = await asyncio.start_server(self._atender_conexion, host, puerto)
+        return self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        self._servidor.close()
+        await self._servidor.wait_closed()
+        self._tarea_lotes.cancel()
+        try:
+            await self._tarea_lotes
+        except asyncio.CancelledError:
+            pass
+
+
+async def _servir(host, puerto, max_empresas_lote, espera_max_ms):
+    servicio = ServicioPuntuacion(max_empresas_lote, espera_max_ms)
+    puerto = await servicio.iniciar(host, puerto)
+    print(f"Servicio de puntuación en http://{host}:{puerto} (POST /puntuar, GET /salud)", file=sys.stderr)
+    inicio = time.perf_counter()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servicio.detener()
+        logger.info("Servicio detenido tras %.0f s: %s", time.perf_counter() - inicio, servicio.estadisticas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de puntuación del ROI.")
+    parser.add_argument("--host", default=HOST_POR_DEFECTO)
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO)
+    parser.add_argument("--max-empresas-lote", type=int, default=MAX_EMPRESAS_LOTE,
+                        help="Máximo de empresas puntuadas juntas en un microlote.")
+    parser.add_argument("--espera-ms", type=float, default=ESPERA_MAX_MS,
+                        help="Tiempo máximo que se espera para completar un microlote.")
+    args = parser.parse_args(argv)
+    if args.max_empresas_lote <= 0:
+        parser.error("--max-empresas-lote debe ser mayor que 0")
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_servir(args.host, args.puerto, args.max_empresas_lote, args.espera_ms))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
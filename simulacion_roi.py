@@ -0,0 +1,90 @@
+"""Simulación Monte Carlo del ROI neto a partir de entradas inciertas del formulario."""
+import numpy as np
+
+from calculo_roi import (
+    COL_CUMPLE_LEY_1581,
+    COL_FACTURACION,
+    COL_PRESUPUESTO,
+    COL_RIESGO_REPUTACIONAL,
+    COL_ROI_ISO,
+    COL_SANCIONES,
+    ROI_NETO,
+    calcular_roi_vectorizado,
+)
+
+# Cada entrada incierta se describe con tres puntos (mínimo, más probable, máximo):
+# - "Fija": siempre el valor más probable.
+# - "Uniforme": cualquier valor entre mínimo y máximo con igual probabilidad.
+# - "Triangular": concentrada en el valor más probable, acotada por mínimo y máximo.
+# - "Normal": media en el valor más probable, desviación (máximo - mínimo) / 6, recortada al rango.
+DISTRIBUCIONES = ["Fija", "Uniforme", "Triangular", "Normal"]
+
+# Entradas que se pueden simular y su rango válido (los mismos límites de los widgets de app.py).
+VARIABLES_INCIERTAS = {
+    COL_ROI_ISO: (0.0, 500.0),
+    COL_RIESGO_REPUTACIONAL: (1.0, 5.0),
+    COL_SANCIONES: (0.0, np.inf),
+}
+
+PERCENTILES_REPORTADOS = (5, 50, 95)
+NUM_SIMULACIONES_POR_DEFECTO = 200000
+
+
+def muestrear(rng, distribucion, minimo, mas_probable, maximo, n):
+    if distribucion == "Fija" or minimo == maximo:
+        return np.full(n, float(mas_probable))
+    if not minimo <= mas_probable <= maximo:
+        raise ValueError(f"Se requiere mínimo <= más probable <= máximo (recibido {minimo}, {mas_probable}, {maximo})")
+    if distribucion == "Uniforme":
+        return rng.uniform(minimo, maximo, n)
+    if distribucion == "Triangular":
+        return rng.triangular(minimo, mas_probable, maximo, n)
+    if distribucion == "Normal":
+        return np.clip(rng.normal(mas_probable, (maximo - minimo) / 6.0, n), minimo, maximo)
+    raise ValueError(f"Distribución desconocida: '{distribucion}'. Opciones: {', '.join(DISTRIBUCIONES)}")
+
+
+def simular_roi_neto(form_data, distribuciones, n_simulaciones=NUM_SIMULACIONES_POR_DEFECTO, semilla=None):
+    """Devuelve `n_simulaciones` valores del ROI neto.
+
+    `distribuciones` asocia una clave de VARIABLES_INCIERTAS con una tupla
+    (distribución, mínimo, más probable, máximo). Las entradas que no aparecen se toman
+    fijas del formulario.
+    """
+    rng = np.random.default_rng(semilla)
+    entradas = {
+        COL_ROI_ISO: form_data.get(COL_ROI_ISO, 0.0),
+        COL_RIESGO_REPUTACIONAL: form_data.get(COL_RIESGO_REPUTACIONAL, 1),
+        COL_SANCIONES: form_data.get(COL_SANCIONES, 0),
+    }
+    for columna, (distribucion, minimo, mas_probable, maximo) in distribuciones.items():
+        if columna not in VARIABLES_INCIERTAS:
+            raise ValueError(f"'{columna}' no es una entrada simulable")
+        limite_inferior, limite_superior = VARIABLES_INCIERTAS[columna]
+        minimo, maximo = max(minimo, limite_inferior), min(maximo, limite_superior)
+        mas_probable = min(max(mas_probable, minimo), maximo)
+        entradas[columna] = muestrear(rng, distribucion, minimo, mas_probable, maximo, n_simulaciones)
+
+    # Las entradas fijas se pasan como escalares y NumPy las difunde sobre las muestras.
+    resultados = calcular_roi_vectorizado(
+        facturacion=form_data.get(COL_FACTURACION, 0),
+        presupuesto_porc=form_data.get(COL_PRESUPUESTO, 0.0),
+        roi_iso_porc=entradas[COL_ROI_ISO],
+        sanciones=entradas[COL_SANCIONES],
+        riesgo_reputacional=entradas[COL_RIESGO_REPUTACIONAL],
+        cumple_ley_1581=form_data.get(COL_CUMPLE_LEY_1581, "No aplica"),
+    )
+    return np.broadcast_to(resultados[ROI_NETO], (n_simulaciones,))
+
+
+def resumir_simulacion(roi_neto, num_barras=50):
+    # Resumen compacto (percentiles e histograma) para no enviar todas las muestras al navegador.
+    percentiles = np.percentile(roi_neto, PERCENTILES_REPORTADOS)
+    conteos, bordes = np.histogram(roi_neto, bins=num_barras)
+    return {
+        "percentiles": {f"P{p}": float(v) for p, v in zip(PERCENTILES_REPORTADOS, percentiles)},
+        "media": float(np.mean(roi_neto)),
+        "probabilidad_negativo": float(np.mean(roi_neto < 0)),
+        "histograma_conteos": conteos,
+        "histograma_bordes": bordes,
+    }
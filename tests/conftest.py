@@ -0,0 +1,42 @@
+"""Datos compartidos por las pruebas: portafolio sintético con semilla fija y casos borde."""
+import os
+import random
+import sys
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repositorio (sin paquete instalable).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.benchmark_roi import generar_portafolio, materializar_form_data  # noqa: E402
+
+SEMILLA = 7
+NUM_EMPRESAS = 2000
+
+
+def _casos_borde(registros, semilla):
+    # Valores vacíos, no numéricos y claves ausentes, como llegan de un CSV o de envíos antiguos.
+    rng = random.Random(semilla)
+    for registro in registros:
+        if rng.random() < 0.2:
+            registro["Detalles Incidentes"] = []
+        if rng.random() < 0.05:
+            registro["Detalles Incidentes"] = [{"Incidente": "Otro"}, {"Incidente": "Ransomware"}]
+        if rng.random() < 0.1:
+            registro["Incidentes Ciber (12m)"] = 0
+        if rng.random() < 0.1:
+            registro["Facturación Anual (COP)"] = 0
+        if rng.random() < 0.05:
+            registro["Sanciones Regulatorias (COP, 3a)"] = "N/A"
+        # Una clave ausente y una celda vacía del lote son lo mismo: ambas toman el valor por defecto.
+        for clave in ("Nivel ISO 27001", "Cumple Ley 1581", "ROI Estimado ISO 27001 (%)", "Sanciones Regulatorias (COP, 3a)",
+                      "Riesgo Reputacional (1-5)"):
+            if rng.random() < 0.03:
+                del registro[clave]
+    return registros
+
+
+@pytest.fixture
+def registros():
+    """Lista de form_data con "Detalles Incidentes" como lista de dicts (formato anterior a IncidentesCompactos)."""
+    return _casos_borde(materializar_form_data(generar_portafolio(NUM_EMPRESAS, SEMILLA), SEMILLA), SEMILLA)
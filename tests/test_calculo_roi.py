@@ -0,0 +1,67 @@
+"""El cálculo por lote debe dar exactamente lo mismo que el cálculo por empresa."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculo_roi import COMPONENTES_ROI, ROI_NETO, calcular_roi_lote, calcular_roi_segmentado, calcular_roi_vectorizado
+
+
+def test_lote_igual_a_escalar(registros):
+    lote = calcular_roi_lote(pd.DataFrame(registros))
+    esperado = pd.DataFrame([calcular_roi_segmentado(form_data) for form_data in registros], columns=COMPONENTES_ROI)
+    pd.testing.assert_frame_equal(lote, esperado, check_exact=True, check_dtype=False)
+
+
+def test_lote_sin_columnas_usa_valores_por_defecto():
+    lote = calcular_roi_lote(pd.DataFrame(index=range(3)))
+    esperado = calcular_roi_segmentado({})
+    for columna in COMPONENTES_ROI:
+        assert lote[columna].tolist() == [esperado[columna]] * 3
+
+
+@pytest.mark.parametrize("sanciones", [None, "N/A", float("nan")])
+def test_sanciones_no_numericas_no_penalizan(sanciones):
+    form_data = {"Facturación Anual (COP)": 1e9, "Presupuesto Ciberseguridad (%)": 5.0, "ROI Estimado ISO 27001 (%)": 50.0,
+                 "Sanciones Regulatorias (COP, 3a)": sanciones, "Cumple Ley 1581": "No", "Riesgo Reputacional (1-5)": 2}
+    lote = calcular_roi_lote(pd.DataFrame([form_data]))
+    assert lote[ROI_NETO].iloc[0] == 1e9 * 0.05 * 0.5 - 2e7
+
+
+# Valores que no son números de Python: texto numérico, escalares de NumPy y bool.
+VALORES_MIXTOS = ["1000", "3", " 2 ", np.int64(3), np.float32(2.5), np.float64(1000.0), True, 4, 2.0, "texto"]
+
+
+def _form_data_mixto(sanciones, riesgo):
+    return {"Facturación Anual (COP)": 1e9, "Presupuesto Ciberseguridad (%)": 5.0, "ROI Estimado ISO 27001 (%)": 50.0,
+            "Sanciones Regulatorias (COP, 3a)": sanciones, "Cumple Ley 1581": "No", "Riesgo Reputacional (1-5)": riesgo}
+
+
+@pytest.mark.parametrize("columna", ["sanciones", "riesgo"])
+def test_valores_mixtos_igual_a_escalar(columna):
+    # Todos en la misma columna (de objetos) y cada uno solo, con el tipo que pandas infiera.
+    registros = [_form_data_mixto(**{"sanciones": 1000, "riesgo": 2, columna: valor}) for valor in VALORES_MIXTOS]
+    esperado = [calcular_roi_segmentado(form_data)[ROI_NETO] for form_data in registros]
+    assert calcular_roi_lote(pd.DataFrame(registros))[ROI_NETO].tolist() == esperado
+    for form_data, roi_neto in zip(registros, esperado):
+        assert calcular_roi_lote(pd.DataFrame([form_data]))[ROI_NETO].iloc[0] == roi_neto
+
+
+@pytest.mark.parametrize("vacio", [None, float("nan"), np.float32("nan")])
+def test_valores_vacios_toman_el_valor_por_defecto(vacio):
+    form_data = _form_data_mixto(vacio, vacio)
+    esperado = calcular_roi_segmentado({clave: valor for clave, valor in form_data.items() if valor is not vacio})
+    assert calcular_roi_segmentado(form_data) == esperado
+    assert calcular_roi_lote(pd.DataFrame([form_data]))[ROI_NETO].iloc[0] == esperado[ROI_NETO]
+
+
+def test_texto_numerico_no_penaliza_y_numpy_si():
+    base = calcular_roi_segmentado(_form_data_mixto(0, 0))[ROI_NETO]
+    assert calcular_roi_segmentado(_form_data_mixto("1000", "3"))[ROI_NETO] == base
+    assert calcular_roi_segmentado(_form_data_mixto(np.int64(1000), np.int64(3)))[ROI_NETO] == base - 500 - 3e7
+
+
+def test_vectorizado_difunde_rejillas():
+    resultado = calcular_roi_vectorizado(1e9, 5.0, 100.0, 0, np.arange(1, 6)[:, None], "No aplica",
+                                         factor_reputacional=np.array([1e6, 1e7]))
+    assert resultado[ROI_NETO].shape == (5, 2)
+    assert resultado[ROI_NETO][0, 1] == 1e9 * 0.05 * 1.0 - 1e7
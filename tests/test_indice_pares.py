@@ -0,0 +1,67 @@
+"""Índice de pares: empates en el percentil, exclusión del envío propio y vecinos exactos."""
+import numpy as np
+import pytest
+
+from indice_pares import NIVELES_ISO27001, PESOS, TAMANOS_EMPRESA, IndicePares, _log_empleados, _ordinal
+
+FORM_DATA = {
+    "Servicio Principal IT": "Cloud", "Tamaño Empresa": TAMANOS_EMPRESA[1], "País Sede": "Colombia",
+    "Nivel ISO 27001": NIVELES_ISO27001[0], "Número Empleados": 30, "Presupuesto Ciberseguridad (%)": 3.3,
+}
+
+
+def _indice_iguales(n, presupuesto=3.3, horas=12.7, roi_neto=1.5e8):
+    # n pares idénticos a FORM_DATA.
+    indice = IndicePares()
+    indice.agregar(
+        list(range(1, n + 1)), ["Cloud"] * n, [TAMANOS_EMPRESA[1]] * n, ["Colombia"] * n, [NIVELES_ISO27001[0]] * n,
+        [30] * n, [roi_neto] * n, [horas] * n, [presupuesto] * n,
+    )
+    return indice
+
+
+def test_empates_quedan_en_el_percentil_50():
+    comparacion = _indice_iguales(40).comparar(FORM_DATA, roi_neto=1.5e8, horas_incidentes=12.7)
+    assert comparacion["pares"] == 40
+    for nombre, valor in (("presupuesto", 3.3), ("horas_incidentes", 12.7), ("roi_neto", 1.5e8)):
+        metrica = comparacion["metricas"][nombre]
+        assert metrica["percentil"] == 50.0
+        assert metrica["p25"] == metrica["mediana"] == metrica["p75"] == valor
+
+
+def test_excluye_el_envio_propio():
+    indice = _indice_iguales(3)
+    filas, _ = indice.buscar("Cloud", TAMANOS_EMPRESA[1], "Colombia", NIVELES_ISO27001[0], 30, excluir_envio=2)
+    assert sorted(indice._envio_id.vista()[filas].tolist()) == [1, 3]
+    assert indice.comparar(FORM_DATA, 0, 0, excluir_envio=1)["pares"] == 2
+
+
+def test_sin_pares_del_sector():
+    assert _indice_iguales(5).comparar({**FORM_DATA, "Servicio Principal IT": "Fintech"}, 0, 0) is None
+
+
+@pytest.mark.parametrize("k", [1, 10, 50])
+def test_vecinos_iguales_a_recorrido_completo(k):
+    rng = np.random.default_rng(3)
+    n = 5000
+    tamanos = rng.choice(TAMANOS_EMPRESA, n).tolist()
+    paises = rng.choice(["Colombia", "México", "Perú"], n).tolist()
+    niveles = rng.choice(NIVELES_ISO27001, n).tolist()
+    empleados = rng.integers(1, 3000, n).tolist()
+    indice = IndicePares()
+    # En dos bloques para que las celdas tengan elementos fusionados y pendientes.
+    for parte in (slice(0, 4000), slice(4000, n)):
+        indice.agregar(list(range(n))[parte], ["Cloud"] * n, tamanos[parte], paises[parte], niveles[parte],
+                       empleados[parte], [0.0] * n, [0.0] * n, [0.0] * n)
+
+    for consulta in range(20):
+        tamano, pais, nivel, num_empleados = tamanos[consulta], "México", niveles[-consulta], 17 * consulta + 1
+        _, distancias = indice.buscar("Cloud", tamano, pais, nivel, num_empleados, k)
+        exactas = np.sort([
+            PESOS["tamano"] * (_ordinal(t, TAMANOS_EMPRESA) - _ordinal(tamano, TAMANOS_EMPRESA)) ** 2
+            + PESOS["pais"] * (p != pais)
+            + PESOS["nivel_iso"] * (_ordinal(v, NIVELES_ISO27001) - _ordinal(nivel, NIVELES_ISO27001)) ** 2
+            + PESOS["empleados"] * (float(np.float32(_log_empleados(e))) - _log_empleados(num_empleados)) ** 2
+            for t, p, v, e in zip(tamanos, paises, niveles, empleados)
+        ])[:k]
+        np.testing.assert_allclose(distancias, exactas)
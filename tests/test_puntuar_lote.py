@@ -0,0 +1,35 @@
+"""La salida del CLI de puntuación masiva existe y tiene el esquema completo aunque no haya filas."""
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from puntuar_lote import ESQUEMA_SALIDA, main
+
+
+@pytest.mark.parametrize("contenido", ["", "ID Empresa,Facturación Anual (COP)\n"], ids=["vacio", "solo_encabezado"])
+@pytest.mark.parametrize("formato", ["csv", "parquet"])
+def test_entrada_sin_filas_escribe_salida_vacia(tmp_path, contenido, formato):
+    entrada = tmp_path / "empresas.csv"
+    entrada.write_text(contenido, encoding="utf-8")
+    salida = tmp_path / f"resultados.{formato}"
+
+    assert main([str(entrada), str(salida)]) == 0
+    if formato == "csv":
+        resultado = pd.read_csv(salida)
+        assert list(resultado.columns) == ESQUEMA_SALIDA.names
+        assert resultado.empty
+    else:
+        tabla = pq.read_table(salida)
+        assert tabla.schema.equals(ESQUEMA_SALIDA)
+        assert tabla.num_rows == 0
+
+
+def test_puntua_por_bloques(tmp_path, registros):
+    entrada = tmp_path / "empresas.csv"
+    datos = pd.DataFrame(registros[:250]).drop(columns="Detalles Incidentes")
+    datos.to_csv(entrada, index=False)
+    salida = tmp_path / "resultados.parquet"
+
+    assert main([str(entrada), str(salida), "--tamano-bloque", "100"]) == 0
+    resultado = pq.read_table(salida).to_pandas()
+    assert resultado["ID Empresa"].tolist() == datos["ID Empresa"].tolist()
@@ -0,0 +1,193 @@
+"""Las reglas declarativas deben producir los mismos textos que la versión anterior, por empresa y por lote."""
+import re
+
+import pandas as pd
+import pytest
+
+from calculo_roi import calcular_roi_lote, calcular_roi_segmentado
+from incidentes import como_compactos
+from recomendaciones import (
+    REGLAS,
+    SEVERIDAD_ERROR,
+    SEVERIDAD_EXITO,
+    generar_recomendaciones,
+    generar_recomendaciones_detalladas,
+    generar_recomendaciones_lote,
+)
+
+
+# Versión anterior a la tabla REGLAS, conservada tal cual como referencia de los textos esperados.
+def _recomendaciones_referencia(form_data, roi_data, df_incidentes=None):
+    # df_incidentes permite reutilizar el DataFrame de "Detalles Incidentes" si ya fue construido.
+    recomendaciones = []
+    # --- Análisis del ROI Neto ---
+    if roi_data["ROI Neto Estimado Ciberseguridad"] < 0:
+        recomendaciones.append(
+            "**🔴 ROI Neto Negativo:** Su Retorno de Inversión Neto Estimado en Ciberseguridad es negativo. "
+            "Es crucial identificar áreas de mejora para optimizar sus inversiones y reducir pérdidas potenciales."
+        )
+        costo_legal = roi_data["Estimación Costo Incumplimiento Legal"]
+        costo_reputacional = roi_data["Estimación Impacto Reputacional"]
+
+        if costo_reputacional >= costo_legal and costo_reputacional > 0 : # Considerar si es el mayor o igual
+            recomendaciones.append(
+                f"  - El **Impacto Reputacional Estimado** (${costo_reputacional:,.0f} COP) es un factor muy significativo. "
+                f"Su actual percepción de Riesgo Reputacional es de **{form_data.get('Riesgo Reputacional (1-5)', 'N/A')}/5**. " #
+                "Fortalecer la postura de seguridad, mejorar la comunicación en crisis y construir confianza son claves. "
+                "El factor multiplicador actual en la fórmula es de 10,000,000 por cada punto de riesgo; considere si este factor refleja adecuadamente su contexto."
+            )
+        elif costo_legal > 0:
+            recomendaciones.append(
+                f"  - El **Costo Estimado por Incumplimiento Legal** (${costo_legal:,.0f} COP) está afectando su ROI. "
+                f"Dado que el estado de cumplimiento de la Ley 1581 es '{form_data.get('Cumple Ley 1581', 'N/A')}' y se reportaron sanciones, " #
+                "es fundamental priorizar la adecuación a esta normativa para evitar o reducir sanciones futuras."
+            )
+        
+        if roi_data["ROI Financiero (Ahorro ISO)"] <= 0: # Si es cero o negativo (aunque la fórmula actual no lo hace negativo)
+            msg_ahorro_iso = "- El **Ahorro Estimado por ISO 27001 es bajo o nulo.** "
+            if form_data.get("Facturación Anual (COP)", 0) == 0: #
+                msg_ahorro_iso += "Esto se debe a que la 'Facturación Anual' reportada es cero, y este cálculo depende de ella. "
+            if form_data.get("Presupuesto Ciberseguridad (%)", 0.0) == 0: #
+                msg_ahorro_iso += "El 'Presupuesto de Ciberseguridad (%)' es cero. Considere asignar un presupuesto. "
+            if form_data.get("ROI Estimado ISO 27001 (%)", 0.0) == 0: #
+                msg_ahorro_iso += "El 'ROI Estimado para ISO 27001 (%)' es cero. Si espera beneficios, reevalúe esta estimación. "
+            recomendaciones.append(msg_ahorro_iso.strip())
+
+    else: # ROI Neto Positivo o Cero
+        recomendaciones.append(
+            "**🟢 ROI Neto Positivo o Cero:** ¡Excelente! Su Retorno de Inversión Neto Estimado en Ciberseguridad es positivo o cero. "
+            "Esto sugiere que sus estrategias e inversiones actuales están, en general, bien orientadas."
+        )
+        if roi_data["ROI Financiero (Ahorro ISO)"] > 0:
+             recomendaciones.append(
+                f"  - El **Ahorro Estimado por ISO 27001** (${roi_data['ROI Financiero (Ahorro ISO)']:,.0f} COP) es un contribuyente positivo importante. "
+                "Continuar y optimizar la adhesión a estándares como ISO 27001 es valioso."
+            )
+        elif form_data.get("Nivel ISO 27001", "No implementado") != "Certificado": #
+            recomendaciones.append(
+                f"  - Aunque el ROI es positivo, su nivel actual de implementación de ISO 27001 es '{form_data.get('Nivel ISO 27001', 'N/A')}'. " #
+                "Avanzar hacia la certificación podría desbloquear aún más beneficios y ahorros."
+            )
+
+
+    # --- Análisis de Cumplimiento Legal Detallado ---
+    if form_data.get("Cumple Ley 1581") in ["No", "Parcialmente"]: #
+        recomendaciones.append(
+            f"- **Atención al Cumplimiento Normativo (Ley 1581):** Ha indicado un cumplimiento '{form_data.get('Cumple Ley 1581')}' con la Ley 1581. " #
+            "Es prioritario adecuar sus procesos para garantizar la protección de datos personales. Esto no solo evita sanciones "
+            f"(${form_data.get('Sanciones Regulatorias (COP, 3a)', 0):,.0f} COP reportadas en los últimos 3 años), sino que también fortalece la confianza." #
+        )
+    elif form_data.get("Cumple Ley 1581") == "Sí": #
+        recomendaciones.append(
+            "- **Fortaleza en Cumplimiento Normativo:** ¡Muy bien por cumplir con la Ley 1581! Mantener este estándar es clave."
+        )
+
+    # --- Análisis basado en Incidentes ---
+    incidentes = form_data.get("Detalles Incidentes", []) #
+    if incidentes:
+        import pandas as pd  # Importación diferida: la página ya entrega el DataFrame desde su caché
+
+        df_incidentes_rec = df_incidentes if df_incidentes is not None else pd.DataFrame(incidentes)
+        if not df_incidentes_rec.empty and "Duración (h)" in df_incidentes_rec:
+            total_horas_perdidas = df_incidentes_rec["Duración (h)"].sum()
+            num_incidentes_detallados = len(df_incidentes_rec)
+            recomendaciones.append(
+                f"- **Análisis de Incidentes Detallados:** Se reportaron **{num_incidentes_detallados} incidente(s) específicos**, sumando un total de **{total_horas_perdidas:,.1f} horas de duración**. "
+                "Cada hora de inactividad o recuperación tiene costos asociados (directos e indirectos). Reducir la frecuencia y la duración de los incidentes es una vía clara para mejorar el ROI. "
+                "Analice las causas raíz de estos incidentes para fortalecer sus defensas."
+            )
+            if "Incidente" in df_incidentes_rec: #
+                try:
+                    tipos_comunes = df_incidentes_rec["Incidente"].mode() #
+                    if not tipos_comunes.empty:
+                        recomendaciones.append(
+                            f"  - **Tipos de incidentes más frecuentes (detallados):** {', '.join(tipos_comunes)}. Considere enfocar esfuerzos preventivos y de mitigación en estas áreas."
+                        )
+                except Exception: # En caso de que .mode() falle por algún tipo de dato inesperado.
+                    pass 
+    
+    # Considerar el número general de incidentes si no hay detalles
+    if not incidentes and form_data.get("Incidentes Ciber (12m)", 0) > 0: #
+         recomendaciones.append(
+            f"- **Registro General de Incidentes:** Aunque no se detallaron incidentes específicos en esta ocasión, se reportaron **{form_data.get('Incidentes Ciber (12m)', 0)} incidentes en los últimos 12 meses**. " #
+            "Es importante llevar un registro detallado de cada uno (tipo, impacto, duración, causa raíz, lecciones aprendidas) para identificar patrones y áreas de mejora."
+        )
+    elif not incidentes and form_data.get("Incidentes Ciber (12m)", 0) == 0: #
+        recomendaciones.append(
+            "- **Registro de Incidentes:** No se reportaron incidentes generales ni específicos. Si bien esto es ideal, asegúrese de tener procesos para detectar y registrar cualquier incidente futuro."
+            )
+
+
+    # --- Recomendación General Final ---
+    recomendaciones.append(
+        "- **Visión Estratégica y Mejora Continua:** La ciberseguridad debe ser vista como una inversión estratégica y un proceso de mejora continua. "
+        "Reevalúe periódicamente su perfil de riesgo, actualice sus defensas conforme evolucionan las amenazas y fomente una cultura de seguridad en toda la organización. "
+        "Considere realizar análisis de riesgos más profundos y pruebas de penetración para validar la efectividad de sus controles."
+    )
+    return recomendaciones
+
+
+def _comparables(registros):
+    # La versión anterior fallaba con sanciones no numéricas (ValueError al formatear); se prueban aparte.
+    return [form_data for form_data in registros
+            if isinstance(form_data.get("Sanciones Regulatorias (COP, 3a)", 0), (int, float))]
+
+
+def _con_incidentes_compactos(registros):
+    # Como los guarda app.py (IncidentesCompactos); solo aplica a incidentes con duración (el editor siempre la tiene).
+    return [
+        {**form_data, "Detalles Incidentes": como_compactos(form_data["Detalles Incidentes"])}
+        if all("Duración (h)" in incidente for incidente in form_data["Detalles Incidentes"]) else form_data
+        for form_data in registros
+    ]
+
+
+def test_escalar_igual_a_referencia(registros):
+    for form_data in _comparables(registros):
+        roi = calcular_roi_segmentado(form_data)
+        assert generar_recomendaciones(form_data, roi) == _recomendaciones_referencia(form_data, roi)
+
+
+def test_lote_igual_a_referencia(registros):
+    registros = _comparables(registros)
+    df = pd.DataFrame(registros)
+    lote = generar_recomendaciones_lote(df, calcular_roi_lote(df))
+    for form_data, recomendaciones in zip(registros, lote):
+        esperado = _recomendaciones_referencia(form_data, calcular_roi_segmentado(form_data))
+        assert [recomendacion["texto"] for recomendacion in recomendaciones] == esperado
+
+
+def test_incidentes_compactos_igual_a_referencia(registros):
+    registros = _comparables(registros)
+    compactos = _con_incidentes_compactos(registros)
+    df = pd.DataFrame(compactos)
+    lote = generar_recomendaciones_lote(df, calcular_roi_lote(df))
+    for form_data, form_data_compacto, recomendaciones in zip(registros, compactos, lote):
+        roi = calcular_roi_segmentado(form_data)
+        esperado = _recomendaciones_referencia(form_data, roi)
+        assert generar_recomendaciones(form_data_compacto, roi) == esperado
+        assert [recomendacion["texto"] for recomendacion in recomendaciones] == esperado
+
+
+def test_severidades_y_orden_de_reglas(registros):
+    orden = [regla.id for regla in REGLAS]
+    for form_data in registros[:200]:
+        recomendaciones = generar_recomendaciones_detalladas(form_data, calcular_roi_segmentado(form_data))
+        ids = [recomendacion["regla"] for recomendacion in recomendaciones]
+        assert ids == sorted(ids, key=orden.index)
+        # El primer mensaje es siempre el del ROI neto, con su severidad.
+        assert recomendaciones[0]["severidad"] in (SEVERIDAD_ERROR, SEVERIDAD_EXITO)
+
+
+@pytest.mark.parametrize("sanciones, fragmento", [
+    ("N/A", "Esto no solo evita sanciones, sino que"),  # Texto: se omite el monto
+    ("pendiente", "Esto no solo evita sanciones, sino que"),
+    (float("nan"), "($0 COP reportadas en los últimos 3 años)"),  # Celda vacía: valor por defecto
+])
+def test_sanciones_no_numericas_sin_nan_en_el_texto(sanciones, fragmento):
+    form_data = {"Cumple Ley 1581": "No", "Sanciones Regulatorias (COP, 3a)": sanciones, "Detalles Incidentes": []}
+    roi = calcular_roi_segmentado(form_data)
+    textos = generar_recomendaciones(form_data, roi)
+    assert textos == [recomendacion["texto"] for recomendacion in generar_recomendaciones_lote(pd.DataFrame([form_data]))[0]]
+    assert not any(re.search(r"\bnan\b", texto, re.IGNORECASE) for texto in textos)
+    assert any(fragmento in texto for texto in textos)
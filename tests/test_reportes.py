@@ -0,0 +1,84 @@
+"""Reportes de portafolio: total fijado al encolar y archivos de los trabajos terminados en disco."""
+import os
+import time
+
+import pytest
+
+from almacen import AlmacenEnvios
+from reportes import ESTADO_LISTO, GestorReportes, TrabajoReporte
+
+ENVIOS_INICIALES = 120
+TAMANO_BLOQUE = 50
+
+
+class _AlmacenQueCrece:
+    """Guarda envíos nuevos entre bloque y bloque del recorrido, como otras sesiones durante un reporte."""
+
+    def __init__(self, almacen, nuevos):
+        self._almacen = almacen
+        self._nuevos = nuevos
+
+    def contar_envios_hasta_ultimo(self, **filtros):
+        return self._almacen.contar_envios_hasta_ultimo(**filtros)
+
+    def iterar_envios(self, **argumentos):
+        for bloque in self._almacen.iterar_envios(**argumentos):
+            yield bloque
+            for form_data in self._nuevos[:TAMANO_BLOQUE]:
+                self._almacen.guardar_envio(form_data)
+            self._almacen.esperar_escrituras()
+
+
+def _esperar(trabajo, limite_s=60):
+    fin = time.monotonic() + limite_s
+    while not trabajo.terminado and time.monotonic() < fin:
+        time.sleep(0.05)
+    return trabajo
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    almacen = AlmacenEnvios(tmp_path / "envios.db")
+    yield almacen
+    almacen.cerrar()
+
+
+def test_envios_guardados_durante_el_trabajo_no_cuentan(almacen, registros):
+    for form_data in registros[:ENVIOS_INICIALES]:
+        almacen.guardar_envio(form_data)
+    almacen.esperar_escrituras()
+    gestor = GestorReportes()
+    try:
+        trabajo = gestor.encolar_portafolio(
+            _AlmacenQueCrece(almacen, registros[ENVIOS_INICIALES:]), "html", tamano_bloque=TAMANO_BLOQUE
+        )
+        _esperar(trabajo)
+    finally:
+        gestor.cerrar()
+    assert trabajo.estado == ESTADO_LISTO, trabajo.error
+    assert trabajo.total == trabajo.procesadas == ENVIOS_INICIALES
+    assert almacen.contar_envios() > ENVIOS_INICIALES
+
+
+def test_progreso_no_pasa_de_uno():
+    trabajo = TrabajoReporte(1, "Reporte", "html", "reporte")
+    trabajo.total, trabajo.procesadas = 10, 15
+    assert trabajo.progreso == 1.0
+
+
+def test_reportes_descartados_borran_su_archivo(registros):
+    gestor = GestorReportes(max_retenidos=1)
+    try:
+        primero = _esperar(gestor.encolar_empresa(registros[0], "html"))
+        ruta_primero = primero.ruta_archivo
+        segundo = _esperar(gestor.encolar_empresa(registros[1], "html"))
+        fin = time.monotonic() + 10  # El descarte ocurre justo después de marcar el trabajo como terminado
+        while gestor.obtener(primero.id) is not None and time.monotonic() < fin:
+            time.sleep(0.01)
+        assert gestor.obtener(primero.id) is None
+        assert not os.path.exists(ruta_primero)
+        assert segundo.leer_contenido().startswith(b"<!DOCTYPE html>")
+        assert len(segundo.leer_contenido()) == segundo.tamano_bytes
+    finally:
+        gestor.cerrar()
+    assert not os.path.exists(segundo.ruta_archivo)